@@ -1,23 +1,44 @@
+import argparse
 import tensorflow as tf
 from pathlib import Path
-import matplotlib.pyplot as plt
 import warnings
 from urllib3.exceptions import NotOpenSSLWarning
-from model import create_efficient_model, unfreeze_base_model
+import json
+import shutil
+from model import create_efficient_model, unfreeze_base_model, convert_to_float32
+from callbacks import ThroughputCallback, PhaseBackup, InstrumentationCallback
+from features import (
+    split_backbone_and_head,
+    feature_cache_key,
+    build_feature_cache,
+    train_head_on_features
+)
+from convert_model import export_tflite_models
+from registry import publish
+from compress import MagnitudePruning, cluster_weights, compare_models
+from distributed import (
+    STRATEGIES,
+    create_strategy,
+    distribute_dataset,
+    is_multi_worker,
+    worker_index,
+    custom_fit,
+    custom_evaluate
+)
 from data_loader import (
     create_datasets, 
     create_test_dataset, 
     save_class_names, 
-    get_dataset_info
+    get_dataset_info,
+    build_dataset_index,
+    read_dataset_index,
+    DEFAULT_AUGMENTATION,
+    TEST_DIR_NAME
 )
 
 warnings.filterwarnings('ignore', category=NotOpenSSLWarning)
 
 
-# Enable GPU acceleration
-print("TensorFlow version:", tf.__version__)
-print("GPU Available:", len(tf.config.list_physical_devices('GPU')) > 0)
-
 # Configuration
 CONFIG = {
     'data_dir': './dataset/plant_disease',  # Updated path
@@ -27,20 +48,240 @@ CONFIG = {
     'epochs_finetune': 1,  # Fine-tuning epochs
     'learning_rate_initial': 0.001,
     'learning_rate_finetune': 0.0001,
-    'model_save_path': '../models/saved_model',
-    'use_transfer_learning': True  # Set False for simple CNN
+    'output_dir': 'models',  # Trained model, class names, checkpoint, reports and plots
+    # Paths left as None are derived from output_dir, see OUTPUT_PATHS
+    'model_save_path': None,
+    'use_transfer_learning': True,  # Set False for simple CNN
+    # Applied in the tf.data pipeline, None to disable (no zoom for the simple CNN)
+    'augmentation': dict(DEFAULT_AUGMENTATION),
+    'image_dtype': 'uint8',  # Cache decoded images as uint8, cast to float at the end
+    'cache_dir': None,  # e.g. './dataset/cache': TFRecord shards for datasets larger than RAM
+    'mixed_precision': None,  # 'auto', 'mixed_bfloat16' or 'mixed_float16', used only if the hardware supports it
+    'jit_compile': 'auto',  # True forces XLA for the train step ('auto' leaves it off on CPU-only hosts)
+    'use_feature_cache': False,  # Train the initial head from cached frozen-backbone embeddings
+    'feature_cache_dir': None,
+    'head_batch_size': 256,  # Embeddings are small, large batches are fine
+    'distribution': None,  # 'mirrored': data-parallel over all GPUs, or cpu_replicas logical CPU devices
+    # 'multi_worker': one process per worker from TF_CONFIG, see launch_workers.py
+    'cpu_replicas': 2,  # Logical CPU devices for 'mirrored' on a CPU-only host
+    'scale_learning_rate': True,  # Scale learning rates linearly with the number of replicas
+    'metrics_log': None,  # e.g. 'models/training_metrics.jsonl': per-step time and RSS, per-epoch input time and cache state (.jsonl or .csv)
+    'profile_steps': None,  # e.g. (20, 30): TensorBoard profile of those training steps (with metrics_log)
+    'profile_dir': None,
+    'backup_dir': None,  # Per-phase training state for --resume, removed once the model is saved
+    'backup_freq': 'epoch',  # Or a number of batches: saves weights mid-epoch, a resume still restarts that epoch
+    'export_tflite': True,  # Quantized TFLite models for CPU workers
+    'tflite_quantizations': ('float16', 'int8'),
+    'registry_dir': None,  # Publish model + class names as one version for the server, False to skip
+    'compression': None,  # e.g. {'final_sparsity': 0.5, 'clusters': 16, 'epochs': 2, 'learning_rate': 1e-5}
+    'compressed_model_path': None
+}
+
+# Where the unset CONFIG paths go, relative to CONFIG['output_dir']
+OUTPUT_PATHS = {
+    'model_save_path': 'saved_model',
+    'feature_cache_dir': 'features',
+    'profile_dir': 'profile',
+    'backup_dir': 'backup',
+    'registry_dir': 'registry',
+    'compressed_model_path': 'plant_disease_model_compressed.keras'
+}
+
+
+MIXED_PRECISION_CPU_FLAGS = {
+    'mixed_bfloat16': ('avx512_bf16', 'amx_bf16'),
+    'mixed_float16': ('avx512_fp16', 'amx_fp16')
 }
 
 
-def plot_training_history(history, save_path='models/training_history.png'):
+def cpu_supports(flags):
+    """
+    Check /proc/cpuinfo for any of the given CPU feature flags
+    """
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            present = set(f.read().split())
+    except OSError:
+        return False
+    
+    return any(flag in present for flag in flags)
+
+
+def setup_mixed_precision(policy):
+    """
+    Enable a mixed precision policy when the hardware runs it natively
+    'auto' picks float16 on GPU and bfloat16 on CPU
+    Returns the policy name actually in effect
+    """
+    if not policy:
+        return 'float32'
+    
+    has_gpu = len(tf.config.list_physical_devices('GPU')) > 0
+    if policy == 'auto':
+        policy = 'mixed_float16' if has_gpu else 'mixed_bfloat16'
+    
+    if not has_gpu and not cpu_supports(MIXED_PRECISION_CPU_FLAGS[policy]):
+        print(f"{policy} is not supported natively by this CPU, training in float32")
+        return 'float32'
+    
+    tf.keras.mixed_precision.set_global_policy(policy)
+    print(f"Mixed precision policy: {policy}")
+    return policy
+
+
+def compile_model(model, learning_rate):
+    """
+    Compile for one training phase with the performance settings from CONFIG
+    Under mixed_float16 Keras wraps the optimizer with loss scaling itself
+    """
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy'],
+        jit_compile=CONFIG['jit_compile']
+    )
+
+
+def fit_phase(model, strategy, train_ds, val_ds, epochs, callbacks):
+    """
+    model.fit(), or the custom loop multi_worker needs (see distributed.custom_fit)
+    """
+    if is_multi_worker(strategy):
+        return custom_fit(model, strategy, train_ds, val_ds, epochs, callbacks)
+    return model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=callbacks, verbose=1)
+
+
+def evaluate(model, strategy, dataset):
+    """
+    [loss, accuracy] of model on dataset, on every worker with multi_worker
+    """
+    if is_multi_worker(strategy):
+        return custom_evaluate(model, strategy, dataset)
+    return model.evaluate(dataset)
+
+
+def train_head_from_feature_cache(model, base_model, callbacks, throughput):
+    """
+    Initial phase without the backbone in the loop: embed every image once
+    with the frozen base (cached on disk), then fit only the classifier head
+    The head shares its layers with model, so fine-tuning starts from it
+    """
+    extractor, head = split_backbone_and_head(model, base_model)
+    index = read_dataset_index(CONFIG['data_dir'])
+    
+    def make_datasets():
+        train_ds, val_ds, _ = create_datasets(
+            CONFIG['data_dir'],
+            img_size=CONFIG['img_size'],
+            batch_size=CONFIG['batch_size'],
+            augmentation=None,
+            cache_dir=CONFIG['cache_dir'],
+            image_dtype=CONFIG['image_dtype'],
+            cache_in_memory=False
+        )
+        return train_ds, val_ds
+    
+    cache_dir = build_feature_cache(
+        extractor,
+        make_datasets,
+        config_path('feature_cache_dir'),
+        feature_cache_key(index['fingerprint'], base_model)
+    )
+    
+    # The checkpoint callback would save the bare head and the
+    # instrumentation counts image batches, skip both here
+    head_callbacks = [
+        callback for callback in callbacks
+        if not isinstance(callback, (tf.keras.callbacks.ModelCheckpoint, InstrumentationCallback))
+    ]
+    throughput.batch_size = CONFIG['head_batch_size']
+    
+    history = train_head_on_features(
+        head,
+        cache_dir,
+        learning_rate=CONFIG['learning_rate_initial'],
+        epochs=CONFIG['epochs_initial'],
+        batch_size=CONFIG['head_batch_size'],
+        callbacks=head_callbacks,
+        jit_compile=CONFIG['jit_compile']
+    )
+    
+    throughput.batch_size = CONFIG['batch_size']
+    return history
+
+
+def compress_trained_model(model, train_ds, val_ds):
+    """
+    Optional compression stage on a copy of the trained model
+    Fine-tunes with gradual magnitude pruning up to final_sparsity (reached
+    at 70% of the steps), clusters the remaining weights, saves it next to
+    the uncompressed model and writes a size/latency/accuracy comparison
+    """
+    options = {'final_sparsity': 0.5, 'clusters': 16, 'epochs': 2, 'learning_rate': 1e-5, **CONFIG['compression']}
+
+    compressed = convert_to_float32(model)
+    compile_model(compressed, options['learning_rate'])
+
+    steps_per_epoch = int(tf.data.experimental.cardinality(train_ds))
+    if steps_per_epoch < 0:
+        steps_per_epoch = sum(1 for _ in train_ds)
+    total_steps = steps_per_epoch * options['epochs']
+
+    pruning = MagnitudePruning(
+        final_sparsity=options['final_sparsity'],
+        end_step=int(total_steps * 0.7),
+        frequency=max(1, total_steps // 20),
+        trainable_only=False
+    )
+    compressed.fit(train_ds, validation_data=val_ds, epochs=options['epochs'], callbacks=[pruning], verbose=1)
+
+    if options['clusters']:
+        cluster_weights(compressed, options['clusters'])
+
+    compressed_path = config_path('compressed_model_path')
+    Path(compressed_path).parent.mkdir(parents=True, exist_ok=True)
+    compressed.save(compressed_path)
+    print(f"Compressed model saved to {compressed_path}")
+
+    return compare_models(
+        output_path('plant_disease_model.keras'),
+        compressed_path,
+        val_ds,
+        report_path=output_path('compression_report.json')
+    )
+
+
+def output_path(name):
+    """
+    Path of a training output inside CONFIG['output_dir']
+    """
+    return str(Path(CONFIG['output_dir']) / name)
+
+
+def config_path(key):
+    """
+    CONFIG[key], or its OUTPUT_PATHS location inside CONFIG['output_dir'] when unset
+    """
+    if CONFIG[key] is not None:
+        return CONFIG[key]
+    return output_path(OUTPUT_PATHS[key])
+
+
+def plot_training_history(history, save_path=None):
     """
-    Plot training metrics
+    Plot training metrics from a history dict
     """
+    # Imported here and without a display, training runs headless
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    save_path = save_path or output_path('training_history.png')
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
     
     # Accuracy
-    ax1.plot(history.history['accuracy'], label='Train Accuracy')
-    ax1.plot(history.history['val_accuracy'], label='Val Accuracy')
+    ax1.plot(history['accuracy'], label='Train Accuracy')
+    ax1.plot(history['val_accuracy'], label='Val Accuracy')
     ax1.set_title('Model Accuracy')
     ax1.set_xlabel('Epoch')
     ax1.set_ylabel('Accuracy')
@@ -48,8 +289,8 @@ def plot_training_history(history, save_path='models/training_history.png'):
     ax1.grid(True)
     
     # Loss
-    ax2.plot(history.history['loss'], label='Train Loss')
-    ax2.plot(history.history['val_loss'], label='Val Loss')
+    ax2.plot(history['loss'], label='Train Loss')
+    ax2.plot(history['val_loss'], label='Val Loss')
     ax2.set_title('Model Loss')
     ax2.set_xlabel('Epoch')
     ax2.set_ylabel('Loss')
@@ -58,47 +299,143 @@ def plot_training_history(history, save_path='models/training_history.png'):
     
     plt.tight_layout()
     plt.savefig(save_path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
     print(f"Training history plot saved to {save_path}")
 
 
-def train_model():
+def training_augmentation():
+    """
+    CONFIG augmentation for the model being trained
+    The simple CNN was always trained with flip and rotation only, no zoom
+    """
+    augmentation = CONFIG['augmentation']
+    if augmentation and not CONFIG['use_transfer_learning']:
+        augmentation = {**augmentation, 'zoom': None}
+    return augmentation
+
+
+def create_distributed_datasets(strategy):
+    """
+    Train/val/test datasets with one sharded pipeline per replica,
+    each batched with the per-replica CONFIG batch size
+    """
+    def make_split(split):
+        def make_dataset(num_shards, shard_index):
+            train_ds, val_ds, _ = create_datasets(
+                CONFIG['data_dir'],
+                img_size=CONFIG['img_size'],
+                batch_size=CONFIG['batch_size'],
+                augmentation=training_augmentation(),
+                cache_dir=CONFIG['cache_dir'],
+                image_dtype=CONFIG['image_dtype'],
+                num_shards=num_shards,
+                shard_index=shard_index
+            )
+            return train_ds if split == 'train' else val_ds
+        return make_dataset
+    
+    def make_test_dataset(num_shards, shard_index):
+        return create_test_dataset(
+            CONFIG['data_dir'], CONFIG['img_size'], CONFIG['batch_size'],
+            num_shards=num_shards, shard_index=shard_index
+        )
+    
+    test_ds = None
+    if (Path(CONFIG['data_dir']) / TEST_DIR_NAME).exists():
+        test_ds = distribute_dataset(strategy, make_test_dataset)
+    
+    return (
+        distribute_dataset(strategy, make_split('train')),
+        distribute_dataset(strategy, make_split('val')),
+        test_ds
+    )
+
+
+def train_model(resume=False):
     """
     Main training function
+    resume=True continues from the state in the backup directory left by
+    an interrupted run, otherwise that state is cleared first
     """
     
+    print("TensorFlow version:", tf.__version__)
+    print("GPU Available:", len(tf.config.list_physical_devices('GPU')) > 0)
+    
+    # Before anything touches the TensorFlow runtime
+    strategy = create_strategy(CONFIG['distribution'], CONFIG['cpu_replicas'])
+    replicas = strategy.num_replicas_in_sync
+    distributed = replicas > 1
+    
+    # Every multi_worker process runs the whole training; only the chief
+    # (worker 0) keeps the outputs, the others write theirs aside
+    chief = worker_index(strategy) == 0
+    if not chief:
+        CONFIG['output_dir'] = str(Path(CONFIG['output_dir']) / f"worker-{worker_index(strategy)}")
+        CONFIG.update({key: None for key in OUTPUT_PATHS})
+        CONFIG['metrics_log'] = None
+    
+    Path(CONFIG['output_dir']).mkdir(parents=True, exist_ok=True)
+    if not resume:
+        shutil.rmtree(config_path('backup_dir'), ignore_errors=True)
+    
+    # CONFIG batch_size is per replica
+    global_batch_size = CONFIG['batch_size'] * replicas
+    lr_scale = replicas if CONFIG['scale_learning_rate'] else 1
+    learning_rate_initial = CONFIG['learning_rate_initial'] * lr_scale
+    learning_rate_finetune = CONFIG['learning_rate_finetune'] * lr_scale
+    if distributed:
+        print(f"{CONFIG['distribution']}: {replicas} replicas, "
+              f"global batch {global_batch_size}, learning rate {learning_rate_initial:g}")
+    
     # Step 1: Load Data
     print("\n" + "="*50)
     print("STEP 1: Loading Data")
     print("="*50)
     
-    train_ds, val_ds, class_names = create_datasets(
-        CONFIG['data_dir'],
-        img_size=CONFIG['img_size'],
-        batch_size=CONFIG['batch_size']
-    )
+    if distributed:
+        # Only the per-replica pipelines are built, dataset info comes from the index
+        index = build_dataset_index(CONFIG['data_dir'])
+        class_names = index['class_names']
+        fit_train_ds, fit_val_ds, test_ds = create_distributed_datasets(strategy)
+        num_classes = get_dataset_info(None, None, index)
+    else:
+        fit_train_ds, fit_val_ds, class_names = create_datasets(
+            CONFIG['data_dir'],
+            img_size=CONFIG['img_size'],
+            batch_size=global_batch_size,
+            augmentation=training_augmentation(),
+            cache_dir=CONFIG['cache_dir'],
+            image_dtype=CONFIG['image_dtype']
+        )
+        num_classes = get_dataset_info(fit_train_ds, fit_val_ds, read_dataset_index(CONFIG['data_dir']))
+        test_ds = create_test_dataset(CONFIG['data_dir'], CONFIG['img_size'], CONFIG['batch_size'])
     
-    num_classes = get_dataset_info(train_ds, val_ds)
-    save_class_names(class_names)
+    save_class_names(class_names, output_path('class_names.json'))
+    
+    # Must be set before the model is built
+    precision_policy = setup_mixed_precision(CONFIG['mixed_precision'])
     
     # Step 2: Create Model
     print("\n" + "="*50)
     print("STEP 2: Creating Model")
     print("="*50)
     
-    if CONFIG['use_transfer_learning']:
-        model, base_model = create_efficient_model(
-            input_shape=(*CONFIG['img_size'], 3),
-            num_classes=num_classes
-        )
-        print("Using MobileNetV2 transfer learning")
-    else:
-        from model import create_simple_cnn
-        model = create_simple_cnn(
-            input_shape=(*CONFIG['img_size'], 3),
-            num_classes=num_classes
-        )
-        base_model = None
-        print("Using simple CNN architecture")
+    # Variables (model and optimizer) are created under the strategy
+    with strategy.scope():
+        if CONFIG['use_transfer_learning']:
+            model, base_model = create_efficient_model(
+                input_shape=(*CONFIG['img_size'], 3),
+                num_classes=num_classes
+            )
+            print("Using MobileNetV2 transfer learning")
+        else:
+            from model import create_simple_cnn
+            model = create_simple_cnn(
+                input_shape=(*CONFIG['img_size'], 3),
+                num_classes=num_classes
+            )
+            base_model = None
+            print("Using simple CNN architecture")
     
     model.summary()
     
@@ -107,14 +444,14 @@ def train_model():
     print("STEP 3: Initial Training")
     print("="*50)
     
-    model.compile(
-        optimizer=tf.keras.optimizers.Adam(CONFIG['learning_rate_initial']),
-        loss='categorical_crossentropy',
-        metrics=['accuracy']
-    )
+    with strategy.scope():
+        compile_model(model, learning_rate_initial)
+    
+    throughput = ThroughputCallback(global_batch_size, label='initial')
     
     # Callbacks
     callbacks = [
+        throughput,
         tf.keras.callbacks.EarlyStopping(
             monitor='val_loss',
             patience=5,
@@ -129,20 +466,44 @@ def train_model():
             verbose=1
         ),
         tf.keras.callbacks.ModelCheckpoint(
-            'models/checkpoint.keras',
+            output_path('checkpoint.keras'),
             monitor='val_accuracy',
+            mode='max',
             save_best_only=True,
             verbose=1
         )
     ]
     
-    history_initial = model.fit(
-        train_ds,
-        validation_data=val_ds,
-        epochs=CONFIG['epochs_initial'],
-        callbacks=callbacks,
-        verbose=1
-    )
+    instrumentation = None
+    if CONFIG['metrics_log']:
+        instrumentation = InstrumentationCallback(
+            CONFIG['metrics_log'],
+            global_batch_size,
+            label='initial',
+            cache='tfrecord' if CONFIG['cache_dir'] else 'memory',
+            profile_steps=CONFIG['profile_steps'],
+            profile_dir=config_path('profile_dir'),
+            append=resume
+        )
+        callbacks.insert(1, instrumentation)
+        # Record how long each step waits for its batch
+        fit_train_ds = instrumentation.timed(fit_train_ds)
+    
+    if CONFIG['use_feature_cache'] and distributed:
+        print("Feature cache is not used with a distribution strategy, training end to end")
+    
+    # Weights, optimizer, epoch and callback state of each phase, see --resume
+    backup = PhaseBackup(config_path('backup_dir'), 'initial', callbacks, CONFIG['backup_freq'])
+    
+    if backup.completed:
+        backup.restore_completed(model)
+    elif CONFIG['use_feature_cache'] and base_model is not None and not distributed:
+        train_head_from_feature_cache(model, base_model, callbacks + [backup], throughput)
+        backup.mark_completed(model)
+    else:
+        fit_phase(model, strategy, fit_train_ds, fit_val_ds, CONFIG['epochs_initial'], callbacks + [backup])
+        backup.mark_completed(model)
+    history = backup.history
     
     # Step 4: Fine-tuning (if using transfer learning)
     if CONFIG['use_transfer_learning'] and base_model is not None:
@@ -152,69 +513,155 @@ def train_model():
         
         unfreeze_base_model(base_model, num_layers=30)
         
-        model.compile(
-            optimizer=tf.keras.optimizers.Adam(CONFIG['learning_rate_finetune']),
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
+        with strategy.scope():
+            compile_model(model, learning_rate_finetune)
+        throughput.label = 'finetune'
+        if instrumentation:
+            instrumentation.label = 'finetune'
         
-        history_finetune = model.fit(
-            train_ds,
-            validation_data=val_ds,
-            epochs=CONFIG['epochs_finetune'],
-            callbacks=callbacks,
-            verbose=1
-        )
+        backup = PhaseBackup(config_path('backup_dir'), 'finetune', callbacks, CONFIG['backup_freq'])
+        if backup.completed:
+            backup.restore_completed(model)
+        else:
+            fit_phase(model, strategy, fit_train_ds, fit_val_ds, CONFIG['epochs_finetune'], callbacks + [backup])
+            backup.mark_completed(model)
         
         # Combine histories
-        for key in history_initial.history:
-            history_initial.history[key].extend(history_finetune.history[key])
+        for key in history:
+            history[key].extend(backup.history.get(key, []))
+    
+    # Training performance report (compare runs with different precision/XLA settings)
+    throughput.summary()
+    with open(output_path('training_performance.json'), 'w') as f:
+        json.dump({
+            'mixed_precision': precision_policy,
+            'jit_compile': CONFIG['jit_compile'],
+            'batch_size': global_batch_size,
+            'replicas': replicas,
+            'epochs': throughput.epochs,
+            'input_pipeline': instrumentation.epochs if instrumentation else None
+        }, f, indent=2)
+    if instrumentation:
+        instrumentation.close()
+        print(f"Per-step metrics saved to {CONFIG['metrics_log']}")
     
     # Step 5: Evaluate
     print("\n" + "="*50)
     print("STEP 5: Final Evaluation")
     print("="*50)
     
-    val_loss, val_acc = model.evaluate(val_ds)
+    val_loss, val_acc = evaluate(model, strategy, fit_val_ds)
     print(f"\nFinal Validation Accuracy: {val_acc:.4f}")
     print(f"Final Validation Loss: {val_loss:.4f}")
     
     # Test on test set if available
-    test_ds = create_test_dataset(CONFIG['data_dir'], CONFIG['img_size'], CONFIG['batch_size'])
     if test_ds is not None:
-        test_loss, test_acc = model.evaluate(test_ds)
+        test_loss, test_acc = evaluate(model, strategy, test_ds)
         print(f"\nTest Accuracy: {test_acc:.4f}")
         print(f"Test Loss: {test_loss:.4f}")
     
+    # The last step all workers take part in
+    if not chief:
+        print(f"\nWorker {worker_index(strategy)} done, the chief saves and exports the model")
+        return model, history
+    
     # Step 6: Save Model
     print("\n" + "="*50)
     print("STEP 6: Saving Model")
     print("="*50)
     
+    # Ship a float32 model, serving CPUs may not have bfloat16/float16
+    # The copy is also built outside the strategy, so a model trained on
+    # several replicas exports and predicts as a plain single-device model
+    if precision_policy != 'float32' or distributed:
+        tf.keras.mixed_precision.set_global_policy('float32')
+        model = convert_to_float32(model)
+    
     # Save in TensorFlow SavedModel format
-    model.export(CONFIG['model_save_path'])
-    print(f"Model saved to {CONFIG['model_save_path']}")
+    model.export(config_path('model_save_path'))
+    print(f"Model saved to {config_path('model_save_path')}")
     
     # Also save as .keras format (newer format)
-    model.save('models/plant_disease_model.keras')
-    print("Model also saved as plant_disease_model.keras")
+    model.save(output_path('plant_disease_model.keras'))
+    print(f"Model also saved as {output_path('plant_disease_model.keras')}")
+    
+    # Both phases are done and saved, nothing left to resume
+    shutil.rmtree(config_path('backup_dir'), ignore_errors=True)
+    
+    # Model and class names as one version, running servers hot-swap to it
+    if CONFIG['registry_dir'] is not False:
+        publish(output_path('plant_disease_model.keras'), output_path('class_names.json'), config_path('registry_dir'))
+    
+    # Compression and export run outside the strategy, on unsharded input
+    train_ds, val_ds = fit_train_ds, fit_val_ds
+    if distributed and (CONFIG['compression'] or CONFIG['export_tflite']):
+        train_ds, val_ds, _ = create_datasets(
+            CONFIG['data_dir'],
+            img_size=CONFIG['img_size'],
+            batch_size=global_batch_size,
+            augmentation=training_augmentation(),
+            cache_dir=CONFIG['cache_dir'],
+            image_dtype=CONFIG['image_dtype']
+        )
+    
+    # Pruned + clustered copy, shipped separately so the comparison decides
+    if CONFIG['compression']:
+        print("\n" + "="*50)
+        print("STEP 6b: Compressing Model")
+        print("="*50)
+        compress_trained_model(model, train_ds, val_ds)
     
+    # Step 7: Export TFLite
+    if CONFIG['export_tflite']:
+        print("\n" + "="*50)
+        print("STEP 7: Exporting TFLite")
+        print("="*50)
+
+        # int8 calibration must see the images the model is served, not augmented ones
+        calibration_ds, _, _ = create_datasets(
+            CONFIG['data_dir'],
+            img_size=CONFIG['img_size'],
+            batch_size=CONFIG['batch_size'],
+            augmentation=None,
+            cache_dir=CONFIG['cache_dir'],
+            image_dtype=CONFIG['image_dtype'],
+            cache_in_memory=False
+        )
+        export_tflite_models(
+            model,
+            calibration_ds,
+            val_ds,
+            output_dir=CONFIG['output_dir'],
+            quantizations=CONFIG['tflite_quantizations'],
+            keras_path=output_path('plant_disease_model.keras')
+        )
+
     # Plot training history
-    plot_training_history(history_initial)
+    plot_training_history(history)
     
     print("\n" + "="*50)
     print("Training Complete!")
     print("="*50)
     print("\nNext steps:")
-    print("1. Run: python src/convert_model.py")
+    if CONFIG['export_tflite']:
+        int8_path = output_path('plant_disease_model_int8.tflite')
+        print(f"1. Serve {int8_path}: python src/cli.py serve --model {int8_path}")
+    else:
+        print("1. Run: python src/cli.py export")
     print("2. Use the converted model in Node.js with TensorFlow.js")
     
-    return model, history_initial
+    return model, history
 
 
 if __name__ == '__main__':
-    # Create necessary directories
-    Path('models').mkdir(exist_ok=True)
+    parser = argparse.ArgumentParser(description='Train the plant disease model')
+    parser.add_argument('--distribution', choices=STRATEGIES, default=CONFIG['distribution'])
+    parser.add_argument('--cpu-replicas', type=int, default=CONFIG['cpu_replicas'])
+    parser.add_argument('--resume', action='store_true',
+                        help=f"continue an interrupted run from {config_path('backup_dir')}")
+    args = parser.parse_args()
+    CONFIG['distribution'] = args.distribution
+    CONFIG['cpu_replicas'] = args.cpu_replicas
     
     # Train model
-    model, history = train_model()
\ No newline at end of file
+    model, history = train_model(resume=args.resume)
\ No newline at end of file
@@ -0,0 +1,318 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+DEFAULT_ARTIFACTS = (
+    'models/plant_disease_model.keras',
+    'models/saved_model',
+    '../models/saved_model',
+    'models/plant_disease_model_*.tflite'
+)
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+
+
+def find_artifacts(patterns=DEFAULT_ARTIFACTS):
+    """
+    Existing model artifacts matching the given paths/globs, in order
+    """
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if os.path.realpath(path) not in map(os.path.realpath, found):
+                found.append(path)
+    return found
+
+
+def artifact_format(path):
+    if path.endswith('.tflite'):
+        return 'tflite'
+    if os.path.isdir(path):
+        return 'saved_model'
+    return 'keras'
+
+
+def benchmark_images(count, img_size, image_dir=None, seed=123):
+    """
+    Fixed input set: sample images from image_dir, or seeded synthetic
+    images so the benchmark runs offline and is identical between runs
+    """
+    if image_dir:
+        from predict import decode_batch
+        from score import list_images
+
+        paths = list_images(image_dir)[:count]
+        if paths:
+            images = decode_batch(paths, img_size)
+            # Repeat the samples to reach count
+            return images[np.arange(count) % len(images)]
+
+    rng = np.random.RandomState(seed)
+    # Smooth color fields plus noise, closer to photos than uniform noise
+    base = rng.uniform(0, 255, size=(count, 8, 8, 3))
+    images = np.repeat(np.repeat(base, img_size[0] // 8, axis=1), img_size[1] // 8, axis=2)
+    images += rng.normal(0, 20, size=images.shape)
+    return np.clip(images, 0, 255).astype(np.float32)
+
+
+def _percentiles(times):
+    times_ms = np.asarray(times) * 1000
+    return {
+        'p50_ms': float(np.percentile(times_ms, 50)),
+        'p95_ms': float(np.percentile(times_ms, 95)),
+        'p99_ms': float(np.percentile(times_ms, 99)),
+        'mean_ms': float(np.mean(times_ms))
+    }
+
+
+def benchmark_artifact(path, images_path, latency_runs=200, batch_sizes=BATCH_SIZES, min_batch_time=2.0):
+    """
+    Measure one artifact, meant to run in a fresh process so load time
+    is a cold start and peak RSS belongs to this artifact alone
+    The shared input set is resized to the artifact's own input size
+    (distilled students and the cascade's small model are below 224px)
+    """
+    # Imported first so load_s covers only the artifact
+    start = time.perf_counter()
+    import tensorflow as tf
+    from predict import load_inference_model
+    from callbacks import host_rss_mb
+    import_s = time.perf_counter() - start
+
+    images = np.load(images_path)
+
+    start = time.perf_counter()
+    model = load_inference_model(path)
+    load_s = time.perf_counter() - start
+
+    size = tuple(model.input_shape[1:3])
+    if images.shape[1:3] != size:
+        images = tf.image.resize(images, size, antialias=True).numpy()
+
+    start = time.perf_counter()
+    model.predict_on_batch(images[:1])
+    first_inference_ms = (time.perf_counter() - start) * 1000
+
+    # Single-image latency
+    times = []
+    for i in range(latency_runs):
+        image = images[i % len(images)][np.newaxis]
+        start = time.perf_counter()
+        model.predict_on_batch(image)
+        times.append(time.perf_counter() - start)
+
+    # Throughput per batch size, each measured for at least min_batch_time
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = images[np.arange(batch_size) % len(images)]
+        model.predict_on_batch(batch)
+        runs = 0
+        start = time.perf_counter()
+        while runs < 3 or time.perf_counter() - start < min_batch_time:
+            model.predict_on_batch(batch)
+            runs += 1
+        elapsed = time.perf_counter() - start
+        throughput[str(batch_size)] = {
+            'images_per_sec': runs * batch_size / elapsed,
+            'batch_ms': elapsed / runs * 1000
+        }
+
+    predictions = np.concatenate([
+        np.argmax(model.predict_on_batch(images[i:i + 32]), axis=1)
+        for i in range(0, len(images), 32)
+    ])
+
+    return {
+        'path': path,
+        'format': artifact_format(path),
+        'input_size': list(size),
+        'size_mb': _artifact_size_mb(path),
+        'tensorflow_import_s': import_s,
+        'load_s': load_s,
+        'first_inference_ms': first_inference_ms,
+        'latency': _percentiles(times),
+        'throughput': throughput,
+        'peak_rss_mb': host_rss_mb(peak=True),
+        'top1': predictions.tolist()
+    }
+
+
+def _artifact_size_mb(path):
+    if os.path.isdir(path):
+        return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file()) / 1e6
+    return os.path.getsize(path) / 1e6
+
+
+def _run_isolated(results_queue, *args):
+    try:
+        results_queue.put(benchmark_artifact(*args))
+    except Exception as e:
+        results_queue.put({'path': args[0], 'error': f"{type(e).__name__}: {e}"})
+
+
+def _wait_for_result(results_queue, process, path, poll_seconds=5):
+    """
+    The child's result, or an error entry if it died without one
+    (crashed in native code, killed for memory)
+    """
+    while True:
+        try:
+            return results_queue.get(timeout=poll_seconds)
+        except queue.Empty:
+            if not process.is_alive():
+                # It may have put its result just before exiting
+                try:
+                    return results_queue.get(timeout=1)
+                except queue.Empty:
+                    return {'path': path, 'error': f"benchmark process exited with code {process.exitcode}"}
+
+
+def run_benchmark(artifacts, num_images=64, img_size=(224, 224), image_dir=None, latency_runs=200,
+                  batch_sizes=BATCH_SIZES, seed=123):
+    """
+    Benchmark each artifact in its own process on the same input set
+    Top-1 agreement is relative to the first artifact (the .keras model
+    by default)
+    """
+    images = benchmark_images(num_images, img_size, image_dir, seed)
+    context = multiprocessing.get_context('spawn')
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        images_path = os.path.join(tmp_dir, 'images.npy')
+        np.save(images_path, images)
+
+        for path in artifacts:
+            print(f"Benchmarking {path} ...")
+            results_queue = context.Queue()
+            process = context.Process(
+                target=_run_isolated,
+                args=(results_queue, path, images_path, latency_runs, batch_sizes)
+            )
+            process.start()
+            results.append(_wait_for_result(results_queue, process, path))
+            process.join()
+
+    reference = next((r['top1'] for r in results if 'top1' in r), None)
+    for result in results:
+        top1 = result.pop('top1', None)
+        if top1 is not None and reference is not None:
+            result['top1_agreement'] = float(np.mean(np.array(top1) == np.array(reference)))
+
+    import tensorflow as tf
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'tensorflow': tf.__version__
+        },
+        'settings': {
+            'images': 'sample' if image_dir else 'synthetic',
+            'num_images': num_images,
+            'img_size': list(img_size),
+            'latency_runs': latency_runs,
+            'batch_sizes': list(batch_sizes),
+            'seed': seed
+        },
+        'results': results
+    }
+
+
+def print_report(report):
+    """
+    Summary table: latency percentiles, best throughput, memory, agreement
+    """
+    print(f"\n{'Artifact':40s} {'Load s':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} "
+          f"{'Best img/s':>11s} {'Peak MB':>8s} {'Agree':>7s}")
+    print("-" * 104)
+    for result in report['results']:
+        name = os.path.basename(result['path'].rstrip('/')) or result['path']
+        if 'error' in result:
+            print(f"{name:40s} {result['error']}")
+            continue
+        latency = result['latency']
+        best = max(result['throughput'].values(), key=lambda t: t['images_per_sec'])
+        agreement = f"{result['top1_agreement']*100:.1f}%" if 'top1_agreement' in result else '-'
+        print(f"{name:40s} {result['load_s']:7.2f} {latency['p50_ms']:8.1f} {latency['p95_ms']:8.1f} "
+              f"{latency['p99_ms']:8.1f} {best['images_per_sec']:11.1f} {result['peak_rss_mb']:8.0f} {agreement:>7s}")
+
+
+def compare_reports(baseline, report, tolerance=0.1):
+    """
+    Flag artifacts whose p50 latency or batch throughput got worse than
+    the baseline report by more than tolerance, returns the regressions
+    """
+    previous = {os.path.basename(r['path'].rstrip('/')): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+
+    for result in report['results']:
+        name = os.path.basename(result['path'].rstrip('/'))
+        old = previous.get(name)
+        if old is None or 'error' in result:
+            continue
+
+        checks = [('p50 latency', result['latency']['p50_ms'], old['latency']['p50_ms'], True)]
+        for batch_size, stats in result['throughput'].items():
+            if batch_size in old['throughput']:
+                checks.append((f"batch {batch_size} img/s", stats['images_per_sec'],
+                               old['throughput'][batch_size]['images_per_sec'], False))
+
+        for metric, new_value, old_value, lower_is_better in checks:
+            change = (new_value - old_value) / old_value
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append({'artifact': name, 'metric': metric, 'baseline': old_value,
+                                    'current': new_value, 'change': change})
+
+    for regression in regressions:
+        print(f"REGRESSION {regression['artifact']}: {regression['metric']} "
+              f"{regression['baseline']:.1f} -> {regression['current']:.1f} ({regression['change']*100:+.0f}%)")
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark inference for each model artifact')
+    parser.add_argument('models', nargs='*', help='artifacts (.keras, SavedModel dir, .tflite), default: all found in models/')
+    parser.add_argument('--images', help='directory of sample images, synthetic images if omitted')
+    parser.add_argument('--num-images', type=int, default=64)
+    parser.add_argument('--latency-runs', type=int, default=200)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES))
+    parser.add_argument('--output', default='models/benchmark_report.json')
+    parser.add_argument('--baseline', help='previous report to check for regressions')
+    args = parser.parse_args()
+
+    artifacts = find_artifacts(args.models or DEFAULT_ARTIFACTS)
+    if not artifacts:
+        raise SystemExit("No model artifacts found")
+
+    report = run_benchmark(
+        artifacts,
+        num_images=args.num_images,
+        image_dir=args.images,
+        latency_runs=args.latency_runs,
+        batch_sizes=args.batch_sizes
+    )
+    print_report(report)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare_reports(json.load(f), report)
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def content_hash(data):
+    """
+    SHA-256 hex digest of image bytes (or of a file path's contents)
+    """
+    if isinstance(data, (str, Path)):
+        with open(data, 'rb') as f:
+            data = f.read()
+    return hashlib.sha256(data).hexdigest()
+
+
+def model_version(model_path):
+    """
+    Short content hash of a model artifact (file or SavedModel directory)
+    Changes whenever the weights change, so cached predictions from an
+    older model are never served for a newer one
+    """
+    digest = hashlib.sha256()
+    path = Path(model_path)
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+
+    for file in files:
+        digest.update(str(file.relative_to(path) if path.is_dir() else file.name).encode('utf-8'))
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+
+    return digest.hexdigest()[:12]
+
+
+class PredictionCache:
+    """
+    Probability vectors keyed by model version + image content hash
+    Memory tier: bounded LRU of max_items entries, 0 keeps no entries in memory
+    Disk tier (optional, disk_dir): one .npy per entry, entries older than
+    ttl_seconds are ignored and removed, the least recently used are evicted
+    once the tier grows past max_disk_mb (a disk hit refreshes the entry)
+    Safe to share between threads
+    """
+
+    def __init__(self, version, max_items=10000, disk_dir=None, ttl_seconds=7 * 24 * 3600, max_disk_mb=512):
+        self.version = version
+        self.max_items = max_items
+        self.disk_dir = Path(disk_dir) / version if disk_dir else None
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = int(max_disk_mb * 1e6)
+
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, image_bytes):
+        return content_hash(image_bytes)
+
+    def get(self, key):
+        """
+        Cached probabilities for key, or None
+        """
+        with self._lock:
+            probabilities = self._memory.get(key)
+            if probabilities is not None:
+                self._memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return probabilities
+
+        probabilities = self._disk_get(key)
+
+        with self._lock:
+            if probabilities is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._memory_put(key, probabilities)
+            return probabilities
+
+    def put(self, key, probabilities):
+        probabilities = np.array(probabilities, dtype=np.float32)
+        probabilities.flags.writeable = False
+
+        with self._lock:
+            self._memory_put(key, probabilities)
+
+        self._disk_put(key, probabilities)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _memory_put(self, key, probabilities):
+        if self.max_items <= 0:
+            return
+        self._memory[key] = probabilities
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f"{key}.npy"
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self.ttl_seconds:
+                self._disk_remove(path, stat.st_size)
+                return None
+            probabilities = np.load(path)
+            # Eviction goes by mtime, touching a hit makes it LRU
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        probabilities.flags.writeable = False
+        return probabilities
+
+    def _disk_put(self, key, probabilities):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        path.parent.mkdir(exist_ok=True)
+        try:
+            replaced_size = path.stat().st_size
+        except OSError:
+            replaced_size = 0
+        # Write then rename, readers never see a partial file
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, probabilities)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                # An overwritten entry gives back its old size
+                self._disk_bytes += path.stat().st_size - replaced_size
+            over_budget = self._disk_bytes > self.max_disk_bytes
+
+        if over_budget:
+            self.evict_disk()
+
+    def _disk_remove(self, path, size):
+        path.unlink()
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _disk_entries(self):
+        for path in self.disk_dir.glob('*/*.npy'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def evict_disk(self):
+        """
+        Drop expired disk entries, then the least recently used until the
+        tier is at 90% of max_disk_mb
+        """
+        if not self.disk_dir:
+            return
+
+        now = time.time()
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+
+        for mtime, size, path in entries:
+            if now - mtime <= self.ttl_seconds and total <= 0.9 * self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+        with self._lock:
+            self._disk_bytes = total
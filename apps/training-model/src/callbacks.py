@@ -0,0 +1,409 @@
+import csv
+import json
+import os
+import resource
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """
+    Measure training step time and throughput per epoch
+    The first step of each fit() is reported separately, it includes tracing
+    (and XLA compilation when jit_compile is on)
+    """
+
+    def __init__(self, batch_size, label=''):
+        super().__init__()
+        self.batch_size = batch_size
+        self.label = label
+        self.epochs = []
+        self._first_step = True
+
+    def on_train_begin(self, logs=None):
+        self._first_step = True
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._step_times = []
+        self._epoch_start = time.perf_counter()
+        self._compile_time = None
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        step_time = time.perf_counter() - self._step_start
+        if self._first_step:
+            self._compile_time = step_time
+            self._first_step = False
+        else:
+            self._step_times.append(step_time)
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_time = time.perf_counter() - self._epoch_start
+        step_times = self._step_times or [self._compile_time or epoch_time]
+        median_step = float(np.median(step_times))
+
+        stats = {
+            'phase': self.label,
+            'epoch': epoch + 1,
+            'epoch_time_s': epoch_time,
+            'median_step_ms': median_step * 1000,
+            'p95_step_ms': float(np.percentile(step_times, 95)) * 1000,
+            'images_per_sec': self.batch_size / median_step,
+            'first_step_s': self._compile_time
+        }
+        self.epochs.append(stats)
+
+        print(f"\n[{self.label or 'train'}] epoch {epoch + 1}: "
+              f"{stats['median_step_ms']:.1f} ms/step (p95 {stats['p95_step_ms']:.1f}), "
+              f"{stats['images_per_sec']:.1f} images/sec")
+
+    def summary(self):
+        """
+        Print all recorded epochs as a table
+        """
+        print(f"\n{'Phase':12s} {'Epoch':>5s} {'ms/step':>10s} {'p95 ms':>10s} {'img/s':>10s} {'Epoch s':>10s}")
+        print("-" * 62)
+        for stats in self.epochs:
+            print(f"{stats['phase']:12s} {stats['epoch']:5d} {stats['median_step_ms']:10.1f} "
+                  f"{stats['p95_step_ms']:10.1f} {stats['images_per_sec']:10.1f} {stats['epoch_time_s']:10.1f}")
+
+
+class PhaseBackup(tf.keras.callbacks.BackupAndRestore):
+    """
+    BackupAndRestore for one training phase (weights, optimizer and epoch),
+    plus the state it leaves out: the phase history and the counters and
+    best values of the stateful callbacks, including EarlyStopping's best
+    weights, so a resumed fit() continues from the last backup
+    Resume works per epoch: with a number of batches as save_freq the
+    weights of the last mid-epoch backup are restored, but the interrupted
+    epoch runs again from its first batch
+    Must come after those callbacks in the list, they reset in
+    on_train_begin and update in on_epoch_end before this restores/saves them
+    The backup is kept when the phase ends, call mark_completed() instead
+    Hooks into BackupAndRestore._save_model and the model's _initial_epoch
+    (private, checked when used; keras is pinned in requirements.txt)
+    """
+
+    CALLBACK_STATE = {
+        'EarlyStopping': ('wait', 'best', 'best_epoch', 'stopped_epoch'),
+        'ReduceLROnPlateau': ('wait', 'best', 'cooldown_counter'),
+        'ModelCheckpoint': ('best',),
+        'ThroughputCallback': ('epochs',)
+    }
+
+    def __init__(self, backup_root, phase, callbacks, save_freq='epoch'):
+        if not callable(getattr(tf.keras.callbacks.BackupAndRestore, '_save_model', None)):
+            raise RuntimeError(
+                f"PhaseBackup needs BackupAndRestore._save_model, not found in Keras {tf.keras.version()}; "
+                "use the keras version pinned in requirements.txt"
+            )
+        super().__init__(
+            os.path.join(backup_root, phase),
+            save_freq=save_freq,
+            double_checkpoint=True,
+            delete_checkpoint=False
+        )
+        self.phase = phase
+        self.stateful_callbacks = [c for c in callbacks if type(c).__name__ in self.CALLBACK_STATE]
+        self.history = {}
+        self._state_path = os.path.join(self.backup_dir, 'state.json')
+        self._best_weights_path = os.path.join(self.backup_dir, 'best_weights.npz')
+        self._final_weights_path = os.path.join(self.backup_dir, 'final_weights.npz')
+
+    def _read_state(self):
+        if not os.path.exists(self._state_path):
+            return None
+        with open(self._state_path, 'r') as f:
+            return json.load(f)
+
+    def _write_state(self, completed=False):
+        state = {
+            'phase': self.phase,
+            'completed': completed,
+            'history': self.history,
+            'callbacks': [
+                {name: getattr(callback, name, None) for name in self.CALLBACK_STATE[type(callback).__name__]}
+                for callback in self.stateful_callbacks
+            ]
+        }
+
+        # Swap in the new state in one step, a crash mid-write keeps the old one
+        tmp_path = f"{self._state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, default=float)
+        os.replace(tmp_path, self._state_path)
+
+    def _restore_callbacks(self, state):
+        for callback, values in zip(self.stateful_callbacks, state['callbacks']):
+            for name, value in values.items():
+                setattr(callback, name, value)
+
+    @property
+    def completed(self):
+        state = self._read_state()
+        return bool(state and state['completed'])
+
+    def on_train_begin(self, logs=None):
+        if not hasattr(self.model, '_initial_epoch'):
+            raise RuntimeError(
+                f"PhaseBackup needs Model._initial_epoch, not found in Keras {tf.keras.version()}; "
+                "use the keras version pinned in requirements.txt"
+            )
+        # Keras keeps the restored epoch on the model, don't carry it into the next phase
+        self.model._initial_epoch = None
+        super().on_train_begin(logs)
+
+        state = self._read_state()
+        if state is None:
+            return
+
+        self.history = state['history']
+        self._restore_callbacks(state)
+        if os.path.exists(self._best_weights_path):
+            with np.load(self._best_weights_path) as best:
+                best_weights = [best[f"arr_{i}"] for i in range(len(best.files))]
+            for callback in self.stateful_callbacks:
+                if hasattr(callback, 'best_weights'):
+                    callback.best_weights = best_weights
+
+        print(f"Resuming {self.phase} phase at epoch {self.model._initial_epoch or 0}")
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        super().on_epoch_end(epoch, logs)
+
+    def _save_model(self):
+        super()._save_model()
+        for callback in self.stateful_callbacks:
+            if getattr(callback, 'best_weights', None) is not None:
+                np.savez(self._best_weights_path, *callback.best_weights)
+        self._write_state()
+
+    def mark_completed(self, model):
+        """
+        Record the phase as done together with the model's final weights
+        (after EarlyStopping restored the best ones)
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        np.savez(self._final_weights_path, *model.get_weights())
+        self._write_state(completed=True)
+
+    def restore_completed(self, model):
+        """
+        Skip a phase finished before the interruption: load its final
+        weights into model, its history and the callback state
+        """
+        with np.load(self._final_weights_path) as final:
+            model.set_weights([final[f"arr_{i}"] for i in range(len(final.files))])
+        state = self._read_state()
+        self.history = state['history']
+        self._restore_callbacks(state)
+        print(f"{self.phase} phase already completed, restored its final weights")
+
+
+def host_rss_mb(peak=False):
+    """
+    Resident memory of this process in MB, or its peak with peak=True
+    (also the fallback where /proc is missing)
+    """
+    if not peak:
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+        except (OSError, ValueError):
+            pass
+
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1e6 if os.uname().sysname == 'Darwin' else peak_rss / 1e3
+
+
+class InstrumentationCallback(tf.keras.callbacks.Callback):
+    """
+    Per-step training metrics: step time, host time between steps,
+    images/sec and host RSS, written as JSONL or CSV (by file extension)
+    Keras fetches batches inside its compiled step; fit() the dataset
+    returned by timed() to also get the time each step waited for its
+    batch (input_ms). Each epoch row has the median wait per batch, the
+    share of step time spent waiting (input_bound) and whether the
+    in-memory cache is complete (tf.data finalizes it at the end of the
+    first full pass)
+    profile_steps=(first, last) records a TensorBoard profile of those
+    global steps into profile_dir
+    cache: 'memory', 'tfrecord' or None
+    """
+
+    FIELDS = ('phase', 'epoch', 'step', 'step_ms', 'host_ms', 'input_ms', 'images', 'images_per_sec', 'rss_mb',
+              'input_ms_per_batch', 'input_bound', 'cache_complete')
+
+    def __init__(self, path, batch_size, label='', cache='memory', profile_steps=None,
+                 profile_dir='models/profile', append=False):
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        self.label = label
+        self.cache = cache
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
+        self.epochs = []
+        self._mode = 'a' if append else 'w'
+        self._file = None
+        self._global_step = 0
+        self._cache_complete = cache == 'tfrecord'
+        self._profiling = False
+        self._ready = deque()
+        self._timed = False
+
+    def _open(self):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        new_file = self._mode == 'w' or not os.path.exists(self.path)
+        self._file = open(self.path, self._mode, newline='')
+        self._mode = 'a'
+        if self.path.endswith('.csv'):
+            self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+            if new_file:
+                self._writer.writeheader()
+        else:
+            self._writer = None
+
+    def _write(self, row):
+        if self._writer:
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(row) + '\n')
+
+    def timed(self, dataset):
+        """
+        dataset stamping the time each batch leaves the input pipeline,
+        pass it to fit(); a step waited for input as long as its batches
+        became ready after the step started (tf.data may run ahead of the
+        step, which only makes a batch ready earlier)
+        Per-replica (distributed) datasets are returned as they are, their
+        steps have no input_ms
+        """
+        if not isinstance(dataset, tf.data.Dataset):
+            return dataset
+
+        self._timed = True
+
+        def stamp(*batch):
+            tf.py_function(self._ready.append, [tf.timestamp()], [])
+            return batch
+
+        return dataset.map(stamp)
+
+    def _take_input_wait(self):
+        """
+        Seconds the current step waited for its batches, or None
+        """
+        if not self._timed:
+            return None
+
+        wait = 0.0
+        now = self._step_wall_start
+        for _ in range(min(self._batches_per_step, len(self._ready))):
+            ready = float(self._ready.popleft())
+            wait += max(0.0, ready - now)
+            now = max(now, ready)
+        return wait
+
+    def on_train_begin(self, logs=None):
+        if self._file is None:
+            self._open()
+        self._batches_per_step = getattr(self.model, 'steps_per_execution', 1)
+        self._images = self.batch_size * self._batches_per_step
+        self._last_step_end = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch = epoch
+        self._rows = []
+        # Batches the previous epoch's iterator ran ahead with
+        self._ready.clear()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.profile_steps and self._global_step == self.profile_steps[0]:
+            tf.profiler.experimental.start(self.profile_dir)
+            self._profiling = True
+        self._step_start = time.perf_counter()
+        # tf.timestamp() is wall-clock time
+        self._step_wall_start = time.time()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        # The step includes fetching its batch from the prefetch buffer
+        step_time = end - self._step_start
+        host_time = self._step_start - self._last_step_end if self._last_step_end else 0.0
+        self._last_step_end = end
+        input_time = self._take_input_wait()
+
+        row = {
+            'phase': self.label,
+            'epoch': self._epoch + 1,
+            'step': self._global_step,
+            'step_ms': step_time * 1000,
+            'host_ms': host_time * 1000,
+            'input_ms': input_time * 1000 if input_time is not None else None,
+            'images': self._images,
+            'images_per_sec': self._images / step_time,
+            'rss_mb': host_rss_mb()
+        }
+        self._rows.append(row)
+        self._write(row)
+
+        if self._profiling and self._global_step >= self.profile_steps[1]:
+            tf.profiler.experimental.stop()
+            self._profiling = False
+            print(f"\nProfile of steps {self.profile_steps[0]}-{self.profile_steps[1]} saved to {self.profile_dir}")
+        self._global_step += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self._rows:
+            return
+
+        # A finished epoch is a full pass, the memory cache is now complete
+        if self.cache == 'memory' and len(self._rows) == self.params.get('steps', len(self._rows)):
+            self._cache_complete = True
+
+        # The first step of a fit() includes tracing, leave it out when possible
+        rows = self._rows[1:] if len(self._rows) > 1 else self._rows
+        median_step_ms = float(np.median([row['step_ms'] for row in rows]))
+        timed = self._timed and rows[0]['input_ms'] is not None
+        stats = {
+            'phase': self.label,
+            'epoch': epoch + 1,
+            'median_step_ms': median_step_ms,
+            'median_host_ms': float(np.median([row['host_ms'] for row in rows])),
+            'input_ms_per_batch': float(np.median([row['input_ms'] for row in rows])) if timed else None,
+            'input_bound': (min(1.0, sum(row['input_ms'] for row in rows) / sum(row['step_ms'] for row in rows))
+                            if timed else None),
+            'images_per_sec': sum(row['images'] for row in rows) / (sum(row['step_ms'] for row in rows) / 1000),
+            'rss_mb': self._rows[-1]['rss_mb'],
+            'cache_complete': self._cache_complete if self.cache else None
+        }
+        self.epochs.append(stats)
+        self._write({field: stats[field] for field in
+                     ('phase', 'epoch', 'images_per_sec', 'rss_mb', 'input_ms_per_batch', 'input_bound', 'cache_complete')})
+        self._file.flush()
+
+        input_text = (f"input wait {stats['input_ms_per_batch']:.1f} ms/batch ({stats['input_bound']*100:.0f}% of step time), "
+                      if timed else "")
+        print(f"\n[{self.label or 'train'}] epoch {epoch + 1}: {median_step_ms:.1f} ms/step, "
+              f"{input_text}RSS {stats['rss_mb']:.0f} MB")
+
+    def on_train_end(self, logs=None):
+        if self._profiling:
+            tf.profiler.experimental.stop()
+            self._profiling = False
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
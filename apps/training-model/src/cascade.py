@@ -0,0 +1,298 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from model import create_simple_cnn
+from data_loader import build_dataset_index, index_split, create_dataset_from_files, DEFAULT_AUGMENTATION
+from predict import load_inference_model
+
+
+# Configuration
+CONFIG = {
+    'data_dir': './dataset/plant_disease',
+    'img_size': (224, 224),  # Large model input, what callers send
+    # create_simple_cnn at 224px costs more than MobileNetV2 (full-resolution
+    # 3x3 convs), so the first stage runs on a downscaled copy of the input
+    'small_img_size': (96, 96),
+    'batch_size': 32,
+    'epochs': 15,
+    'learning_rate': 0.001,
+    'validation_split': 0.2,  # Halved: early stopping for the small model, calibration of the threshold
+    'small_model_path': 'models/plant_disease_small.keras',
+    'large_model_path': 'models/plant_disease_model.keras',
+    'report_path': 'models/cascade.json',  # Calibration report, also what load_inference_model loads
+    'thresholds': tuple(np.round(np.arange(0.50, 1.00, 0.05), 2)) + (0.97, 0.99),
+    'max_accuracy_drop': 0.01  # Cascade may lose at most this much accuracy vs the large model
+}
+
+
+class CascadeModel:
+    """
+    Run the small model on every image and the large model only on the
+    images whose small-model top-1 confidence is below threshold
+    Inputs are at the large model's size, the small model gets a resized copy
+    Same predict_on_batch()/predict() interface as a Keras model, so the
+    server, scorer, pool and scan worker can serve it unchanged
+    """
+
+    def __init__(self, small_model, large_model, threshold):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.threshold = threshold
+        self.stats = {'images': 0, 'escalated': 0}
+
+    @property
+    def input_shape(self):
+        return self.large_model.input_shape
+
+    @property
+    def output_shape(self):
+        return self.large_model.output_shape
+
+    def predict_on_batch(self, images):
+        probabilities = np.array(self.small_model.predict_on_batch(fit_input(self.small_model, images)),
+                                 dtype=np.float32)
+        uncertain = np.flatnonzero(probabilities.max(axis=1) < self.threshold)
+
+        if len(uncertain):
+            probabilities[uncertain] = self.large_model.predict_on_batch(np.asarray(images)[uncertain])
+
+        self.stats['images'] += len(probabilities)
+        self.stats['escalated'] += len(uncertain)
+        return probabilities
+
+    def predict(self, images, batch_size=32, verbose=0):
+        images = np.asarray(images)
+        return np.concatenate([
+            self.predict_on_batch(images[i:i + batch_size])
+            for i in range(0, len(images), batch_size)
+        ], axis=0)
+
+
+def fit_input(model, images):
+    """
+    Resize a batch to the model's input size if it differs
+    """
+    size = tuple(model.input_shape[1:3])
+    if tuple(images.shape[1:3]) == size:
+        return images
+    return tf.image.resize(images, size, antialias=True).numpy()
+
+
+def load_cascade(report_path=CONFIG['report_path']):
+    """
+    CascadeModel from a calibration report written by calibrate()
+    """
+    with open(report_path, 'r') as f:
+        report = json.load(f)
+
+    return CascadeModel(
+        load_inference_model(report['small_model_path']),
+        load_inference_model(report['large_model_path']),
+        report['threshold']
+    )
+
+
+def cascade_datasets(config=CONFIG):
+    """
+    (train_ds, selection_ds, calibration_ds, class_names) at the large
+    model's input size, training split augmented
+    The validation files are split in two (alternating, so per class):
+    one half selects the small model's best epoch, the other calibrates
+    the threshold, so the accuracy guarantee is measured on unseen images
+    """
+    index = build_dataset_index(config['data_dir'], validation_split=config['validation_split'])
+    num_classes = len(index['class_names'])
+    train_paths, train_labels = index_split(index, 'train')
+    val_paths, val_labels = index_split(index, 'val')
+
+    def make(paths, labels, augmentation=None, shuffle_buffer=None):
+        return create_dataset_from_files(
+            paths, labels, num_classes,
+            img_size=config['img_size'],
+            batch_size=config['batch_size'],
+            augmentation=augmentation,
+            shuffle_buffer=shuffle_buffer
+        )
+
+    return (
+        make(train_paths, train_labels, DEFAULT_AUGMENTATION, shuffle_buffer=1000),
+        make(val_paths[0::2], val_labels[0::2]),
+        make(val_paths[1::2], val_labels[1::2]),
+        index['class_names']
+    )
+
+
+def downscale(ds, size):
+    """
+    The small model's view of a large-model dataset: the same antialiased
+    resize fit_input applies when the cascade is served
+    """
+    return ds.map(lambda images, labels: (tf.image.resize(images, size, antialias=True), labels),
+                  num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def train_small_model(train_ds, selection_ds, num_classes, config=CONFIG):
+    """
+    Train create_simple_cnn on the same data and class order as the large
+    model, on downscaled large-model inputs as it sees them when served
+    """
+    size = config['small_img_size']
+    model = create_simple_cnn(input_shape=(*size, 3), num_classes=num_classes)
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=config['learning_rate']),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+
+    model.fit(
+        downscale(train_ds, size),
+        validation_data=downscale(selection_ds, size),
+        epochs=config['epochs'],
+        callbacks=[
+            tf.keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=4, restore_best_weights=True),
+            tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-6)
+        ],
+        verbose=1
+    )
+
+    Path(config['small_model_path']).parent.mkdir(parents=True, exist_ok=True)
+    model.save(config['small_model_path'])
+    print(f"Small model saved to {config['small_model_path']}")
+
+    return model
+
+
+def _collect(model, ds):
+    """
+    Probabilities, labels and per-image seconds of one pass over ds
+    """
+    probabilities, labels = [], []
+    seconds = 0.0
+
+    for images, batch_labels in ds:
+        images = images.numpy()
+        start = time.perf_counter()
+        probabilities.append(np.asarray(model.predict_on_batch(fit_input(model, images))))
+        seconds += time.perf_counter() - start
+        labels.append(np.argmax(batch_labels.numpy(), axis=1))
+
+    probabilities = np.concatenate(probabilities)
+    return probabilities, np.concatenate(labels), seconds / len(probabilities)
+
+
+def calibrate(small_model, large_model, val_ds, config=CONFIG):
+    """
+    Escalation rate, accuracy and estimated per-image cost for each
+    threshold on the calibration split
+    The chosen threshold is the lowest (fewest escalations) whose cascade
+    accuracy is within max_accuracy_drop of the large model alone
+    """
+    # Warm both models so tracing is not counted as latency
+    for images, _ in val_ds.take(1):
+        small_model.predict_on_batch(fit_input(small_model, images.numpy()))
+        large_model.predict_on_batch(images.numpy())
+
+    small_probs, labels, small_cost = _collect(small_model, val_ds)
+    large_probs, _, large_cost = _collect(large_model, val_ds)
+
+    small_pred = small_probs.argmax(axis=1)
+    large_pred = large_probs.argmax(axis=1)
+    small_conf = small_probs.max(axis=1)
+    large_accuracy = float(np.mean(large_pred == labels))
+
+    rows = []
+    for threshold in config['thresholds']:
+        accepted = small_conf >= threshold
+        cascade_pred = np.where(accepted, small_pred, large_pred)
+        escalation_rate = float(1 - accepted.mean())
+        rows.append({
+            'threshold': float(threshold),
+            'escalation_rate': escalation_rate,
+            'accuracy': float(np.mean(cascade_pred == labels)),
+            'accepted_accuracy': float(np.mean(small_pred[accepted] == labels[accepted])) if accepted.any() else None,
+            'ms_per_image': (small_cost + escalation_rate * large_cost) * 1000
+        })
+
+    eligible = [row for row in rows if row['accuracy'] >= large_accuracy - config['max_accuracy_drop']]
+    chosen = min(eligible, key=lambda row: row['threshold']) if eligible else max(rows, key=lambda row: row['threshold'])
+
+    return {
+        'small_model_path': config['small_model_path'],
+        'large_model_path': config['large_model_path'],
+        'threshold': chosen['threshold'],
+        'validation_images': int(len(labels)),
+        'small_accuracy': float(np.mean(small_pred == labels)),
+        'large_accuracy': large_accuracy,
+        'small_ms_per_image': small_cost * 1000,
+        'large_ms_per_image': large_cost * 1000,
+        'chosen': chosen,
+        'thresholds': rows
+    }
+
+
+def print_report(report):
+    print(f"\nSmall model: {report['small_accuracy']*100:.2f}% accuracy, {report['small_ms_per_image']:.1f} ms/image")
+    print(f"Large model: {report['large_accuracy']*100:.2f}% accuracy, {report['large_ms_per_image']:.1f} ms/image")
+    print(f"\n{'Threshold':>9s} {'Escalated':>10s} {'Accuracy':>9s} {'ms/image':>9s}")
+    print("-" * 40)
+    for row in report['thresholds']:
+        marker = ' <-' if row['threshold'] == report['threshold'] else ''
+        print(f"{row['threshold']:9.2f} {row['escalation_rate']*100:9.1f}% {row['accuracy']*100:8.2f}% "
+              f"{row['ms_per_image']:9.1f}{marker}")
+
+
+def build_cascade(config=CONFIG, train=True):
+    """
+    Train (or load) the small model, calibrate the threshold against the
+    large model on held-out images and save the report that load_cascade reads
+    """
+    train_ds, selection_ds, calibration_ds, class_names = cascade_datasets(config)
+
+    if train:
+        small_model = train_small_model(train_ds, selection_ds, len(class_names), config)
+    else:
+        small_model = load_inference_model(config['small_model_path'])
+
+    large_model = load_inference_model(config['large_model_path'])
+    if small_model.output_shape[-1] != large_model.output_shape[-1]:
+        raise ValueError(f"Small model has {small_model.output_shape[-1]} classes, "
+                         f"large model {large_model.output_shape[-1]}")
+
+    # Full-size images, as the cascade is served
+    report = calibrate(small_model, large_model, calibration_ds, config)
+    print_report(report)
+
+    with open(config['report_path'], 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nCascade threshold {report['threshold']:.2f} saved to {config['report_path']} "
+          f"(serve it with --model {config['report_path']})")
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train and calibrate the small-model-first cascade')
+    parser.add_argument('--data-dir', default=CONFIG['data_dir'])
+    parser.add_argument('--large-model', default=CONFIG['large_model_path'])
+    parser.add_argument('--small-model', default=CONFIG['small_model_path'])
+    parser.add_argument('--small-img-size', type=int, default=CONFIG['small_img_size'][0])
+    parser.add_argument('--epochs', type=int, default=CONFIG['epochs'])
+    parser.add_argument('--max-accuracy-drop', type=float, default=CONFIG['max_accuracy_drop'])
+    parser.add_argument('--output', default=CONFIG['report_path'])
+    parser.add_argument('--skip-training', action='store_true', help='Calibrate an already trained small model')
+    args = parser.parse_args()
+
+    build_cascade({
+        **CONFIG,
+        'data_dir': args.data_dir,
+        'large_model_path': args.large_model,
+        'small_model_path': args.small_model,
+        'small_img_size': (args.small_img_size, args.small_img_size),
+        'epochs': args.epochs,
+        'max_accuracy_drop': args.max_accuracy_drop,
+        'report_path': args.output
+    }, train=not args.skip_training)
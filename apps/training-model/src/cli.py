@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Before anything can import matplotlib or TensorFlow: no display, no C++ log noise
+os.environ.setdefault('MPLBACKEND', 'Agg')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+
+# Defaults of the subcommands without a module CONFIG
+# (train and serve start from app.CONFIG and server.CONFIG)
+DEFAULTS = {
+    'export': {
+        'model_path': 'models/plant_disease_model.keras',
+        'data_dir': './dataset/plant_disease',
+        'output_dir': 'models',
+        'quantizations': ['float16', 'int8'],
+        'calibration_samples': 200,
+        'batch_size': 32,
+        'cache_dir': None
+    },
+    'score': {
+        'model_path': 'models/plant_disease_model.keras',
+        'class_names_path': 'models/class_names.json',
+        'output': '-',
+        'batch_size': 32,
+        'top_k': 5,
+        'visualize_dir': None
+    },
+    'benchmark': {
+        'models': [],  # Empty: every artifact found under models/
+        'image_dir': None,
+        'num_images': 64,
+        'latency_runs': 200,
+        'batch_sizes': [1, 2, 4, 8, 16, 32, 64],
+        'output': 'models/benchmark_report.json',
+        'baseline': None
+    },
+    'health': {
+        'url': 'http://localhost:8501/health',
+        'timeout': 5.0
+    }
+}
+
+
+def load_config_file(path):
+    """
+    Settings file with one section per subcommand, JSON or TOML
+    e.g. {"train": {"epochs_finetune": 5}, "serve": {"port": 8080}}
+    """
+    path = Path(path)
+    if path.suffix == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def parse_value(text):
+    """
+    --set values are JSON when they parse as JSON (numbers, true/false,
+    null, lists), plain strings otherwise
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def resolve(command, args, base):
+    """
+    Settings for a subcommand: base < config file section < --set < flags
+    Only flags given on the command line override (their defaults are None/empty)
+    """
+    config = dict(base)
+    section = args.file_config.get(command, {})
+
+    overrides = dict(section)
+    for item in getattr(args, 'set', None) or []:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise SystemExit(f"--set expects KEY=VALUE, got {item!r}")
+        overrides[key] = parse_value(value)
+    overrides.update({key: value for key, value in vars(args).items()
+                      if key in args.flag_keys and value not in (None, [])})
+
+    unknown = sorted(set(overrides) - set(config))
+    if unknown:
+        raise SystemExit(f"Unknown {command} setting(s): {', '.join(unknown)}")
+
+    config.update(overrides)
+    return config
+
+
+def run_train(args):
+    import app
+
+    app.CONFIG.update(resolve('train', args, app.CONFIG))
+    app.train_model(resume=args.resume)
+
+
+def run_export(args):
+    config = resolve('export', args, DEFAULTS['export'])
+
+    from predict import load_model_with_lambda
+    from data_loader import create_datasets
+    from convert_model import export_tflite_models
+
+    model = load_model_with_lambda(config['model_path'])
+    train_ds, val_ds, _ = create_datasets(
+        config['data_dir'],
+        img_size=tuple(model.input_shape[1:3]),
+        batch_size=config['batch_size'],
+        augmentation=None,
+        cache_dir=config['cache_dir'],
+        image_dtype='uint8',
+        cache_in_memory=False  # Calibration and the accuracy report are single passes
+    )
+
+    Path(config['output_dir']).mkdir(parents=True, exist_ok=True)
+    export_tflite_models(
+        model,
+        train_ds,
+        val_ds,
+        output_dir=config['output_dir'],
+        quantizations=config['quantizations'],
+        num_calibration_samples=config['calibration_samples'],
+        keras_path=config['model_path']
+    )
+
+
+def run_score(args):
+    config = resolve('score', args, DEFAULTS['score'])
+
+    from predict import load_inference_model, load_class_names
+    from score import list_images, score
+
+    paths = list_images(args.source)
+    print(f"Scoring {len(paths)} image(s) from {args.source}", file=sys.stderr)
+
+    model = load_inference_model(config['model_path'])
+    class_names = load_class_names(config['class_names_path'])
+
+    out = sys.stdout if config['output'] == '-' else open(config['output'], 'w')
+    try:
+        scored, failed = score(
+            model,
+            class_names,
+            paths,
+            out,
+            batch_size=config['batch_size'],
+            top_k=config['top_k'],
+            visualize_dir=config['visualize_dir']
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Scored {scored} image(s), {failed} failed", file=sys.stderr)
+
+
+def run_serve(args):
+    import server
+
+    server.serve(resolve('serve', args, server.CONFIG))
+
+
+def run_benchmark(args):
+    config = resolve('benchmark', args, DEFAULTS['benchmark'])
+
+    # TensorFlow is only imported by the per-artifact processes and the report
+    from benchmark import DEFAULT_ARTIFACTS, find_artifacts, run_benchmark, print_report, compare_reports
+
+    artifacts = find_artifacts(config['models'] or DEFAULT_ARTIFACTS)
+    if not artifacts:
+        raise SystemExit("No model artifacts found")
+
+    report = run_benchmark(
+        artifacts,
+        num_images=config['num_images'],
+        image_dir=config['image_dir'],
+        latency_runs=config['latency_runs'],
+        batch_sizes=config['batch_sizes']
+    )
+    print_report(report)
+
+    Path(config['output']).parent.mkdir(parents=True, exist_ok=True)
+    with open(config['output'], 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report saved to {config['output']}")
+
+    if config['baseline']:
+        with open(config['baseline'], 'r') as f:
+            if compare_reports(json.load(f), report):
+                return 1
+    return 0
+
+
+def run_health(args):
+    """
+    Query a running server's /health, no TensorFlow in this process
+    Exit code 0 when it answers ok, 1 otherwise (for probes and scripts)
+    """
+    import urllib.request
+
+    config = resolve('health', args, DEFAULTS['health'])
+    try:
+        with urllib.request.urlopen(config['url'], timeout=config['timeout']) as response:
+            status = json.load(response)
+    except (OSError, ValueError) as e:
+        print(f"unhealthy: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(status))
+    return 0 if status.get('status') == 'ok' else 1
+
+
+def build_parser():
+    """
+    Argument parser for every subcommand, built without importing any of them
+    """
+    parser = argparse.ArgumentParser(
+        description='Plant disease model: train, export, score, serve and benchmark',
+        epilog='Settings come from the module defaults, then the --config section '
+               'named after the subcommand, then --set, then explicit flags'
+    )
+    parser.add_argument('--config', metavar='FILE', help='JSON or TOML settings file, one section per subcommand')
+    parser.add_argument('-C', '--workdir', metavar='DIR',
+                        help='resolve relative paths (models/, dataset/) against DIR instead of the current directory')
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    def add_command(name, handler, help, flags=(), settable=False):
+        sub = subparsers.add_parser(name, help=help, description=help)
+        for args, kwargs in flags:
+            sub.add_argument(*args, default=None, **kwargs)
+        if settable:
+            sub.add_argument('--set', action='append', metavar='KEY=VALUE',
+                             help='override any CONFIG key, value parsed as JSON when possible (repeatable)')
+        sub.set_defaults(handler=handler, flag_keys={
+            action.dest for action in sub._actions if action.dest not in ('help', 'set', 'source', 'resume')
+        })
+        return sub
+
+    train = add_command('train', run_train, 'Train, evaluate, save and publish the model', settable=True, flags=(
+        (('--data-dir',), {}),
+        (('--output-dir',), {'help': 'where the model, class names and reports are written'}),
+        (('--epochs-initial',), {'type': int}),
+        (('--epochs-finetune',), {'type': int}),
+        (('--batch-size',), {'type': int}),
+        (('--distribution',), {'choices': ('mirrored', 'multi_worker'),
+                               'help': 'mirrored: one process over local devices; multi_worker: one process per '
+                                       'worker from TF_CONFIG, see launch_workers.py'}),
+        (('--cpu-replicas',), {'type': int, 'help': "logical CPU devices for 'mirrored' on a CPU-only host"})
+    ))
+    train.add_argument('--resume', action='store_true', help='continue an interrupted run from the backup directory')
+
+    add_command('export', run_export, 'Export the trained model to quantized TFLite', flags=(
+        (('--model',), {'dest': 'model_path'}),
+        (('--data-dir',), {}),
+        (('--output-dir',), {}),
+        (('--quantization',), {'dest': 'quantizations', 'nargs': '+', 'choices': ('float16', 'int8')}),
+        (('--calibration-samples',), {'type': int}),
+        (('--batch-size',), {'type': int}),
+        (('--cache-dir',), {'help': 'TFRecord cache directory, see data_loader'})
+    ))
+
+    score = add_command('score', run_score, 'Bulk-score a directory or manifest of images to JSONL', flags=(
+        (('--model',), {'dest': 'model_path'}),
+        (('--class-names',), {'dest': 'class_names_path'}),
+        (('--output',), {'help': 'JSONL output path, - for stdout'}),
+        (('--batch-size',), {'type': int}),
+        (('--top-k',), {'type': int}),
+        (('--visualize',), {'dest': 'visualize_dir', 'metavar': 'DIR', 'help': 'also save a prediction plot per image'})
+    ))
+    score.add_argument('source', help='image directory or manifest file (one path per line)')
+
+    add_command('serve', run_serve, 'Batched HTTP inference server', settable=True, flags=(
+        (('--registry',), {'dest': 'registry_dir', 'help': "versioned model directory, '' to always serve --model"}),
+        (('--model',), {'dest': 'model_path'}),
+        (('--class-names',), {'dest': 'class_names_path'}),
+        (('--latency-budget-ms',), {'type': float, 'help': 'serve the best distilled tier within this latency'}),
+        (('--host',), {}),
+        (('--port',), {'type': int}),
+        (('--max-batch-size',), {'type': int}),
+        (('--max-wait-ms',), {'type': float}),
+        (('--top-k',), {'type': int}),
+        (('--cache-items',), {'type': int}),
+        (('--cache-dir',), {})
+    ))
+
+    add_command('benchmark', run_benchmark, 'Benchmark inference for each model artifact', flags=(
+        (('models',), {'nargs': '*', 'help': 'artifacts (.keras, SavedModel dir, .tflite), default: all found in models/'}),
+        (('--images',), {'dest': 'image_dir', 'help': 'directory of sample images, synthetic images if omitted'}),
+        (('--num-images',), {'type': int}),
+        (('--latency-runs',), {'type': int}),
+        (('--batch-sizes',), {'type': int, 'nargs': '+'}),
+        (('--output',), {}),
+        (('--baseline',), {'help': 'previous report to check for regressions'})
+    ))
+
+    add_command('health', run_health, 'Check a running server, exit code 0 if healthy', flags=(
+        (('--url',), {}),
+        (('--timeout',), {'type': float})
+    ))
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.file_config = load_config_file(args.config) if args.config else {}
+
+    if args.workdir:
+        os.chdir(args.workdir)
+
+    return args.handler(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
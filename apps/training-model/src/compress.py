@@ -0,0 +1,206 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from keras import layers
+
+
+PRUNABLE_LAYERS = (layers.Conv2D, layers.DepthwiseConv2D, layers.Dense)
+
+
+def prunable_kernels(model, trainable_only=False, min_weights=1024):
+    """
+    Conv/Dense kernels worth compressing, nested models included
+    Small kernels (the classifier output, first conv) are left alone
+    """
+    kernels = []
+
+    def visit(layer):
+        for child in getattr(layer, 'layers', []):
+            visit(child)
+        if not isinstance(layer, PRUNABLE_LAYERS):
+            return
+        if trainable_only and not layer.trainable:
+            return
+        kernel = getattr(layer, 'kernel', None)
+        if kernel is not None and int(np.prod(kernel.shape)) >= min_weights:
+            kernels.append(kernel)
+
+    for layer in model.layers:
+        visit(layer)
+    return kernels
+
+
+class MagnitudePruning(tf.keras.callbacks.Callback):
+    """
+    Gradual magnitude pruning during training, without tfmot wrappers
+    Every frequency steps between begin_step and end_step the smallest
+    weights of each kernel are zeroed, following the polynomial schedule
+    s = final + (initial - final) * (1 - progress)^3; after every batch the
+    masks are re-applied so the optimizer cannot bring pruned weights back
+    Nothing to strip at export: the kernels are plain variables holding zeros
+    """
+
+    def __init__(self, final_sparsity=0.5, begin_step=0, end_step=1000, frequency=50,
+                 initial_sparsity=0.0, trainable_only=True, min_weights=1024):
+        super().__init__()
+        self.final_sparsity = final_sparsity
+        self.initial_sparsity = initial_sparsity
+        self.begin_step = begin_step
+        self.end_step = max(end_step, begin_step + 1)
+        self.frequency = frequency
+        self.trainable_only = trainable_only
+        self.min_weights = min_weights
+
+        self.step = 0
+        self.sparsity = 0.0
+        self._kernels = []
+        self._masks = []
+
+    def target_sparsity(self, step):
+        progress = min(1.0, max(0.0, (step - self.begin_step) / (self.end_step - self.begin_step)))
+        return self.final_sparsity + (self.initial_sparsity - self.final_sparsity) * (1 - progress) ** 3
+
+    def on_train_begin(self, logs=None):
+        self._kernels = prunable_kernels(self.model, self.trainable_only, self.min_weights)
+        if not self._masks:
+            self._masks = [None] * len(self._kernels)
+
+    def _update_masks(self, sparsity):
+        for i, kernel in enumerate(self._kernels):
+            values = np.abs(kernel.numpy())
+            k = int(values.size * sparsity)
+            if k == 0:
+                continue
+            threshold = np.partition(values, k - 1, axis=None)[k - 1]
+            self._masks[i] = (values > threshold).astype(values.dtype)
+        self.sparsity = sparsity
+
+    def _apply_masks(self):
+        for kernel, mask in zip(self._kernels, self._masks):
+            if mask is not None:
+                kernel.assign(kernel.numpy() * mask)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+        in_schedule = self.begin_step <= self.step <= self.end_step
+        if (in_schedule and (self.step - self.begin_step) % self.frequency == 0) or self.step == self.end_step:
+            self._update_masks(self.target_sparsity(self.step))
+        self._apply_masks()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is not None:
+            logs['sparsity'] = self.sparsity
+
+    def on_train_end(self, logs=None):
+        # Reach the final sparsity even if training stopped early
+        if self.sparsity < self.final_sparsity:
+            self._update_masks(self.final_sparsity)
+        self._apply_masks()
+
+
+def _kmeans_1d(values, num_clusters, iterations=20):
+    """
+    Lloyd's k-means on scalars, linear centroid initialization
+    (as tfmot's default), sorted centroids make assignment a searchsorted
+    """
+    centroids = np.linspace(values.min(), values.max(), num_clusters)
+    for _ in range(iterations):
+        boundaries = (centroids[1:] + centroids[:-1]) / 2
+        assignment = np.searchsorted(boundaries, values)
+        sums = np.bincount(assignment, weights=values, minlength=num_clusters)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        updated = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+        updated.sort()
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    boundaries = (centroids[1:] + centroids[:-1]) / 2
+    return centroids, np.searchsorted(boundaries, values)
+
+
+def cluster_weights(model, num_clusters=16, min_weights=1024):
+    """
+    Replace every prunable kernel's weights by the nearest of num_clusters
+    shared values (per-layer k-means), keeping pruned zeros at exactly zero
+    16 clusters = 4-bit indices; the kernels stay plain float tensors, so
+    the gain shows up in compressed size
+    """
+    for kernel in prunable_kernels(model, min_weights=min_weights):
+        values = kernel.numpy()
+        flat = values.reshape(-1)
+        nonzero = flat != 0
+        if nonzero.sum() <= num_clusters:
+            continue
+
+        centroids, assignment = _kmeans_1d(flat[nonzero].astype(np.float64), num_clusters)
+        clustered = np.zeros_like(flat)
+        clustered[nonzero] = centroids[assignment]
+        kernel.assign(clustered.reshape(values.shape))
+
+
+def model_sparsity(model, min_weights=1024):
+    """
+    Fraction of zeros over the prunable kernels
+    """
+    kernels = prunable_kernels(model, min_weights=min_weights)
+    total = sum(int(np.prod(k.shape)) for k in kernels)
+    zeros = sum(int(np.sum(k.numpy() == 0)) for k in kernels)
+    return zeros / total if total else 0.0
+
+
+def gzipped_size_mb(path):
+    """
+    Size after gzip, what pruning and clustering actually save for a
+    dense-format artifact (download, image layer, cold load from disk)
+    """
+    path = Path(path)
+    if path.is_dir():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = shutil.make_archive(os.path.join(tmp_dir, 'model'), 'gztar', path)
+            return os.path.getsize(archive) / 1e6
+
+    with open(path, 'rb') as f:
+        return len(gzip.compress(f.read(), compresslevel=6)) / 1e6
+
+
+def compare_models(baseline_path, compressed_path, val_ds, report_path=None):
+    """
+    Size (raw and gzipped), latency and accuracy of the compressed model
+    against the uncompressed one
+    """
+    from predict import load_inference_model
+    from distill import evaluate_accuracy, measure_latency
+
+    rows = []
+    for name, path in (('baseline', baseline_path), ('compressed', compressed_path)):
+        model = load_inference_model(path)
+        row = {
+            'name': name,
+            'path': str(path),
+            'size_mb': os.path.getsize(path) / 1e6,
+            'gzipped_mb': gzipped_size_mb(path),
+            'sparsity': model_sparsity(model) if hasattr(model, 'layers') else None,
+            'accuracy': evaluate_accuracy(model, val_ds)
+        }
+        row.update(measure_latency(model))
+        rows.append(row)
+
+    print(f"\n{'Model':12s} {'Size MB':>8s} {'gzip MB':>8s} {'Sparsity':>9s} {'Accuracy':>9s} {'p50 ms':>7s}")
+    print("-" * 58)
+    for row in rows:
+        sparsity = f"{row['sparsity']*100:8.1f}%" if row['sparsity'] is not None else '        -'
+        print(f"{row['name']:12s} {row['size_mb']:8.2f} {row['gzipped_mb']:8.2f} {sparsity} "
+              f"{row['accuracy']*100:8.2f}% {row['p50_ms']:7.1f}")
+
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump({'models': rows}, f, indent=2)
+        print(f"Compression report saved to {report_path}")
+
+    return rows
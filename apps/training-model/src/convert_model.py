@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from data_loader import create_datasets
+from model import strip_augmentation
+from predict import load_model_with_lambda
+from tflite_runner import TFLiteModel
+
+
+QUANTIZATIONS = ('float16', 'int8')
+
+
+def representative_dataset(train_ds, num_samples=200):
+    """
+    Calibration samples for int8 conversion, one image at a time
+    Drawn from an un-augmented training split (create_datasets(augmentation=None))
+    """
+    def generator():
+        seen = 0
+        for images, _ in train_ds:
+            for image in images:
+                yield [tf.cast(image[tf.newaxis], tf.float32)]
+                seen += 1
+                if seen >= num_samples:
+                    return
+
+    return generator
+
+
+def convert_to_tflite(model, output_path, quantization=None, representative_data=None):
+    """
+    Convert a Keras model to TFLite
+    quantization: None (float32), 'float16' or 'int8' (full integer, uint8 input)
+    """
+    if quantization not in (None, *QUANTIZATIONS):
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if quantization == 'int8' and representative_data is None:
+        raise ValueError("int8 quantization needs a representative dataset")
+
+    # Convert through a SavedModel, Keras 3 models are not accepted directly
+    with tempfile.TemporaryDirectory() as export_dir:
+        strip_augmentation(model).export(export_dir, verbose=False)
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir)
+
+        if quantization == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == 'int8':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_data
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            # Pixels are 0-255 already, so uint8 input maps 1:1
+            converter.inference_input_type = tf.uint8
+            converter.inference_output_type = tf.uint8
+
+        tflite_model = converter.convert()
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+    print(f"TFLite model ({quantization or 'float32'}) saved to {output_path} "
+          f"({len(tflite_model) / 1e6:.2f} MB)")
+
+    return output_path
+
+
+def evaluate_predictions(model, val_ds):
+    """
+    Top-1 predictions and labels over the validation set
+    """
+    predicted = []
+    labels = []
+    for images, batch_labels in val_ds:
+        predicted.append(np.argmax(model.predict_on_batch(images.numpy()), axis=1))
+        labels.append(np.argmax(batch_labels.numpy(), axis=1))
+
+    return np.concatenate(predicted), np.concatenate(labels)
+
+
+def accuracy_report(keras_model, tflite_paths, val_ds, keras_path=None):
+    """
+    Compare each TFLite model against the Keras model on the validation set
+    Reports accuracy, accuracy delta, top-1 agreement and file size
+    """
+    reference, labels = evaluate_predictions(keras_model, val_ds)
+    reference_acc = float(np.mean(reference == labels))
+
+    report = {
+        'keras': {
+            'path': str(keras_path) if keras_path else None,
+            'accuracy': reference_acc,
+            'size_mb': os.path.getsize(keras_path) / 1e6 if keras_path else None
+        }
+    }
+
+    for name, path in tflite_paths.items():
+        predicted, _ = evaluate_predictions(TFLiteModel(path), val_ds)
+        accuracy = float(np.mean(predicted == labels))
+        report[name] = {
+            'path': str(path),
+            'accuracy': accuracy,
+            'accuracy_delta': accuracy - reference_acc,
+            'top1_agreement': float(np.mean(predicted == reference)),
+            'size_mb': os.path.getsize(path) / 1e6
+        }
+
+    print(f"\n{'Model':10s} {'Accuracy':>10s} {'Delta':>10s} {'Agreement':>10s} {'Size MB':>10s}")
+    print("-" * 54)
+    for name, row in report.items():
+        delta = f"{row['accuracy_delta']*100:+.2f}%" if 'accuracy_delta' in row else '-'
+        agreement = f"{row['top1_agreement']*100:.2f}%" if 'top1_agreement' in row else '-'
+        size = f"{row['size_mb']:.2f}" if row['size_mb'] is not None else '-'
+        print(f"{name:10s} {row['accuracy']*100:9.2f}% {delta:>10s} {agreement:>10s} {size:>10s}")
+
+    return report
+
+
+def export_tflite_models(model, train_ds, val_ds, output_dir='models', quantizations=QUANTIZATIONS,
+                         num_calibration_samples=200, keras_path=None):
+    """
+    Export stage: quantized TFLite models plus an accuracy-delta report
+    """
+    output_dir = Path(output_dir)
+    tflite_paths = {}
+
+    for quantization in quantizations:
+        path = output_dir / f"plant_disease_model_{quantization}.tflite"
+        convert_to_tflite(
+            model,
+            path,
+            quantization=quantization,
+            representative_data=representative_dataset(train_ds, num_calibration_samples)
+        )
+        tflite_paths[quantization] = path
+
+    report = accuracy_report(model, tflite_paths, val_ds, keras_path=keras_path)
+
+    report_path = output_dir / 'tflite_report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Accuracy report saved to {report_path}")
+
+    return tflite_paths, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the trained model to quantized TFLite')
+    parser.add_argument('--model', default='models/plant_disease_model.keras')
+    parser.add_argument('--data-dir', default='./dataset/plant_disease')
+    parser.add_argument('--output-dir', default='models')
+    parser.add_argument('--quantization', nargs='+', choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--cache-dir', help='TFRecord cache directory, see data_loader')
+    args = parser.parse_args()
+
+    model = load_model_with_lambda(args.model)
+    train_ds, val_ds, _ = create_datasets(
+        args.data_dir,
+        img_size=tuple(model.input_shape[1:3]),
+        batch_size=args.batch_size,
+        augmentation=None,
+        cache_dir=args.cache_dir,
+        image_dtype='uint8',
+        cache_in_memory=False  # Calibration and the accuracy report are single passes
+    )
+
+    export_tflite_models(
+        model,
+        train_ds,
+        val_ds,
+        output_dir=args.output_dir,
+        quantizations=args.quantization,
+        num_calibration_samples=args.calibration_samples,
+        keras_path=args.model
+    )
@@ -1,11 +1,462 @@
 import tensorflow as tf
 from pathlib import Path
+import hashlib
 import json
+import math
+import os
+import random
+import shutil
 
-def create_datasets(data_dir, img_size=(224, 224), batch_size=32, validation_split=0.2):
+DEFAULT_AUGMENTATION = {
+    'flip': 'horizontal',
+    'rotation': 0.1,
+    'zoom': 0.1
+}
+
+
+def create_augmentation(flip='horizontal', rotation=0.1, zoom=0.1):
+    """
+    Build the training augmentation stage
+    Runs inside tf.data, so it stays out of the saved inference model
+    Set any option to None/0 to disable it
+    """
+    augmentation_layers = []
+    if flip:
+        augmentation_layers.append(tf.keras.layers.RandomFlip(flip))
+    if rotation:
+        augmentation_layers.append(tf.keras.layers.RandomRotation(rotation))
+    if zoom:
+        augmentation_layers.append(tf.keras.layers.RandomZoom(zoom))
+
+    return tf.keras.Sequential(augmentation_layers)
+
+
+def _final_map_fn(augmentation=None):
+    """
+    Last tf.data stage before the model: optional augmentation, then the
+    cast to float32, so cached and shuffled images can stay uint8
+    """
+    augment = create_augmentation(**augmentation) if augmentation else None
+
+    def final_map(images, labels):
+        if augment is not None:
+            images = augment(images, training=True)
+        return tf.cast(images, tf.float32), labels
+
+    return final_map
+
+
+IMAGE_EXTENSIONS = ('.bmp', '.gif', '.jpeg', '.jpg', '.png')
+
+# Held-out images live in data_dir/test, see create_test_dataset
+TEST_DIR_NAME = 'test'
+
+
+def default_index_path(data_dir):
+    """
+    Index file kept next to the data directory (dataset/plant_disease.index.json)
+    """
+    data_path = Path(data_dir)
+    return data_path.parent / f"{data_path.name}.index.json"
+
+
+def _assign_split(rel_path, validation_split, seed):
+    """
+    Deterministic train/val assignment from a hash of the relative path
+    Stable when images are added, unlike re-shuffling the whole list
+    """
+    digest = hashlib.md5(f"{seed}:{rel_path}".encode()).digest()
+    return 'val' if int.from_bytes(digest[:4], 'big') / 2**32 < validation_split else 'train'
+
+
+def _scan_directory(data_path, rel_dir):
+    """
+    List image files and subdirectories directly inside one directory
+    """
+    files = []
+    subdirs = []
+    with os.scandir(data_path / rel_dir) as entries:
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}"
+            if entry.is_dir():
+                subdirs.append(rel_path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                stat = entry.stat()
+                files.append((rel_path, stat.st_size, stat.st_mtime_ns))
+    return files, sorted(subdirs)
+
+
+def build_dataset_index(data_dir, index_path=None, validation_split=0.2, seed=123):
+    """
+    Scan the class-directory tree once and keep a file index on disk
+    Each entry is [relative path, class id, size, mtime, split]
+
+    Later runs list each directory again (names, sizes and mtimes only,
+    nothing is decoded) and only rebuild the entries of directories whose
+    signature changed; the signature covers every file's size and mtime,
+    since an image overwritten in place leaves its directory's mtime alone
+    New classes are appended to class_names, existing class ids never move,
+    also when a settings change (validation_split, seed, root) forces a rebuild
+    """
+    data_path = Path(data_dir)
+    index_path = Path(index_path) if index_path else default_index_path(data_dir)
+    settings = {
+        'root': str(data_path.resolve()),
+        'validation_split': validation_split,
+        'seed': seed
+    }
+
+    index = None
+    class_names = []
+    if index_path.exists():
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        # Class ids outlive a rebuild, models trained on the old index still apply
+        class_names = index['class_names']
+        if any(index.get(key) != value for key, value in settings.items()):
+            print(f"Dataset index settings changed, rebuilding {index_path}")
+            index = None
+
+    if index is None:
+        index = {**settings, 'fingerprint': None, 'class_names': class_names, 'dirs': {}, 'files': []}
+
+    class_names = index['class_names']
+    dirs = index['dirs']
+    files = {entry[0]: entry for entry in index['files']}
+    changed = False
+
+    current_classes = sorted(
+        entry.name for entry in os.scandir(data_path)
+        if entry.is_dir() and entry.name != TEST_DIR_NAME
+    )
+    for class_name in current_classes:
+        if class_name not in class_names:
+            class_names.append(class_name)
+            changed = True
+    class_ids = {name: i for i, name in enumerate(class_names)}
+
+    # Walk the tree, rebuilding only directories whose signature moved
+    seen_dirs = set()
+    pending = list(current_classes)
+    while pending:
+        rel_dir = pending.pop()
+        seen_dirs.add(rel_dir)
+        dir_files, subdirs = _scan_directory(data_path, rel_dir)
+        signature = hashlib.sha1(json.dumps([sorted(dir_files), subdirs]).encode()).hexdigest()[:16]
+        known = dirs.get(rel_dir)
+
+        pending.extend(subdirs)
+        if known and known.get('signature') == signature:
+            continue
+
+        present = set()
+        for rel_path, size, file_mtime in dir_files:
+            present.add(rel_path)
+            entry = files.get(rel_path)
+            split = entry[4] if entry else _assign_split(rel_path, validation_split, seed)
+            files[rel_path] = [rel_path, class_ids[rel_dir.split('/')[0]], size, file_mtime, split]
+
+        for rel_path in [p for p in files if os.path.dirname(p) == rel_dir and p not in present]:
+            del files[rel_path]
+
+        dirs[rel_dir] = {'signature': signature, 'subdirs': subdirs}
+        changed = True
+
+    # Directories that disappeared take their files with them
+    for rel_dir in [d for d in dirs if d not in seen_dirs]:
+        del dirs[rel_dir]
+        for rel_path in [p for p in files if os.path.dirname(p) == rel_dir]:
+            del files[rel_path]
+        changed = True
+
+    if changed or index['fingerprint'] is None:
+        index['files'] = sorted(files.values())
+        digest = hashlib.sha1(json.dumps([class_names, index['files']]).encode())
+        index['fingerprint'] = digest.hexdigest()[:16]
+
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, index_path)
+
+    return index
+
+
+def read_dataset_index(data_dir, index_path=None):
+    """
+    Load an index written by build_dataset_index, without touching the tree
+    """
+    index_path = Path(index_path) if index_path else default_index_path(data_dir)
+    with open(index_path, 'r') as f:
+        return json.load(f)
+
+
+def index_split(index, split=None):
+    """
+    (absolute paths, class ids) for 'train', 'val', or everything when split is None
+    """
+    root = Path(index['root'])
+    entries = [entry for entry in index['files'] if split is None or entry[4] == split]
+    return [str(root / entry[0]) for entry in entries], [entry[1] for entry in entries]
+
+
+def index_counts(index):
+    """
+    Sample counts per split, straight from the index
+    """
+    counts = {'train': 0, 'val': 0}
+    for entry in index['files']:
+        counts[entry[4]] += 1
+    return counts
+
+
+def _decode_and_resize(path, img_size, dtype=tf.uint8):
+    """
+    Decode and resize, same bilinear resize as image_dataset_from_directory
+    uint8 output is rounded, float32 output is left as resized
+    """
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, img_size)
+    if dtype == tf.uint8:
+        img = tf.cast(tf.round(tf.clip_by_value(img, 0, 255)), tf.uint8)
+    return img
+
+
+def _write_shards(paths, labels, output_dir, split, img_size, images_per_shard):
+    """
+    Decode images in parallel and write them as raw uint8 TFRecord shards
+    Returns the number of records in each shard, in file order
+    """
+    num_shards = max(1, math.ceil(len(paths) / images_per_shard))
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(
+        lambda path, label: (_decode_and_resize(path, img_size), label),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+
+    writer = None
+    sizes = []
+    for i, (image, label) in enumerate(ds.as_numpy_iterator()):
+        if i % images_per_shard == 0:
+            if writer:
+                writer.close()
+            shard = i // images_per_shard
+            writer = tf.io.TFRecordWriter(str(output_dir / f"{split}-{shard:05d}-of-{num_shards:05d}.tfrecord"))
+            sizes.append(0)
+
+        example = tf.train.Example(features=tf.train.Features(feature={
+            'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+            'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)]))
+        }))
+        writer.write(example.SerializeToString())
+        sizes[-1] += 1
+
+    if writer:
+        writer.close()
+    return sizes
+
+
+def _shuffle_files(paths, labels, seed):
+    """
+    Mix the class-sorted index order once with seed, so every shard holds
+    every class and a small shuffle buffer is enough at read time
+    """
+    order = list(range(len(paths)))
+    random.Random(seed).shuffle(order)
+    return [paths[i] for i in order], [labels[i] for i in order]
+
+
+def build_tfrecord_cache(data_dir, cache_dir, img_size=(224, 224), validation_split=0.2, seed=123,
+                         images_per_shard=2000, index_path=None):
+    """
+    One-time conversion of the image tree into sharded TFRecords of resized
+    uint8 images, keyed by img_size, seed and the dataset index fingerprint
+    Returns the shard directory, reused as-is when it already exists
+    """
+    index = build_dataset_index(data_dir, index_path, validation_split, seed)
+    shard_dir = Path(cache_dir) / f"{index['fingerprint']}-{img_size[0]}x{img_size[1]}-seed{seed}"
+
+    if (shard_dir / 'meta.json').exists():
+        print(f"Using TFRecord cache: {shard_dir}")
+        return shard_dir
+
+    print(f"Building TFRecord cache for {len(index['files'])} images: {shard_dir}")
+    tmp_dir = shard_dir.with_name(f"{shard_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    counts = {}
+    shard_sizes = {}
+    for split in ('train', 'val'):
+        split_paths, split_labels = _shuffle_files(*index_split(index, split), seed)
+        shard_sizes[split] = _write_shards(split_paths, split_labels, tmp_dir, split, img_size, images_per_shard)
+        counts[split] = len(split_paths)
+
+    meta = {
+        'fingerprint': index['fingerprint'],
+        'img_size': list(img_size),
+        'class_names': index['class_names'],
+        'counts': counts,
+        'shard_sizes': shard_sizes
+    }
+    with open(tmp_dir / 'meta.json', 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    # Publish atomically so an interrupted build is never picked up,
+    # another worker may have published the same cache meanwhile
+    try:
+        tmp_dir.rename(shard_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return shard_dir
+
+
+def load_tfrecord_split(shard_dir, split, batch_size=32, shuffle=False, num_shards=1, shard_index=0):
+    """
+    Stream one split from the shards with parallel interleave
+    Yields (uint8 images, one-hot labels) batches, see _final_map_fn
+    num_shards/shard_index give each replica every num_shards-th shard file,
+    cut to the record count of the smallest replica share so all replicas run
+    the same number of steps; with fewer files than replicas (or a cache
+    written without shard sizes) every num_shards-th record instead
+    """
+    with open(Path(shard_dir) / 'meta.json') as f:
+        meta = json.load(f)
+
+    height, width = meta['img_size']
+    num_classes = len(meta['class_names'])
+    files = sorted(str(path) for path in Path(shard_dir).glob(f"{split}-*.tfrecord"))
+    sizes = meta.get('shard_sizes', {}).get(split)
+    AUTOTUNE = tf.data.AUTOTUNE
+
+    sharded = num_shards > 1
+    by_file = sharded and sizes is not None and len(sizes) == len(files) and len(files) >= num_shards
+    if by_file:
+        count = min(sum(sizes[i::num_shards]) for i in range(num_shards))
+        files = files[shard_index::num_shards]
+    else:
+        count = meta['counts'][split] // num_shards
+    num_batches = math.ceil(count / batch_size)
+
+    # Record-level sharding needs the same record order on every replica
+    by_record = sharded and not by_file
+    file_ds = tf.data.Dataset.from_tensor_slices(tf.constant(files, dtype=tf.string))
+    if shuffle and not by_record:
+        file_ds = file_ds.shuffle(max(1, len(files)))
+    ds = file_ds.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=AUTOTUNE,
+        num_parallel_calls=AUTOTUNE,
+        deterministic=by_record or not shuffle
+    )
+    if by_record:
+        ds = ds.shard(num_shards, shard_index)
+    if sharded:
+        ds = ds.take(count)
+    if shuffle:
+        ds = ds.shuffle(buffer_size=10 * batch_size)
+    ds = ds.batch(batch_size)
+
+    def parse(records):
+        features = tf.io.parse_example(records, {
+            'image': tf.io.FixedLenFeature([], tf.string),
+            'label': tf.io.FixedLenFeature([], tf.int64)
+        })
+        images = tf.reshape(tf.io.decode_raw(features['image'], tf.uint8), [-1, height, width, 3])
+        return images, tf.one_hot(features['label'], num_classes)
+
+    ds = ds.map(parse, num_parallel_calls=AUTOTUNE)
+    ds = ds.apply(tf.data.experimental.assert_cardinality(num_batches))
+
+    return ds, meta['class_names']
+
+
+def _shard_files(paths, labels, num_shards=1, shard_index=0):
+    """
+    Every num_shards-th file starting at shard_index, for per-replica input
+    The last len % num_shards files are dropped so all shards have the same
+    size, synchronous replicas must run the same number of steps
+    """
+    if num_shards == 1:
+        return paths, labels
+
+    usable = len(paths) // num_shards * num_shards
+    return paths[shard_index:usable:num_shards], labels[shard_index:usable:num_shards]
+
+
+def _image_dataset(paths, labels, num_classes, img_size, batch_size, image_dtype='float32',
+                   shuffle_buffer=None, cache=True, seed=123):
+    """
+    Decode images from a list of paths in parallel and cache them
+    float32 caches whole batches; uint8 caches single images so they can be
+    reshuffled every epoch through a (cheap) uint8 shuffle buffer
+    cache=False skips the in-memory cache for single-pass consumers
+    seed fixes the one-time mix of the sorted file list
+    """
+    AUTOTUNE = tf.data.AUTOTUNE
+    dtype = tf.uint8 if image_dtype == 'uint8' else tf.float32
+
+    ds = tf.data.Dataset.from_tensor_slices((
+        tf.constant(paths, dtype=tf.string),
+        tf.constant(labels, dtype=tf.int64)
+    ))
+    if shuffle_buffer:
+        # Index order is sorted by class, mix it once before the first epoch
+        ds = ds.shuffle(max(1, len(paths)), seed=seed, reshuffle_each_iteration=False)
+
+    ds = ds.map(
+        lambda path, label: (_decode_and_resize(path, img_size, dtype), tf.one_hot(label, num_classes)),
+        num_parallel_calls=AUTOTUNE
+    )
+
+    if image_dtype == 'uint8':
+        if cache:
+            ds = ds.cache()
+        if shuffle_buffer:
+            ds = ds.shuffle(shuffle_buffer)
+        return ds.batch(batch_size)
+
+    ds = ds.batch(batch_size)
+    return ds.cache() if cache else ds
+
+
+def create_dataset_from_files(paths, labels, num_classes, img_size=(224, 224), batch_size=32,
+                              augmentation=None, image_dtype='uint8', shuffle_buffer=None, seed=123):
+    """
+    Batched (float32 images, one-hot labels) dataset from explicit file lists,
+    for callers that pick their own samples (e.g. incremental training)
+    """
+    AUTOTUNE = tf.data.AUTOTUNE
+    ds = _image_dataset(
+        paths, labels, num_classes, img_size, batch_size,
+        image_dtype=image_dtype, shuffle_buffer=shuffle_buffer, seed=seed
+    )
+    ds = ds.map(_final_map_fn(augmentation), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+def create_datasets(data_dir, img_size=(224, 224), batch_size=32, validation_split=0.2,
+                    augmentation=DEFAULT_AUGMENTATION, cache_dir=None, image_dtype='float32',
+                    shuffle_buffer=1000, index_path=None, cache_in_memory=True, num_shards=1, shard_index=0,
+                    seed=123):
     """
     Create train and validation datasets from directory
     Optimized for M2 Mac with efficient data loading
+    The file list and train/val split come from build_dataset_index, so the
+    tree is listed once and only changed directories are re-listed later
+    augmentation: create_augmentation() options for the training split,
+    applied after cache() so every epoch sees fresh variations; None disables it
+    cache_dir: stream from sharded TFRecords built once under this directory
+    instead of decoding JPEGs and caching them in memory
+    image_dtype: 'uint8' keeps decoded images as uint8 through cache() and a
+    per-epoch shuffle (4x less memory than float32), casting only at the end
+    cache_in_memory=False decodes on every pass, for one-off passes such as
+    feature extraction
+    num_shards/shard_index: this replica's share of both splits for
+    distributed training (batch_size is then the per-replica batch)
+    seed: train/val assignment and the initial mix of the training files
     
     Expects structure:
     data_dir/
@@ -20,61 +471,81 @@ def create_datasets(data_dir, img_size=(224, 224), batch_size=32, validation_spl
     # Check if data_dir exists
     if not data_path.exists():
         raise FileNotFoundError(f"Data directory not found: {data_dir}")
+
+    if image_dtype not in ('float32', 'uint8'):
+        raise ValueError(f"image_dtype must be 'float32' or 'uint8', got {image_dtype}")
     
-    # Load training data (will split from all data)
-    train_ds = tf.keras.utils.image_dataset_from_directory(
-        data_path,
-        validation_split=validation_split,
-        subset='training',
-        seed=123,
-        image_size=img_size,
-        batch_size=batch_size,
-        label_mode='categorical'
-    )
+    AUTOTUNE = tf.data.AUTOTUNE
+
+    if cache_dir:
+        shard_dir = build_tfrecord_cache(data_path, cache_dir, img_size, validation_split, seed, index_path=index_path)
+        train_ds, class_names = load_tfrecord_split(
+            shard_dir, 'train', batch_size, shuffle=True, num_shards=num_shards, shard_index=shard_index
+        )
+        val_ds, _ = load_tfrecord_split(shard_dir, 'val', batch_size, num_shards=num_shards, shard_index=shard_index)
+        train_ds = train_ds.map(_final_map_fn(augmentation), num_parallel_calls=AUTOTUNE)
+        val_ds = val_ds.map(_final_map_fn(), num_parallel_calls=AUTOTUNE)
+        return train_ds.prefetch(AUTOTUNE), val_ds.prefetch(AUTOTUNE), class_names
+
+    # Single scan (or incremental refresh) of the class-directory tree
+    index = build_dataset_index(data_path, index_path, validation_split, seed)
+    class_names = index['class_names']
+    num_classes = len(class_names)
+
+    train_paths, train_labels = index_split(index, 'train')
+    val_paths, val_labels = index_split(index, 'val')
+    print(f"Found {len(index['files'])} files belonging to {num_classes} classes.")
+    print(f"Using {len(train_paths)} files for training, {len(val_paths)} for validation.")
+
+    if num_shards > 1:
+        train_paths, train_labels = _shard_files(train_paths, train_labels, num_shards, shard_index)
+        val_paths, val_labels = _shard_files(val_paths, val_labels, num_shards, shard_index)
+        print(f"Shard {shard_index + 1}/{num_shards}: {len(train_paths)} training, {len(val_paths)} validation files.")
     
-    # Load validation data
-    val_ds = tf.keras.utils.image_dataset_from_directory(
-        data_path,
-        validation_split=validation_split,
-        subset='validation',
-        seed=123,
-        image_size=img_size,
-        batch_size=batch_size,
-        label_mode='categorical'
+    train_ds = _image_dataset(
+        train_paths, train_labels, num_classes, img_size, batch_size,
+        image_dtype=image_dtype, shuffle_buffer=shuffle_buffer, cache=cache_in_memory, seed=seed
+    )
+    val_ds = _image_dataset(
+        val_paths, val_labels, num_classes, img_size, batch_size,
+        image_dtype=image_dtype, cache=cache_in_memory
     )
-    
-    # Get class names
-    class_names = train_ds.class_names
     
     # Performance optimization for M2
-    AUTOTUNE = tf.data.AUTOTUNE
+    train_ds = train_ds.map(_final_map_fn(augmentation), num_parallel_calls=AUTOTUNE)
+    val_ds = val_ds.map(_final_map_fn(), num_parallel_calls=AUTOTUNE)
     
-    train_ds = train_ds.cache().prefetch(buffer_size=AUTOTUNE)
-    val_ds = val_ds.cache().prefetch(buffer_size=AUTOTUNE)
+    train_ds = train_ds.prefetch(buffer_size=AUTOTUNE)
+    val_ds = val_ds.prefetch(buffer_size=AUTOTUNE)
     
     return train_ds, val_ds, class_names
 
 
-def create_test_dataset(data_dir, img_size=(224, 224), batch_size=32):
+def create_test_dataset(data_dir, img_size=(224, 224), batch_size=32, num_shards=1, shard_index=0,
+                        index_path=None):
     """
     Create test dataset if separate test folder exists
+    Its index is kept next to the main one (dataset/plant_disease.test.index.json),
+    outside the data tree, unless index_path is given
     """
-    test_path = Path(data_dir) / 'test'
+    test_path = Path(data_dir) / TEST_DIR_NAME
     
     if not test_path.exists():
         print("No test directory found, skipping test dataset creation")
         return None
     
-    test_ds = tf.keras.utils.image_dataset_from_directory(
-        test_path,
-        image_size=img_size,
-        batch_size=batch_size,
-        label_mode='categorical',
-        shuffle=False
-    )
+    if index_path is None:
+        main_index = default_index_path(data_dir)
+        index_path = main_index.with_name(f"{Path(data_dir).name}.{TEST_DIR_NAME}.index.json")
+    index = build_dataset_index(test_path, index_path, validation_split=0)
+    paths, labels = index_split(index)
+    print(f"Found {len(paths)} test files belonging to {len(index['class_names'])} classes.")
+    paths, labels = _shard_files(paths, labels, num_shards, shard_index)
+    
+    test_ds = _image_dataset(paths, labels, len(index['class_names']), img_size, batch_size)
     
     AUTOTUNE = tf.data.AUTOTUNE
-    test_ds = test_ds.cache().prefetch(buffer_size=AUTOTUNE)
+    test_ds = test_ds.prefetch(buffer_size=AUTOTUNE)
     
     return test_ds
 
@@ -93,26 +564,26 @@ def save_class_names(class_names, save_path='models/class_names.json'):
     print(f"Class names saved to {save_path}")
 
 
-def get_dataset_info(train_ds, val_ds):
+def get_dataset_info(train_ds, val_ds, index=None):
     """
     Print dataset information
+    Class count comes from the dataset spec and sample counts from the
+    index, nothing is pulled through the pipeline
+    train_ds/val_ds may be None (per-replica input), the index then
+    provides the class count as well
     """
-    train_batches = tf.data.experimental.cardinality(train_ds).numpy()
-    val_batches = tf.data.experimental.cardinality(val_ds).numpy()
-    
-    batch_size = None
-    num_classes = None
-    
-    for images, labels in train_ds.take(1):
-        batch_size = images.shape[0]
-        num_classes = labels.shape[1]
-    
     print(f"\nDataset Information:")
-    print(f"Training batches: {train_batches}")
-    print(f"Validation batches: {val_batches}")
-    print(f"Batch size: {batch_size}")
+    if train_ds is not None:
+        num_classes = int(train_ds.element_spec[1].shape[-1])
+        print(f"Training batches: {tf.data.experimental.cardinality(train_ds).numpy()}")
+        print(f"Validation batches: {tf.data.experimental.cardinality(val_ds).numpy()}")
+    else:
+        num_classes = len(index['class_names'])
     print(f"Number of classes: {num_classes}")
-    print(f"Approx. training samples: {train_batches * batch_size}")
-    print(f"Approx. validation samples: {val_batches * batch_size}")
     
-    return num_classes
\ No newline at end of file
+    if index is not None:
+        counts = index_counts(index)
+        print(f"Training samples: {counts['train']}")
+        print(f"Validation samples: {counts['val']}")
+    
+    return num_classes
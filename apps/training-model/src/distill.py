@@ -0,0 +1,274 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from model import create_efficient_model, unfreeze_base_model
+from data_loader import create_datasets, DEFAULT_AUGMENTATION
+from predict import load_inference_model, load_model_with_lambda
+
+
+# Configuration
+CONFIG = {
+    'data_dir': './dataset/plant_disease',
+    'teacher_path': 'models/plant_disease_model.keras',
+    'students': ((0.35, 160), (0.35, 128)),  # (MobileNetV2 alpha, input size) per student
+    'batch_size': 32,
+    'epochs_head': 5,  # Frozen backbone
+    'epochs_finetune': 5,  # Last finetune_layers unfrozen
+    'finetune_layers': 30,
+    'learning_rate_head': 0.001,
+    'learning_rate_finetune': 0.0001,
+    'temperature': 4.0,  # Softens teacher and student distributions for the distillation loss
+    'hard_label_weight': 0.1,  # Weight of the ground-truth loss, the rest goes to the teacher's soft targets
+    'validation_split': 0.2,
+    'image_dtype': 'uint8',  # Cache decoded images as uint8, cast to float at the end
+    'cache_dir': None,  # e.g. './dataset/cache': stream TFRecord shards instead of caching in memory
+    'output_dir': 'models',
+    'tiers_path': 'models/model_tiers.json',
+    'latency_runs': 100
+}
+
+
+def soften(probabilities, temperature):
+    """
+    softmax(log(p) / T): the temperature-softened form of a softmax output
+    Both models end in softmax, so logits are not available directly
+    """
+    logits = tf.math.log(tf.clip_by_value(probabilities, 1e-7, 1.0))
+    return tf.nn.softmax(logits / temperature, axis=-1)
+
+
+class Distiller(keras.Model):
+    """
+    Train a student on the teacher's soft targets plus the true labels
+    Batches arrive at the teacher's input size, the student sees them
+    resized to its own. Only the student's weights are trained
+    """
+
+    def __init__(self, student, teacher, temperature=4.0, hard_label_weight=0.1):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.temperature = temperature
+        self.hard_label_weight = hard_label_weight
+        self.student_size = tuple(student.input_shape[1:3])
+        self.kl_divergence = keras.losses.KLDivergence()
+
+    def call(self, images, training=False):
+        return self.student(tf.image.resize(images, self.student_size, antialias=True), training=training)
+
+    def compute_loss(self, x=None, y=None, y_pred=None, sample_weight=None, training=True):
+        teacher_probs = self.teacher(x, training=False)
+
+        # T^2 keeps the soft-target gradients on the same scale as the hard ones
+        distillation = self.kl_divergence(
+            soften(teacher_probs, self.temperature),
+            soften(y_pred, self.temperature)
+        ) * self.temperature ** 2
+        hard = tf.reduce_mean(keras.losses.categorical_crossentropy(y, y_pred))
+
+        return self.hard_label_weight * hard + (1 - self.hard_label_weight) * distillation
+
+
+def student_name(alpha, img_size):
+    return f"plant_disease_student_a{int(round(alpha * 100)):03d}_{img_size}"
+
+
+def train_student(teacher, train_ds, val_ds, alpha, img_size, num_classes, config=CONFIG):
+    """
+    Distill the teacher into a MobileNetV2(alpha) student at img_size
+    Head first with a frozen backbone, then the last layers fine-tuned
+    """
+    student, base_model = create_efficient_model(
+        input_shape=(img_size, img_size, 3),
+        num_classes=num_classes,
+        alpha=alpha
+    )
+    distiller = Distiller(student, teacher, config['temperature'], config['hard_label_weight'])
+    callbacks = [keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=3, restore_best_weights=True)]
+
+    print(f"\nStudent alpha={alpha} {img_size}x{img_size}: training head")
+    distiller.compile(optimizer=keras.optimizers.Adam(config['learning_rate_head']), metrics=['accuracy'])
+    distiller.fit(train_ds, validation_data=val_ds, epochs=config['epochs_head'], callbacks=callbacks, verbose=1)
+
+    if config['epochs_finetune'] > 0:
+        print(f"Student alpha={alpha} {img_size}x{img_size}: fine-tuning")
+        unfreeze_base_model(base_model, config['finetune_layers'])
+        distiller.compile(optimizer=keras.optimizers.Adam(config['learning_rate_finetune']), metrics=['accuracy'])
+        distiller.fit(train_ds, validation_data=val_ds, epochs=config['epochs_finetune'],
+                      callbacks=callbacks, verbose=1)
+
+    return student
+
+
+def evaluate_accuracy(model, val_ds):
+    """
+    Top-1 accuracy of a served model on teacher-size validation batches
+    """
+    size = tuple(model.input_shape[1:3])
+    correct = total = 0
+    for images, labels in val_ds:
+        if tuple(images.shape[1:3]) != size:
+            images = tf.image.resize(images, size, antialias=True)
+        predictions = np.argmax(model.predict_on_batch(images.numpy()), axis=1)
+        correct += int(np.sum(predictions == np.argmax(labels.numpy(), axis=1)))
+        total += len(predictions)
+    return correct / total
+
+
+def measure_latency(model, runs=100, batch_size=32):
+    """
+    Single-image p50/p95 latency and per-image cost at batch_size, in ms
+    """
+    size = tuple(model.input_shape[1:3])
+    image = np.random.RandomState(0).uniform(0, 255, (1, *size, 3)).astype(np.float32)
+    batch = np.repeat(image, batch_size, axis=0)
+
+    model.predict_on_batch(image)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict_on_batch(image)
+        times.append(time.perf_counter() - start)
+
+    model.predict_on_batch(batch)
+    start = time.perf_counter()
+    batch_runs = max(1, runs // batch_size)
+    for _ in range(batch_runs):
+        model.predict_on_batch(batch)
+    batch_ms = (time.perf_counter() - start) / (batch_runs * batch_size) * 1000
+
+    return {
+        'p50_ms': float(np.percentile(times, 50) * 1000),
+        'p95_ms': float(np.percentile(times, 95) * 1000),
+        'batch_ms_per_image': batch_ms
+    }
+
+
+def distill(config=CONFIG):
+    """
+    Train every configured student from the teacher, then measure all
+    tiers (teacher included) and write the tier table
+    """
+    teacher = load_model_with_lambda(config['teacher_path'])
+    teacher_size = tuple(teacher.input_shape[1:3])
+
+    train_ds, val_ds, class_names = create_datasets(
+        config['data_dir'],
+        img_size=teacher_size,
+        batch_size=config['batch_size'],
+        validation_split=config['validation_split'],
+        augmentation=DEFAULT_AUGMENTATION,
+        cache_dir=config['cache_dir'],
+        image_dtype=config['image_dtype']
+    )
+    if len(class_names) != teacher.output_shape[-1]:
+        raise ValueError(f"Teacher has {teacher.output_shape[-1]} classes, dataset {len(class_names)}")
+
+    tiers = [{'name': 'teacher', 'path': config['teacher_path'], 'img_size': teacher_size[0]}]
+
+    for alpha, img_size in config['students']:
+        student = train_student(teacher, train_ds, val_ds, alpha, img_size, len(class_names), config)
+        path = str(Path(config['output_dir']) / f"{student_name(alpha, img_size)}.keras")
+        student.save(path)
+        print(f"Student saved to {path}")
+        tiers.append({'name': student_name(alpha, img_size), 'path': path, 'alpha': alpha, 'img_size': img_size})
+
+    for tier in tiers:
+        model = load_inference_model(tier['path'])
+        tier['accuracy'] = evaluate_accuracy(model, val_ds)
+        tier.update(measure_latency(model, config['latency_runs'], config['batch_size']))
+        tier['size_mb'] = Path(tier['path']).stat().st_size / 1e6
+
+    save_tiers(tiers, config['tiers_path'])
+    print_tiers(tiers)
+    return tiers
+
+
+def save_tiers(tiers, path=CONFIG['tiers_path']):
+    with open(path, 'w') as f:
+        json.dump({
+            'measured': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'tiers': tiers
+        }, f, indent=2)
+    print(f"Model tiers saved to {path}")
+
+
+def load_tiers(path=CONFIG['tiers_path']):
+    with open(path, 'r') as f:
+        return json.load(f)['tiers']
+
+
+def remeasure(path=CONFIG['tiers_path'], runs=CONFIG['latency_runs']):
+    """
+    Re-measure latency on this host; tiers are chosen by latency, which
+    depends on the serving hardware, not the training box
+    """
+    tiers = load_tiers(path)
+    for tier in tiers:
+        tier.update(measure_latency(load_inference_model(tier['path']), runs))
+    save_tiers(tiers, path)
+    print_tiers(tiers)
+    return tiers
+
+
+def select_tier(latency_budget_ms, path=CONFIG['tiers_path'], metric='p50_ms'):
+    """
+    Most accurate tier whose latency fits the budget, the fastest tier
+    if none does
+    """
+    tiers = load_tiers(path)
+    fitting = [tier for tier in tiers if tier[metric] <= latency_budget_ms]
+    if not fitting:
+        return min(tiers, key=lambda tier: tier[metric])
+    return max(fitting, key=lambda tier: (tier['accuracy'], -tier[metric]))
+
+
+def print_tiers(tiers):
+    print(f"\n{'Tier':36s} {'Size':>5s} {'Accuracy':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'Batch ms/img':>13s}")
+    print("-" * 84)
+    for tier in tiers:
+        print(f"{tier['name']:36s} {tier['img_size']:5d} {tier['accuracy']*100:8.2f}% {tier['p50_ms']:8.1f} "
+              f"{tier['p95_ms']:8.1f} {tier['batch_ms_per_image']:13.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distill the trained model into faster students')
+    parser.add_argument('--data-dir', default=CONFIG['data_dir'])
+    parser.add_argument('--teacher', default=CONFIG['teacher_path'])
+    parser.add_argument('--student', action='append', metavar='ALPHA:SIZE',
+                        help='e.g. 0.35:160 (repeatable), default: ' +
+                             ' '.join(f"{a}:{s}" for a, s in CONFIG['students']))
+    parser.add_argument('--epochs-head', type=int, default=CONFIG['epochs_head'])
+    parser.add_argument('--epochs-finetune', type=int, default=CONFIG['epochs_finetune'])
+    parser.add_argument('--tiers', default=CONFIG['tiers_path'])
+    parser.add_argument('--cache-dir', default=CONFIG['cache_dir'], help='TFRecord cache directory, see data_loader')
+    parser.add_argument('--remeasure', action='store_true', help='Only re-measure the tiers\' latency on this host')
+    parser.add_argument('--select', type=float, metavar='MS', help='Print the tier for a latency budget')
+    args = parser.parse_args()
+
+    if args.select is not None:
+        tier = select_tier(args.select, args.tiers)
+        print(f"{tier['name']}: {tier['path']} ({tier['accuracy']*100:.2f}%, p50 {tier['p50_ms']:.1f} ms)")
+    elif args.remeasure:
+        remeasure(args.tiers)
+    else:
+        students = CONFIG['students']
+        if args.student:
+            students = tuple((float(a), int(s)) for a, s in (spec.split(':') for spec in args.student))
+
+        distill({
+            **CONFIG,
+            'data_dir': args.data_dir,
+            'teacher_path': args.teacher,
+            'students': students,
+            'epochs_head': args.epochs_head,
+            'epochs_finetune': args.epochs_finetune,
+            'tiers_path': args.tiers,
+            'cache_dir': args.cache_dir
+        })
@@ -0,0 +1,199 @@
+import json
+import os
+
+import tensorflow as tf
+
+
+STRATEGIES = ('mirrored', 'multi_worker')
+
+
+def create_strategy(kind=None, cpu_replicas=2):
+    """
+    Distribution strategy for train_model
+    None: the default single-device strategy
+    'mirrored': every GPU of this host, or cpu_replicas logical CPU devices
+    on a CPU-only host (one process)
+    'multi_worker': one process per worker, on one or several hosts, as
+    described by the TF_CONFIG environment variable (see launch_workers.py);
+    every process runs the same training with its local devices
+    Must be called before TensorFlow initializes its devices
+    """
+    if not kind:
+        return tf.distribute.get_strategy()
+
+    if kind == 'multi_worker':
+        if 'TF_CONFIG' not in os.environ:
+            raise ValueError("multi_worker needs TF_CONFIG, start the workers with launch_workers.py")
+        return tf.distribute.MultiWorkerMirroredStrategy()
+
+    if kind != 'mirrored':
+        raise ValueError(f"Unknown distribution strategy: {kind}")
+
+    if not tf.config.list_physical_devices('GPU') and cpu_replicas > 1:
+        cpu = tf.config.list_physical_devices('CPU')[0]
+        tf.config.set_logical_device_configuration(
+            cpu,
+            [tf.config.LogicalDeviceConfiguration() for _ in range(cpu_replicas)]
+        )
+        return tf.distribute.MirroredStrategy([device.name for device in tf.config.list_logical_devices('CPU')])
+
+    return tf.distribute.MirroredStrategy()
+
+
+def is_multi_worker(strategy):
+    return isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy)
+
+
+def worker_index(strategy):
+    """
+    This process's worker index, 0 (the chief) unless multi_worker
+    """
+    if not is_multi_worker(strategy):
+        return 0
+    return json.loads(os.environ['TF_CONFIG'])['task']['index']
+
+
+def distribute_dataset(strategy, make_dataset):
+    """
+    Give every replica (mirrored) or every worker (multi_worker) its own
+    input pipeline
+    make_dataset(num_shards, shard_index) must return that pipeline's shard
+    batched per replica; a worker's batches go to its local replicas in
+    turn. Equal-sized shards keep the replicas in lockstep and the step
+    count correct
+    """
+    if strategy.num_replicas_in_sync == 1:
+        return make_dataset(1, 0)
+
+    def dataset_fn(input_context):
+        return make_dataset(input_context.num_input_pipelines, input_context.input_pipeline_id)
+
+    mode = tf.distribute.InputReplicationMode.PER_WORKER if is_multi_worker(strategy) \
+        else tf.distribute.InputReplicationMode.PER_REPLICA
+    return strategy.distribute_datasets_from_function(
+        dataset_fn,
+        options=tf.distribute.InputOptions(
+            experimental_replication_mode=mode,
+            experimental_fetch_to_device=False
+        )
+    )
+
+
+def _score_batch(model, images, labels, training):
+    """
+    Per-example loss and correctness of one replica's batch
+    """
+    predictions = tf.cast(model(images, training=training), tf.float32)
+    per_example = tf.keras.losses.categorical_crossentropy(labels, predictions)
+    correct = tf.cast(tf.equal(tf.argmax(predictions, -1), tf.argmax(labels, -1)), tf.float32)
+    return per_example, correct
+
+
+def _distributed_steps(model, strategy):
+    """
+    tf.functions running one train or eval step on every replica, each
+    returning the summed (loss, correct, examples) over all of them
+    """
+    def totals(per_example, correct):
+        return tf.reduce_sum(per_example), tf.reduce_sum(correct), tf.cast(tf.size(correct), tf.float32)
+
+    def train_replica(images, labels):
+        with tf.GradientTape() as tape:
+            per_example, correct = _score_batch(model, images, labels, training=True)
+            loss = tf.nn.compute_average_loss(per_example)
+            if model.losses:
+                loss += tf.nn.scale_regularization_loss(tf.add_n(model.losses))
+            scaled_loss = model.optimizer.scale_loss(loss)
+        gradients = tape.gradient(scaled_loss, model.trainable_variables)
+        # The optimizer all-reduces the gradients across replicas and workers
+        model.optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+        return totals(per_example, correct)
+
+    def eval_replica(images, labels):
+        return totals(*_score_batch(model, images, labels, training=False))
+
+    def reduce(results):
+        return [strategy.reduce(tf.distribute.ReduceOp.SUM, value, axis=None) for value in results]
+
+    @tf.function
+    def train_step(batch):
+        return reduce(strategy.run(train_replica, args=batch))
+
+    @tf.function
+    def eval_step(batch):
+        return reduce(strategy.run(eval_replica, args=batch))
+
+    return train_step, eval_step
+
+
+def _run_epoch(dataset, step_fn, callback_list=None):
+    """
+    One pass over a distributed dataset, get_next_as_optional() lets all
+    workers agree on the last step; returns (loss, accuracy, steps)
+    """
+    iterator = iter(dataset)
+    loss_sum = correct = examples = 0.0
+    step = 0
+    while True:
+        optional = iterator.get_next_as_optional()
+        if not optional.has_value():
+            break
+        if callback_list:
+            callback_list.on_train_batch_begin(step)
+        batch_loss, batch_correct, batch_examples = (float(value) for value in step_fn(optional.get_value()))
+        loss_sum += batch_loss
+        correct += batch_correct
+        examples += batch_examples
+        if callback_list:
+            callback_list.on_train_batch_end(step, {'loss': batch_loss / batch_examples,
+                                                    'accuracy': batch_correct / batch_examples})
+        step += 1
+    return loss_sum / max(examples, 1.0), correct / max(examples, 1.0), step
+
+
+def custom_fit(model, strategy, train_ds, val_ds, epochs, callbacks, verbose=1):
+    """
+    model.fit() for multi_worker: Keras 3 fit() cannot iterate a
+    MultiWorkerMirroredStrategy dataset, so run the steps with strategy.run
+    and drive the same callbacks (EarlyStopping, ReduceLROnPlateau,
+    checkpoints, PhaseBackup) through a CallbackList
+    model must be compiled under the strategy scope, categorical
+    crossentropy and accuracy are computed here
+    Returns the History callback
+    """
+    train_step, eval_step = _distributed_steps(model, strategy)
+    callback_list = tf.keras.callbacks.CallbackList(
+        callbacks, add_history=True, add_progbar=False, model=model, epochs=epochs, verbose=verbose
+    )
+
+    model.stop_training = False
+    callback_list.on_train_begin()
+    # PhaseBackup restores the interrupted epoch here, as for fit()
+    initial_epoch = getattr(model, '_initial_epoch', None) or 0
+
+    logs = {}
+    for epoch in range(initial_epoch, epochs):
+        callback_list.on_epoch_begin(epoch)
+        loss, accuracy, steps = _run_epoch(train_ds, train_step, callback_list)
+        val_loss, val_accuracy, _ = _run_epoch(val_ds, eval_step)
+        logs = {'loss': loss, 'accuracy': accuracy, 'val_loss': val_loss, 'val_accuracy': val_accuracy}
+
+        callback_list.set_params({**callback_list.params, 'steps': steps})
+        callback_list.on_epoch_end(epoch, logs)
+        if verbose:
+            print(f"Epoch {epoch + 1}/{epochs}: {steps} steps, loss {loss:.4f}, accuracy {accuracy:.4f}, "
+                  f"val_loss {val_loss:.4f}, val_accuracy {val_accuracy:.4f}")
+        if model.stop_training:
+            break
+
+    callback_list.on_train_end(logs)
+    return model.history
+
+
+def custom_evaluate(model, strategy, dataset):
+    """
+    model.evaluate() for multi_worker, returns [loss, accuracy]
+    """
+    _, eval_step = _distributed_steps(model, strategy)
+    loss, accuracy, _ = _run_epoch(dataset, eval_step)
+    return [loss, accuracy]
@@ -0,0 +1,138 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from keras import layers, models
+
+
+def split_backbone_and_head(model, base_model):
+    """
+    Split a create_efficient_model model after its pooling layer
+    Both halves share layer objects with the full model, so training the
+    head trains the full model's classifier in place
+    """
+    position = model.layers.index(base_model)
+    pooling = model.layers[position + 1]
+    if not isinstance(pooling, layers.GlobalAveragePooling2D):
+        raise ValueError("Expected GlobalAveragePooling2D right after the base model")
+
+    extractor = models.Sequential([
+        layers.Input(shape=model.input_shape[1:]),
+        *model.layers[:position + 2]
+    ])
+    head = models.Sequential([
+        layers.Input(shape=(base_model.output_shape[-1],)),
+        *model.layers[position + 2:]
+    ])
+
+    return extractor, head
+
+
+def feature_cache_key(fingerprint, base_model):
+    """
+    Embeddings depend only on the images and the frozen backbone
+    (its name carries alpha and input size, e.g. mobilenetv2_0.75_224)
+    """
+    return f"{fingerprint}-{base_model.name}"
+
+
+def extract_features(extractor, ds, output_dir, split):
+    """
+    Run the frozen backbone once over a split and write pooled embeddings
+    and class ids as raw float32/int32 files next to a small meta file
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # From the specs, not the last batch, so an empty split still gets a meta file
+    dim = int(extractor.output_shape[-1])
+    num_classes = int(ds.element_spec[1].shape[-1])
+
+    count = 0
+    with open(output_dir / f"{split}-features.f32", 'wb') as features_file, \
+            open(output_dir / f"{split}-labels.i32", 'wb') as labels_file:
+        for images, labels in ds:
+            features = np.asarray(extractor.predict_on_batch(images), dtype=np.float32)
+            features_file.write(features.tobytes())
+            labels_file.write(np.argmax(labels.numpy(), axis=1).astype(np.int32).tobytes())
+            count += len(features)
+
+    with open(output_dir / f"{split}-meta.json", 'w') as f:
+        json.dump({'count': count, 'dim': dim, 'num_classes': num_classes}, f)
+
+    print(f"Extracted {count} {split} embeddings of size {dim}")
+
+
+def load_features(cache_dir, split):
+    """
+    Memory-map cached embeddings, returns (features, one-hot labels)
+    """
+    cache_dir = Path(cache_dir)
+    with open(cache_dir / f"{split}-meta.json", 'r') as f:
+        meta = json.load(f)
+
+    # Empty files cannot be memory-mapped
+    if meta['count'] == 0:
+        return (np.zeros((0, meta['dim']), dtype=np.float32),
+                np.zeros((0, meta['num_classes']), dtype=np.float32))
+
+    features = np.memmap(cache_dir / f"{split}-features.f32", dtype=np.float32, mode='r',
+                         shape=(meta['count'], meta['dim']))
+    labels = np.memmap(cache_dir / f"{split}-labels.i32", dtype=np.int32, mode='r',
+                       shape=(meta['count'],))
+
+    return features, np.eye(meta['num_classes'], dtype=np.float32)[labels]
+
+
+def build_feature_cache(extractor, make_datasets, cache_root, key):
+    """
+    Return the feature cache directory for key, extracting it first if needed
+    make_datasets() is only called on a cache miss and must return
+    unaugmented (train_ds, val_ds)
+    """
+    cache_dir = Path(cache_root) / key
+    if (cache_dir / 'val-meta.json').exists():
+        print(f"Using feature cache: {cache_dir}")
+        return cache_dir
+
+    print(f"Extracting backbone features into {cache_dir}")
+    tmp_dir = cache_dir.with_name(cache_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    train_ds, val_ds = make_datasets()
+    extract_features(extractor, train_ds, tmp_dir, 'train')
+    extract_features(extractor, val_ds, tmp_dir, 'val')
+    tmp_dir.rename(cache_dir)
+
+    return cache_dir
+
+
+def train_head_on_features(head, cache_dir, learning_rate=0.001, epochs=10, batch_size=256,
+                           callbacks=None, jit_compile='auto'):
+    """
+    Train the classifier head from cached embeddings
+    The embeddings are unaugmented, augmentation only applies once the
+    backbone is back in the loop during fine-tuning
+    """
+    train_x, train_y = load_features(cache_dir, 'train')
+    val_x, val_y = load_features(cache_dir, 'val')
+
+    head.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy'],
+        jit_compile=jit_compile
+    )
+
+    return head.fit(
+        train_x,
+        train_y,
+        validation_data=(val_x, val_y),
+        epochs=epochs,
+        batch_size=batch_size,
+        shuffle=True,
+        callbacks=callbacks,
+        verbose=1
+    )
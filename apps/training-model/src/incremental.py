@@ -0,0 +1,204 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from keras import layers, models
+from data_loader import (
+    DEFAULT_AUGMENTATION,
+    build_dataset_index,
+    create_dataset_from_files,
+    index_split,
+    save_class_names
+)
+from predict import load_model_with_lambda, load_class_names
+from registry import publish
+
+
+# Configuration
+CONFIG = {
+    'model_path': 'models/plant_disease_model.keras',
+    'class_names_path': 'models/class_names.json',
+    'data_dir': './dataset/plant_disease',  # Original training data, source of the replay sample
+    'new_data_dir': './dataset/new_classes',  # Class folders with new (or extra) images
+    'replay_per_class': 50,  # Old images per existing class mixed into training
+    'batch_size': 16,
+    'epochs': 5,
+    'learning_rate': 0.001,
+    'validation_split': 0.2,
+    'registry_dir': 'models/registry'  # Publish the grown model as a new version, None to skip
+}
+
+
+def find_base_model(model):
+    """
+    The nested backbone (MobileNetV2) inside a Sequential model, if any
+    """
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.Model):
+            return layer
+    return None
+
+
+def grow_classifier(model, num_new_classes):
+    """
+    Rebuild the model with num_new_classes extra outputs
+    All other layers are shared, the old output columns keep their weights
+    New columns get a fresh kernel and the lowest existing bias, so they
+    start out unlikely instead of stealing predictions from known classes
+    """
+    old_output = model.layers[-1]
+    old_kernel, old_bias = old_output.get_weights()
+    num_classes = old_kernel.shape[1] + num_new_classes
+
+    new_output = layers.Dense(
+        num_classes,
+        activation=old_output.activation,
+        dtype='float32',
+        name=f"{old_output.name}_{num_classes}"
+    )
+    grown = models.Sequential([layers.Input(shape=model.input_shape[1:]), *model.layers[:-1], new_output])
+
+    new_kernel, _ = new_output.get_weights()
+    new_kernel[:, :old_kernel.shape[1]] = old_kernel
+    new_bias = np.concatenate([old_bias, np.full(num_new_classes, old_bias.min(), dtype=old_bias.dtype)])
+    new_output.set_weights([new_kernel, new_bias])
+
+    return grown
+
+
+def merge_class_names(class_names, new_class_names):
+    """
+    Append unseen classes, existing indices never move
+    Returns the merged list and a new-index -> merged-index mapping
+    """
+    merged = list(class_names)
+    for name in new_class_names:
+        if name not in merged:
+            merged.append(name)
+    return merged, np.array([merged.index(name) for name in new_class_names], dtype=np.int64)
+
+
+def replay_sample(index, split, per_class, seed=123):
+    """
+    Up to per_class random files of each class from one split of an index
+    """
+    paths, labels = index_split(index, split)
+    rng = np.random.RandomState(seed)
+    by_class = {}
+    for path, label in zip(paths, labels):
+        by_class.setdefault(label, []).append(path)
+
+    sample_paths = []
+    sample_labels = []
+    for label, class_paths in sorted(by_class.items()):
+        chosen = rng.choice(len(class_paths), size=min(per_class, len(class_paths)), replace=False)
+        sample_paths.extend(class_paths[i] for i in sorted(chosen))
+        sample_labels.extend([label] * len(chosen))
+
+    return sample_paths, sample_labels
+
+
+def add_classes(config=CONFIG):
+    """
+    Extend the trained model with the classes found in new_data_dir
+    Only the classifier head is trained, on the new images plus a replay
+    sample of the original data so existing classes are not forgotten
+    """
+    print("\n" + "="*50)
+    print("Incremental class update")
+    print("="*50)
+
+    model = load_model_with_lambda(config['model_path'])
+    class_names = load_class_names(config['class_names_path'])
+    if len(class_names) != model.output_shape[-1]:
+        raise ValueError(
+            f"{config['class_names_path']} has {len(class_names)} classes "
+            f"but the model outputs {model.output_shape[-1]}"
+        )
+
+    new_index = build_dataset_index(config['new_data_dir'], validation_split=config['validation_split'])
+    merged_names, label_map = merge_class_names(class_names, new_index['class_names'])
+    added = merged_names[len(class_names):]
+    print(f"Existing classes: {len(class_names)}, new classes: {len(added)}")
+    for name in added:
+        print(f"   + {name}")
+
+    if added:
+        model = grow_classifier(model, len(added))
+
+    # New data (labels remapped into the merged class list) plus replay
+    old_index = build_dataset_index(config['data_dir'], validation_split=config['validation_split'])
+    splits = {}
+    for split in ('train', 'val'):
+        new_paths, new_labels = index_split(new_index, split)
+        old_paths, old_labels = replay_sample(old_index, split, config['replay_per_class'])
+        splits[split] = (new_paths + old_paths, list(label_map[new_labels]) + old_labels)
+        print(f"{split}: {len(new_paths)} new + {len(old_paths)} replay images")
+
+    img_size = tuple(model.input_shape[1:3])
+    train_ds = create_dataset_from_files(
+        *splits['train'], len(merged_names), img_size, config['batch_size'],
+        augmentation=DEFAULT_AUGMENTATION, shuffle_buffer=1000
+    )
+    val_ds = create_dataset_from_files(*splits['val'], len(merged_names), img_size, config['batch_size'])
+
+    # Head only, the backbone stays as trained
+    base_model = find_base_model(model)
+    if base_model is not None:
+        base_model.trainable = False
+
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(config['learning_rate']),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=config['epochs'],
+        callbacks=[
+            tf.keras.callbacks.EarlyStopping(
+                monitor='val_loss',
+                patience=3,
+                restore_best_weights=True,
+                verbose=1
+            )
+        ],
+        verbose=1
+    )
+
+    val_loss, val_acc = model.evaluate(val_ds)
+    print(f"\nValidation Accuracy (new + replay): {val_acc:.4f}")
+
+    # Model and class map are written together so they always match
+    Path(config['model_path']).parent.mkdir(parents=True, exist_ok=True)
+    model.save(config['model_path'])
+    save_class_names(merged_names, config['class_names_path'])
+    print(f"Model saved to {config['model_path']} ({len(merged_names)} classes)")
+
+    if config['registry_dir']:
+        publish(config['model_path'], config['class_names_path'], config['registry_dir'])
+
+    return model, merged_names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add disease classes to the trained model')
+    parser.add_argument('--new-data', default=CONFIG['new_data_dir'])
+    parser.add_argument('--data-dir', default=CONFIG['data_dir'])
+    parser.add_argument('--model', default=CONFIG['model_path'])
+    parser.add_argument('--class-names', default=CONFIG['class_names_path'])
+    parser.add_argument('--replay-per-class', type=int, default=CONFIG['replay_per_class'])
+    parser.add_argument('--epochs', type=int, default=CONFIG['epochs'])
+    args = parser.parse_args()
+
+    add_classes({
+        **CONFIG,
+        'new_data_dir': args.new_data,
+        'data_dir': args.data_dir,
+        'model_path': args.model,
+        'class_names_path': args.class_names,
+        'replay_per_class': args.replay_per_class,
+        'epochs': args.epochs
+    })
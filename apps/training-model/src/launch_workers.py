@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+CLI_PATH = Path(__file__).with_name('cli.py')
+
+
+def free_ports(count):
+    """
+    Ports nothing listens on right now, for workers on this host
+    """
+    sockets = [socket.socket() for _ in range(count)]
+    try:
+        for sock in sockets:
+            sock.bind(('localhost', 0))
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def tf_config(workers, index):
+    """
+    TF_CONFIG for worker index of the workers (host:port) cluster
+    """
+    return json.dumps({'cluster': {'worker': list(workers)}, 'task': {'type': 'worker', 'index': index}})
+
+
+def train_command(train_args, config=None):
+    command = [sys.executable, str(CLI_PATH)]
+    if config:
+        command += ['--config', config]
+    return command + ['train', '--distribution', 'multi_worker', *train_args]
+
+
+def launch_local(num_workers, train_args, config=None, log_dir=None):
+    """
+    Run num_workers training processes on this host, worker 0 (the chief)
+    in the foreground, the others logging to log_dir
+    Returns the first non-zero exit code, 0 when all workers succeed
+    """
+    workers = [f"localhost:{port}" for port in free_ports(num_workers)]
+    log_dir = Path(log_dir or tempfile.mkdtemp(prefix='workers-'))
+    log_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Starting {num_workers} workers ({', '.join(workers)}), worker logs in {log_dir}")
+
+    processes = []
+    logs = []
+    try:
+        for index in range(num_workers):
+            env = {**os.environ, 'TF_CONFIG': tf_config(workers, index)}
+            if index == 0:
+                output = None
+            else:
+                output = open(log_dir / f"worker-{index}.log", 'w')
+                logs.append(output)
+            processes.append(subprocess.Popen(
+                train_command(train_args, config), env=env, stdout=output, stderr=subprocess.STDOUT if output else None
+            ))
+
+        # A worker that dies leaves the others blocked in a collective, stop them all
+        exit_code = 0
+        remaining = list(processes)
+        while remaining:
+            for process in list(remaining):
+                try:
+                    code = process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    continue
+                remaining.remove(process)
+                if code and not exit_code:
+                    exit_code = code
+                    print(f"Worker {processes.index(process)} exited with code {code}, stopping the others",
+                          file=sys.stderr)
+                    for other in remaining:
+                        other.terminate()
+        return exit_code
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+        for log in logs:
+            log.close()
+
+
+def run_worker(cluster, index, train_args, config=None):
+    """
+    Run this host's worker of a multi-host cluster, one call per host with
+    the same cluster list and that host's index
+    """
+    env = {**os.environ, 'TF_CONFIG': tf_config(cluster, index)}
+    return subprocess.call(train_command(train_args, config), env=env)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Start multi_worker training: several worker processes on this host, "
+                    "or this host's worker of a cluster",
+        epilog='Other arguments are passed to "cli.py train", e.g. --epochs-initial 5 --batch-size 8'
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--num-workers', type=int, help='worker processes to start on this host')
+    group.add_argument('--cluster', help='host:port of every worker, comma separated, the same on every host')
+    parser.add_argument('--index', type=int, help="this host's position in --cluster")
+    parser.add_argument('--config', help='settings file passed to cli.py')
+    parser.add_argument('--log-dir', help='where workers other than the chief log (default: a temporary directory)')
+    args, train_args = parser.parse_known_args()
+
+    if args.cluster:
+        if args.index is None:
+            parser.error('--cluster needs --index')
+        sys.exit(run_worker(args.cluster.split(','), args.index, train_args, args.config))
+    sys.exit(launch_local(args.num_workers, train_args, args.config, args.log_dir))
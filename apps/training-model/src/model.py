@@ -2,10 +2,12 @@ import tensorflow as tf
 from tensorflow import keras
 from keras import layers, models
 
-def create_efficient_model(input_shape=(224, 224, 3), num_classes=38):
+def create_efficient_model(input_shape=(224, 224, 3), num_classes=38, alpha=0.75):
     """
     Create a lightweight CNN model
     Uses MobileNetV2 as base - efficient for low GPU resources
+    alpha is the width multiplier (ImageNet weights exist for 0.35, 0.5,
+    0.75, 1.0, 1.3 and 1.4), smaller is faster
     """
     
     # Load pre-trained MobileNetV2 (smaller, efficient model)
@@ -13,7 +15,7 @@ def create_efficient_model(input_shape=(224, 224, 3), num_classes=38):
         input_shape=input_shape,
         include_top=False,
         weights='imagenet',
-        alpha=0.75  # Reduced width multiplier for efficiency
+        alpha=alpha  # Reduced width multiplier for efficiency
     )
     
     # Freeze base model initially
@@ -23,13 +25,9 @@ def create_efficient_model(input_shape=(224, 224, 3), num_classes=38):
     model = models.Sequential([
         layers.Input(shape=input_shape),
         
-        # Data augmentation layer (applied during training only)
-        layers.RandomFlip('horizontal'),
-        layers.RandomRotation(0.1),
-        layers.RandomZoom(0.1),
-        
-        # Preprocessing - Use Lambda layer instead of direct function
-        layers.Lambda(keras.applications.mobilenet_v2.preprocess_input),
+        # Preprocessing - same as mobilenet_v2.preprocess_input (x / 127.5 - 1)
+        # Rescaling serializes without custom objects and fuses into the graph
+        layers.Rescaling(1./127.5, offset=-1),
         
         # Pre-trained base
         base_model,
@@ -40,7 +38,8 @@ def create_efficient_model(input_shape=(224, 224, 3), num_classes=38):
         layers.Dropout(0.3),
         layers.Dense(128, activation='relu'),
         layers.Dropout(0.2),
-        layers.Dense(num_classes, activation='softmax')
+        # Softmax stays float32 under mixed precision for stable probabilities
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model, base_model
@@ -53,10 +52,6 @@ def create_simple_cnn(input_shape=(224, 224, 3), num_classes=38):
     model = models.Sequential([
         layers.Input(shape=input_shape),
         
-        # Data augmentation
-        layers.RandomFlip('horizontal'),
-        layers.RandomRotation(0.1),
-        
         # Normalization
         layers.Rescaling(1./255),
         
@@ -80,7 +75,7 @@ def create_simple_cnn(input_shape=(224, 224, 3), num_classes=38):
         layers.Dropout(0.3),
         layers.Dense(256, activation='relu'),
         layers.Dropout(0.2),
-        layers.Dense(num_classes, activation='softmax')
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model
@@ -96,4 +91,50 @@ def unfreeze_base_model(base_model, num_layers=30):
     for layer in base_model.layers[:-num_layers]:
         layer.trainable = False
     
-    print(f"Unfrozen last {num_layers} layers of base model")
\ No newline at end of file
+    print(f"Unfrozen last {num_layers} layers of base model")
+
+AUGMENTATION_LAYERS = (
+    layers.RandomFlip,
+    layers.RandomRotation,
+    layers.RandomZoom,
+    layers.RandomTranslation,
+    layers.RandomContrast,
+)
+
+
+def strip_augmentation(model):
+    """
+    Rebuild a Sequential model without its random augmentation layers
+    Models trained before augmentation moved to data_loader still carry them
+    Layers (and weights) are shared with the original, nothing is copied
+    Augmentation is a no-op at inference but its random ops block TFLite
+    """
+    kept = [layer for layer in model.layers if not isinstance(layer, AUGMENTATION_LAYERS)]
+    if len(kept) == len(model.layers):
+        return model
+
+    return models.Sequential([layers.Input(shape=model.input_shape[1:]), *kept])
+
+
+def _float32_config(config):
+    """
+    Replace mixed precision dtype policies in a layer config tree
+    """
+    if isinstance(config, dict):
+        if config.get('class_name') == 'DTypePolicy':
+            return 'float32'
+        return {key: _float32_config(value) for key, value in config.items()}
+    if isinstance(config, list):
+        return [_float32_config(value) for value in config]
+    return config
+
+
+def convert_to_float32(model):
+    """
+    Float32 copy of a model trained under a mixed precision policy
+    Serving CPUs may lack bfloat16/float16 support, and TFLite conversion
+    expects a float32 graph
+    """
+    clone = model.__class__.from_config(_float32_config(model.get_config()))
+    clone.set_weights(model.get_weights())
+    return clone
@@ -0,0 +1,519 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+from predict import load_class_names, build_class_lookup, decode_image, postprocess
+
+
+# Configuration
+CONFIG = {
+    'model_path': 'models/plant_disease_model.keras',
+    'class_names_path': 'models/class_names.json',
+    'img_size': (224, 224),
+    'processes': 'auto',  # Worker processes, 'auto' uses the tuning file or one per 4 cores
+    'threads': None,  # intra-op threads per worker, default: the worker's share of the cores
+    'inter_op_threads': 1,  # One model per process, op-level parallelism is not worth the threads
+    'pin_cores': True,  # Pin each worker to its own group of cores (Linux)
+    'max_batch_size': 32,
+    'max_wait_ms': 10,
+    'top_k': 5,
+    'tuning_path': 'models/pool_tuning.json'
+}
+
+_STOP = object()
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_groups(processes, threads=None, cores=None):
+    """
+    Split the usable cores into one contiguous group per worker process
+    """
+    cores = cores or available_cores()
+    threads = threads or max(1, len(cores) // processes)
+    return [
+        [cores[(i * threads + j) % len(cores)] for j in range(threads)]
+        for i in range(processes)
+    ]
+
+
+def _worker_main(model_path, cores, threads, inter_op_threads, input_name, output_name,
+                 input_shape, num_classes, conn):
+    """
+    Worker process: pin, size the thread pools, load the model once,
+    then run every batch the parent leaves in the shared input buffer
+    """
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    # Before the first op runs, TensorFlow creates its thread pools lazily
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+    images = outputs = None
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        images = np.ndarray(input_shape, dtype=np.float32, buffer=input_shm.buf)
+        outputs = np.ndarray((input_shape[0], num_classes), dtype=np.float32, buffer=output_shm.buf)
+
+        if str(model_path).endswith('.tflite'):
+            from tflite_runner import TFLiteModel
+            model = TFLiteModel(model_path, num_threads=threads)
+        else:
+            from predict import load_inference_model
+            model = load_inference_model(model_path)
+
+        if tuple(model.input_shape[1:3]) != tuple(input_shape[1:3]) or model.output_shape[-1] != num_classes:
+            raise ValueError(f"Model takes {model.input_shape} -> {model.output_shape}, "
+                             f"pool expects {input_shape[1:]} -> {num_classes} classes")
+
+        model.predict_on_batch(images[:1])
+        conn.send(('ready', os.getpid()))
+
+        while True:
+            count = conn.recv()
+            if count is None:
+                break
+            try:
+                outputs[:count] = model.predict_on_batch(images[:count])
+                conn.send(('done', count))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        del images, outputs
+        input_shm.close()
+        output_shm.close()
+
+
+class _Worker:
+    """
+    Parent-side handle of one worker process and its shared buffers
+    """
+
+    def __init__(self, context, config, cores, threads, num_classes):
+        self.cores = cores
+        batch_shape = (config['max_batch_size'], *config['img_size'], 3)
+        self.input_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(batch_shape)) * 4)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=batch_shape[0] * num_classes * 4)
+        self.images = np.ndarray(batch_shape, dtype=np.float32, buffer=self.input_shm.buf)
+        self.outputs = np.ndarray((batch_shape[0], num_classes), dtype=np.float32, buffer=self.output_shm.buf)
+
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(config['model_path'], cores if config['pin_cores'] else None, threads,
+                  config['inter_op_threads'], self.input_shm.name, self.output_shm.name,
+                  batch_shape, num_classes, child_conn),
+            daemon=True
+        )
+
+        # A spawned child copies the environment at start and imports
+        # TensorFlow (through predict) before _worker_main runs
+        thread_env = {
+            'OMP_NUM_THREADS': str(threads),
+            'TF_NUM_INTRAOP_THREADS': str(threads),
+            'TF_NUM_INTEROP_THREADS': str(config['inter_op_threads'])
+        }
+        saved_env = {key: os.environ.get(key) for key in thread_env}
+        os.environ.update(thread_env)
+        try:
+            self.process.start()
+        finally:
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        child_conn.close()
+
+    def wait_ready(self):
+        status, value = self.conn.recv()
+        if status != 'ready':
+            raise RuntimeError(f"Inference worker failed to start: {value}")
+
+    def run(self, count):
+        """
+        Run the first count images of the shared input buffer, returns a
+        view of their probabilities in the shared output buffer
+        """
+        self.conn.send(count)
+        status, value = self.conn.recv()
+        if status != 'done':
+            raise RuntimeError(value)
+        return self.outputs[:count]
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        del self.images, self.outputs
+        for shm in (self.input_shm, self.output_shm):
+            shm.close()
+            shm.unlink()
+
+
+class InferencePool:
+    """
+    N worker processes, each pinned to its own core group with its own
+    TensorFlow thread pools, behind a submit()/result() API
+    One feeder thread per worker gathers queued images into a micro-batch,
+    decodes them straight into that worker's shared-memory input buffer
+    (PIL releases the GIL while decoding, so feeders decode in parallel),
+    and reads the probabilities back from a shared output buffer; no image
+    array is ever pickled
+    A worker process that dies is restarted on the same cores and its
+    batch retried once; one that cannot be restarted is retired
+    """
+
+    def __init__(self, config=CONFIG):
+        self.config = {**CONFIG, **config}
+        self.processes, self.threads = resolve_layout(self.config)
+        self.class_names = load_class_names(self.config['class_names_path'])
+        self.class_lookup = build_class_lookup(self.class_names)
+        self.max_wait = self.config['max_wait_ms'] / 1000.0
+
+        self.stats = {'requests': 0, 'batches': 0, 'restarts': 0}
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._context = None
+        self._workers = []
+        self._feeders = []
+        self._live_feeders = 0
+
+    def start(self):
+        self._context = multiprocessing.get_context('spawn')
+        groups = core_groups(self.processes, self.threads)
+
+        print(f"Starting {self.processes} inference worker(s) x {self.threads} thread(s)")
+        self._workers = [
+            _Worker(self._context, self.config, cores, self.threads, len(self.class_names))
+            for cores in groups
+        ]
+        try:
+            for worker in self._workers:
+                worker.wait_ready()
+        except Exception:
+            self.close()
+            raise
+
+        self._feeders = [
+            threading.Thread(target=self._feed, args=(i,), name=f'pool-feeder-{i}', daemon=True)
+            for i in range(len(self._workers))
+        ]
+        self._live_feeders = len(self._feeders)
+        for feeder in self._feeders:
+            feeder.start()
+        return self
+
+    def close(self):
+        for _ in self._feeders:
+            self._queue.put(_STOP)
+        for feeder in self._feeders:
+            feeder.join()
+        for worker in self._workers:
+            if worker is not None:
+                worker.close()
+        self._feeders = []
+        self._workers = []
+        self._live_feeders = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, image):
+        """
+        Queue an image path, file object or decoded (H, W, 3) array
+        Returns a Future with its Prediction, as predict_image would return
+        """
+        if not self._live_feeders:
+            raise RuntimeError("No inference workers running")
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def map(self, images):
+        """
+        Predictions for a list of images, in order (exceptions are raised)
+        """
+        futures = [self.submit(image) for image in images]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.config['max_batch_size']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _feed(self, index):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            worker = self._workers[index]
+
+            # Decode straight into the worker's shared buffer, skipping bad images
+            futures = []
+            for image, future in batch:
+                try:
+                    if isinstance(image, np.ndarray):
+                        worker.images[len(futures)] = image
+                    else:
+                        decode_image(image, self.config['img_size'], out=worker.images[len(futures)])
+                    futures.append(future)
+                except Exception as e:
+                    future.set_exception(e)
+
+            if not futures:
+                continue
+
+            try:
+                try:
+                    probabilities = worker.run(len(futures))
+                except (EOFError, OSError):
+                    # The process died, the pipe closed under us
+                    worker = self._respawn(index)
+                    if worker is None:
+                        raise
+                    probabilities = worker.run(len(futures))
+                predictions = postprocess(probabilities, self.class_lookup, self.config['top_k'])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                if self._workers[index] is None:
+                    self._retire()
+                    return
+                continue
+
+            with self._stats_lock:
+                self.stats['requests'] += len(futures)
+                self.stats['batches'] += 1
+            for future, prediction in zip(futures, predictions):
+                future.set_result(prediction)
+
+    def _respawn(self, index):
+        """
+        Replace a dead worker by a new process on the same cores, its
+        pending batch copied over; None (slot retired) if it cannot start
+        """
+        old = self._workers[index]
+        old.process.join(timeout=5)
+        print(f"Inference worker {index} exited (code {old.process.exitcode}), restarting", file=sys.stderr)
+
+        worker = None
+        try:
+            worker = _Worker(self._context, self.config, old.cores, self.threads, len(self.class_names))
+            worker.wait_ready()
+        except Exception as e:
+            print(f"Inference worker {index} could not be restarted, retiring it: {e}", file=sys.stderr)
+            if worker is not None:
+                worker.close()
+            old.close()
+            self._workers[index] = None
+            return None
+
+        worker.images[:] = old.images
+        old.close()
+        self._workers[index] = worker
+        with self._stats_lock:
+            self.stats['restarts'] += 1
+        return worker
+
+    def _retire(self):
+        """
+        One feeder fewer; the last one fails whatever is still queued
+        """
+        with self._stats_lock:
+            self._live_feeders -= 1
+            if self._live_feeders:
+                return
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError("No inference workers running"))
+
+
+def resolve_layout(config):
+    """
+    (processes, threads) for the pool: explicit settings, else the
+    auto-tuned layout saved for this host, else one process per 4 cores
+    """
+    cores = len(available_cores())
+    processes = config['processes']
+
+    if processes == 'auto':
+        tuned = load_tuning(config['tuning_path'], cores)
+        if tuned is not None:
+            return tuned['processes'], config['threads'] or tuned['threads']
+        processes = max(1, cores // 4)
+
+    threads = config['threads'] or max(1, cores // processes)
+    return processes, threads
+
+
+def load_tuning(path, cores):
+    """
+    Saved tuning result, only if it was measured with the same core count
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        tuning = json.load(f)
+    best = tuning.get('best')
+    if not best or tuning.get('cores') != cores:
+        return None
+    return best
+
+
+def candidate_layouts(cores):
+    """
+    processes x threads splits that use all cores, one process per core
+    up to a single process using them all
+    """
+    return [(p, cores // p) for p in range(1, cores + 1) if cores % p == 0]
+
+
+def autotune(config=CONFIG, layouts=None, duration=10.0, num_images=256, seed=123):
+    """
+    Measure throughput and p95 batch latency of each processes x threads
+    layout on synthetic decoded images, save the best to tuning_path
+    """
+    config = {**CONFIG, **config}
+    cores = len(available_cores())
+    layouts = layouts or candidate_layouts(cores)
+
+    rng = np.random.RandomState(seed)
+    images = rng.uniform(0, 255, size=(num_images, *config['img_size'], 3)).astype(np.float32)
+
+    results = []
+    for processes, threads in layouts:
+        pool = InferencePool({**config, 'processes': processes, 'threads': threads}).start()
+        try:
+            # One round to warm every worker
+            pool.map(list(images[:config['max_batch_size'] * processes]))
+
+            latencies = []
+            count = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                round_start = time.perf_counter()
+                pool.map(list(images))
+                latencies.append(time.perf_counter() - round_start)
+                count += len(images)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.close()
+
+        result = {
+            'processes': processes,
+            'threads': threads,
+            'images_per_sec': count / elapsed,
+            'p95_round_ms': float(np.percentile(latencies, 95) * 1000)
+        }
+        results.append(result)
+        print(f"{processes:3d} process(es) x {threads:3d} thread(s): {result['images_per_sec']:8.1f} images/sec")
+
+    best = max(results, key=lambda r: r['images_per_sec'])
+    tuning = {
+        'cores': cores,
+        'model_path': config['model_path'],
+        'max_batch_size': config['max_batch_size'],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+        'best': best
+    }
+
+    if config['tuning_path']:
+        Path(config['tuning_path']).parent.mkdir(parents=True, exist_ok=True)
+        with open(config['tuning_path'], 'w') as f:
+            json.dump(tuning, f, indent=2)
+        print(f"Best: {best['processes']} x {best['threads']}, saved to {config['tuning_path']}")
+
+    return tuning
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multi-process CPU inference pool')
+    parser.add_argument('source', nargs='?', help='Image directory or manifest to score (JSON lines on stdout)')
+    parser.add_argument('--model', default=CONFIG['model_path'])
+    parser.add_argument('--class-names', default=CONFIG['class_names_path'])
+    parser.add_argument('--processes', default=CONFIG['processes'])
+    parser.add_argument('--threads', type=int, default=CONFIG['threads'])
+    parser.add_argument('--max-batch-size', type=int, default=CONFIG['max_batch_size'])
+    parser.add_argument('--top-k', type=int, default=CONFIG['top_k'])
+    parser.add_argument('--tune', action='store_true', help='Find the best processes x threads split for this host')
+    parser.add_argument('--tune-seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    config = {
+        **CONFIG,
+        'model_path': args.model,
+        'class_names_path': args.class_names,
+        'processes': args.processes if args.processes == 'auto' else int(args.processes),
+        'threads': args.threads,
+        'max_batch_size': args.max_batch_size,
+        'top_k': args.top_k
+    }
+
+    if args.tune:
+        autotune(config, duration=args.tune_seconds)
+
+    if args.source:
+        from score import list_images
+
+        paths = list_images(args.source)
+        with InferencePool(config) as pool:
+            futures = [pool.submit(path) for path in paths]
+            failed = 0
+            for path, future in zip(paths, futures):
+                try:
+                    record = {'path': path, 'results': future.result().to_scan_results()}
+                except Exception:
+                    record = {'path': path, 'error': 'could not decode image'}
+                    failed += 1
+                print(json.dumps(record))
+        print(f"Scored {len(paths) - failed} image(s), {failed} failed", file=sys.stderr)
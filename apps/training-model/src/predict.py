@@ -0,0 +1,325 @@
+import tensorflow as tf
+import numpy as np
+import io
+import json
+import os
+from PIL import Image
+
+
+def load_model_with_lambda(model_path, compile=False):
+    """
+    Load a trained model for inference
+    New models preprocess with a built-in Rescaling layer and load directly,
+    models saved with the old Lambda(preprocess_input) layer need custom_objects
+    Inference never needs the optimizer, so compiling is opt-in
+    """
+    # Only old models need it, keras.applications is slow to import
+    from keras.applications.mobilenet_v2 import preprocess_input
+
+    custom_objects = {
+        'preprocess_input': preprocess_input,
+    }
+
+    return tf.keras.models.load_model(
+        model_path,
+        custom_objects=custom_objects,
+        compile=compile
+    )
+
+
+class SavedModelRunner:
+    """
+    Run a SavedModel written by model.export() through its 'serve'
+    endpoint, with the predict()/predict_on_batch() calls the Keras path uses
+    """
+
+    def __init__(self, model_path):
+        self.model_path = str(model_path)
+        self._loaded = tf.saved_model.load(self.model_path)
+        self._serve = self._loaded.serve
+        self._input_spec = self._serve.input_signature[0]
+        self._output_shape = tuple(self._serve.get_concrete_function().structured_outputs.shape)
+
+    @property
+    def input_shape(self):
+        return tuple(self._input_spec.shape)
+
+    @property
+    def output_shape(self):
+        return (None, *self._output_shape[1:])
+
+    def predict_on_batch(self, images):
+        return self._serve(tf.convert_to_tensor(images, dtype=self._input_spec.dtype)).numpy()
+
+    def predict(self, images, batch_size=32, verbose=0):
+        images = np.asarray(images)
+        outputs = [
+            self.predict_on_batch(images[i:i + batch_size])
+            for i in range(0, len(images), batch_size)
+        ]
+        return np.concatenate(outputs, axis=0)
+
+
+def load_inference_model(model_path):
+    """
+    Load any servable artifact: .tflite goes through the TFLite
+    interpreter, a SavedModel directory through its serve endpoint,
+    a cascade report (.json) through cascade.load_cascade,
+    everything else through load_model_with_lambda
+    """
+    if str(model_path).endswith('.json'):
+        from cascade import load_cascade
+        return load_cascade(model_path)
+
+    if str(model_path).endswith('.tflite'):
+        from tflite_runner import TFLiteModel
+        return TFLiteModel(model_path)
+
+    if os.path.isdir(model_path) and os.path.exists(os.path.join(model_path, 'saved_model.pb')):
+        return SavedModelRunner(model_path)
+
+    return load_model_with_lambda(model_path)
+
+
+def load_class_names(path='models/class_names.json'):
+    """
+    Load class names from JSON file
+    Handles both list and dict formats
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    # If it's a list, return as is
+    if isinstance(data, list):
+        return data
+
+    # If it's a dict, convert to list (sorted by key)
+    if isinstance(data, dict):
+        # Try to convert keys to int and sort
+        try:
+            sorted_items = sorted([(int(k), v) for k, v in data.items()])
+            return [v for k, v in sorted_items]
+        except:
+            # If keys are not numbers, return values as list
+            return list(data.values())
+
+    return data
+
+
+def decode_image(source, target_size=(224, 224), out=None):
+    """
+    Decode an image path or file object straight to target_size
+    JPEGs are decoded in the DCT domain (PIL draft) at the smallest 1/2, 1/4
+    or 1/8 scale that still covers target_size, so a 12 MP upload is never
+    held at full resolution; only the last small resize is done in pixels
+    out is an optional (H, W, 3) float32 array to write into, e.g. one row of
+    a preallocated batch buffer
+    """
+    height, width = target_size
+
+    with Image.open(source) as img:
+        img.draft('RGB', (width, height))
+        img = img.convert('RGB')
+
+    if img.size != (width, height):
+        img = img.resize((width, height), Image.BILINEAR)
+
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.float32)
+    out[...] = np.asarray(img)
+
+    return out, img
+
+
+def decode_batch(sources, target_size=(224, 224), out=None):
+    """
+    Decode images into one (N, H, W, 3) float32 batch buffer
+    Pass out to reuse a buffer between batches
+    """
+    if out is None:
+        out = np.empty((len(sources), *target_size, 3), dtype=np.float32)
+
+    for i, source in enumerate(sources):
+        decode_image(source, target_size, out=out[i])
+
+    return out[:len(sources)]
+
+
+def decode_image_tensor(contents, target_size=(224, 224)):
+    """
+    Graph version of decode_image for tf.data pipelines
+    JPEGs use decode_jpeg's DCT scaling ratio, other formats decode in full
+    Returns a float32 (H, W, 3) tensor resized to target_size
+    """
+    def decode_jpeg():
+        shape = tf.cast(tf.image.extract_jpeg_shape(contents)[:2], tf.float32)
+        scale = tf.reduce_min(shape / tf.constant(target_size, tf.float32))
+        # Largest of the ratios 1, 2, 4, 8 that does not go below target_size
+        index = tf.clip_by_value(tf.cast(tf.math.log(tf.maximum(scale, 1.0)) / tf.math.log(2.0), tf.int32), 0, 3)
+        return tf.switch_case(index, [
+            lambda ratio=ratio: tf.io.decode_jpeg(contents, channels=3, ratio=ratio)
+            for ratio in (1, 2, 4, 8)
+        ])
+
+    img = tf.cond(
+        tf.io.is_jpeg(contents),
+        decode_jpeg,
+        lambda: tf.io.decode_image(contents, channels=3, expand_animations=False)
+    )
+    return tf.image.resize(img, target_size)
+
+
+def load_and_preprocess_image(image_path, target_size=(224, 224)):
+    """
+    Load and preprocess a single image for prediction
+    NOTE: Don't apply preprocessing here - model does it internally
+    """
+    # Fast path decode, see decode_image
+    img_array, img = decode_image(image_path, target_size)
+
+    # Add batch dimension (no normalization - the model handles it)
+    return img_array[np.newaxis], img
+
+
+def build_class_lookup(class_names, num_classes=None):
+    """
+    Build the index -> name lookup array once per model
+    Indices past the end of class_names get a Class_XX placeholder
+    """
+    num_classes = max(num_classes or 0, len(class_names))
+    names = list(class_names) + [f"Class_{i:02d}" for i in range(len(class_names), num_classes)]
+    return np.array(names, dtype=object)
+
+
+class Prediction:
+    """
+    Top-k result for one image: class indices, confidences and names,
+    best first. Holds no reference to the decoded image
+    """
+
+    __slots__ = ('indices', 'confidences', 'names')
+
+    def __init__(self, indices, confidences, names):
+        self.indices = indices
+        self.confidences = confidences
+        self.names = names
+
+    @property
+    def class_name(self):
+        return self.names[0]
+
+    @property
+    def confidence(self):
+        return float(self.confidences[0])
+
+    @property
+    def all_predictions(self):
+        return [(name, float(conf)) for name, conf in zip(self.names, self.confidences)]
+
+    def to_scan_results(self):
+        return [
+            {'defectType': name, 'confidence': float(conf)}
+            for name, conf in zip(self.names, self.confidences)
+        ]
+
+
+class PredictionBatch:
+    """
+    Top-k results for a batch, stored as (N, k) arrays
+    """
+
+    __slots__ = ('indices', 'confidences', 'names')
+
+    def __init__(self, indices, confidences, names):
+        self.indices = indices
+        self.confidences = confidences
+        self.names = names
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        return Prediction(self.indices[i], self.confidences[i], self.names[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_scan_results(self):
+        return [prediction.to_scan_results() for prediction in self]
+
+
+def postprocess(predictions, class_lookup, top_k=5):
+    """
+    Vectorized top-k over a (N, num_classes) probability matrix
+    class_lookup is the array from build_class_lookup (a plain list also works)
+    """
+    predictions = np.asarray(predictions)
+    num_classes = predictions.shape[1]
+    top_k = min(top_k, num_classes)
+
+    if not isinstance(class_lookup, np.ndarray) or len(class_lookup) < num_classes:
+        class_lookup = build_class_lookup(class_lookup, num_classes)
+
+    # argpartition finds the k largest in O(num_classes), only those k get sorted
+    if top_k < num_classes:
+        indices = np.argpartition(predictions, num_classes - top_k, axis=1)[:, -top_k:]
+    else:
+        indices = np.broadcast_to(np.arange(num_classes), predictions.shape)
+
+    confidences = np.take_along_axis(predictions, indices, axis=1)
+    order = np.argsort(-confidences, axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    confidences = np.take_along_axis(confidences, order, axis=1)
+
+    return PredictionBatch(indices, confidences, class_lookup[indices])
+
+
+def predict_batch(model, images, class_lookup, top_k=5):
+    """
+    Run one forward pass over an (N, H, W, 3) batch and post-process it
+    """
+    predictions = model.predict_on_batch(images)
+    return postprocess(predictions, class_lookup, top_k)
+
+
+def predict_image(model, image_path, class_names, top_k=5, cache=None):
+    """
+    Make prediction on a single image
+    class_names can be a list or a lookup from build_class_lookup
+    cache is an optional cache.PredictionCache for the same model
+    """
+    print(f"\n{'='*60}")
+    print(f"Analyzing: {os.path.basename(image_path)}")
+    print('='*60)
+
+    with open(image_path, 'rb') as f:
+        data = f.read()
+
+    key = cache.key(data) if cache is not None else None
+    probabilities = cache.get(key) if cache is not None else None
+
+    if probabilities is None:
+        # Load image (preprocessing done inside the model)
+        img_array, _ = load_and_preprocess_image(io.BytesIO(data))
+        probabilities = np.asarray(model.predict_on_batch(img_array))[0]
+        if cache is not None:
+            cache.put(key, probabilities)
+
+    prediction = postprocess(probabilities[np.newaxis], class_names, top_k)[0]
+
+    print(f"\nTop {len(prediction.indices)} Predictions:")
+    print("-" * 60)
+
+    for i, (class_name, confidence) in enumerate(prediction.all_predictions, 1):
+        print(f"{i}. {class_name:40s} {confidence*100:6.2f}%")
+
+    return prediction
+
+
+def to_scan_results(predictions, class_names, top_k=3):
+    """
+    Convert a (N, num_classes) probability batch into Scan.results entries
+    Returns one list of {'defectType', 'confidence'} dicts per image
+    """
+    return postprocess(predictions, class_names, top_k).to_scan_results()
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from predict import load_inference_model, load_class_names, build_class_lookup
+from cache import model_version
+
+
+# Configuration
+CONFIG = {
+    'registry_dir': 'models/registry',
+    # Used when nothing has been published to the registry yet
+    'model_path': 'models/plant_disease_model.keras',
+    'class_names_path': 'models/class_names.json',
+    'poll_seconds': 10
+}
+
+MODEL_FILES = ('model.keras', 'model.tflite', 'saved_model')
+CURRENT_FILE = 'CURRENT'
+
+
+class LoadedModel:
+    """
+    One model version with the class names it was trained with
+    Immutable once loaded; a batch that picked up a LoadedModel finishes
+    on it even if the registry swaps in a newer version meanwhile
+    """
+
+    def __init__(self, version, model, class_names, cache=None):
+        self.version = version
+        self.model = model
+        self.class_names = class_names
+        self.class_lookup = build_class_lookup(class_names, model.output_shape[-1])
+        self.target_size = tuple(model.input_shape[1:3])
+        self.cache = cache
+
+    def warm_up(self):
+        """
+        One dummy forward pass so the first real request does not pay for tracing
+        """
+        self.model.predict_on_batch(np.zeros((1, *self.target_size, 3), dtype=np.float32))
+        return self
+
+
+def publish(model_path, class_names_path, registry_dir=CONFIG['registry_dir'], version=None, activate=True):
+    """
+    Copy a model and its class names into registry_dir/<version> as one unit
+    The pair is staged in a temp directory and renamed into place, then
+    CURRENT is atomically pointed at it, so a watcher never sees half a version
+    """
+    registry_dir = Path(registry_dir)
+    model_path = Path(model_path)
+    version = version or f"{time.strftime('%Y%m%d-%H%M%S')}-{model_version(model_path)}"
+
+    target = registry_dir / version
+    if target.exists():
+        raise FileExistsError(f"Version already published: {target}")
+
+    staging = registry_dir / f".{version}.{os.getpid()}.tmp"
+    staging.mkdir(parents=True)
+
+    if model_path.is_dir():
+        shutil.copytree(model_path, staging / 'saved_model')
+    else:
+        model_file = 'model.tflite' if model_path.suffix == '.tflite' else 'model.keras'
+        shutil.copy2(model_path, staging / model_file)
+    shutil.copy2(class_names_path, staging / 'class_names.json')
+
+    with open(staging / 'version.json', 'w') as f:
+        json.dump({
+            'version': version,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'source_model': str(model_path),
+            'num_classes': len(load_class_names(class_names_path))
+        }, f, indent=2)
+
+    os.rename(staging, target)
+
+    if activate:
+        activate_version(version, registry_dir)
+
+    print(f"Published model version {version} to {target}")
+    return version
+
+
+def activate_version(version, registry_dir=CONFIG['registry_dir']):
+    """
+    Point CURRENT at a published version (also used to roll back)
+    """
+    registry_dir = Path(registry_dir)
+    if not (registry_dir / version).is_dir():
+        raise FileNotFoundError(f"Unknown model version: {version}")
+
+    tmp_path = registry_dir / f".{CURRENT_FILE}.{os.getpid()}.tmp"
+    tmp_path.write_text(version + '\n')
+    os.replace(tmp_path, registry_dir / CURRENT_FILE)
+
+
+def list_versions(registry_dir=CONFIG['registry_dir']):
+    registry_dir = Path(registry_dir)
+    if not registry_dir.is_dir():
+        return []
+    return sorted(p.name for p in registry_dir.iterdir() if p.is_dir() and not p.name.startswith('.'))
+
+
+class ModelRegistry:
+    """
+    Keep the current model version loaded and warm, and hot-swap newer ones
+    The active version is registry_dir/CURRENT; with nothing published (or
+    no registry_dir) the legacy model_path/class_names_path pair is served
+    and reloaded once the files stop changing. New versions are loaded and warmed in the
+    background, then swapped in with a single reference assignment
+    cache_factory(version) optionally builds a per-version prediction cache
+    """
+
+    def __init__(self, config=CONFIG, cache_factory=None):
+        self.config = config
+        self.registry_dir = Path(config['registry_dir']) if config.get('registry_dir') else None
+        self.cache_factory = cache_factory
+
+        self.swaps = 0
+        self._current = None
+        self._signature = None
+        self._pending = None
+        self._failed = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self):
+        """
+        The active LoadedModel, loading it on first use
+        """
+        if self._current is None:
+            with self._lock:
+                if self._current is None:
+                    signature = self._resolve()
+                    if signature is None:
+                        raise FileNotFoundError(
+                            f"No model in {self.registry_dir} or at {self.config['model_path']}")
+                    self._current = self._load(signature)
+                    self._signature = signature
+        return self._current
+
+    def _resolve(self):
+        """
+        Signature of the artifact that should be active, None if there is none
+        ('version', name) for a published version, ('legacy', stats) otherwise
+        """
+        if self.registry_dir is not None and (self.registry_dir / CURRENT_FILE).exists():
+            return ('version', (self.registry_dir / CURRENT_FILE).read_text().strip())
+
+        paths = (self.config['model_path'], self.config['class_names_path'])
+        try:
+            stats = tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths)
+        except OSError:
+            return None
+        return ('legacy', stats)
+
+    def _load(self, signature):
+        kind, value = signature
+
+        if kind == 'version':
+            version_dir = self.registry_dir / value
+            model_path = next((version_dir / name for name in MODEL_FILES if (version_dir / name).exists()), None)
+            if model_path is None:
+                raise FileNotFoundError(f"No model file in {version_dir}")
+            class_names_path = version_dir / 'class_names.json'
+            version = value
+        else:
+            model_path = self.config['model_path']
+            class_names_path = self.config['class_names_path']
+            version = model_version(model_path)
+
+        start = time.perf_counter()
+        model = load_inference_model(str(model_path))
+        class_names = load_class_names(class_names_path)
+        if len(class_names) != model.output_shape[-1]:
+            raise ValueError(f"Version {version}: {len(class_names)} class names "
+                             f"for {model.output_shape[-1]} model outputs")
+
+        cache = self.cache_factory(version) if self.cache_factory else None
+        loaded = LoadedModel(version, model, class_names, cache).warm_up()
+        print(f"Loaded model version {version} ({time.perf_counter() - start:.1f}s incl. warm-up)")
+        return loaded
+
+    def check(self):
+        """
+        Load and swap in a newer version if one is available
+        Returns True when a swap happened. A failed load keeps the current
+        version and is not retried until the artifact changes again
+        """
+        signature = self._resolve()
+        if signature is None or signature in (self._signature, self._failed):
+            self._pending = None
+            return False
+
+        # Legacy files are written in place, wait until they stop changing
+        if signature[0] == 'legacy' and signature != self._pending:
+            self._pending = signature
+            return False
+        self._pending = None
+
+        try:
+            loaded = self._load(signature)
+        except Exception as e:
+            self._failed = signature
+            print(f"Model reload failed, keeping version {self._current.version if self._current else None}: {e}")
+            return False
+
+        with self._lock:
+            previous = self._current
+            self._current = loaded
+            self._signature = signature
+            self.swaps += 1
+
+        print(f"Swapped model version {previous.version if previous else None} -> {loaded.version}")
+        return True
+
+    def start(self):
+        """
+        Load the current version now, then watch for new ones in a background thread
+        """
+        self.current
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.config['poll_seconds']):
+            self.check()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish and list versioned model/class-name pairs')
+    parser.add_argument('--registry', default=CONFIG['registry_dir'])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help='publish a model and its class names as a new version')
+    publish_parser.add_argument('--model', default=CONFIG['model_path'])
+    publish_parser.add_argument('--class-names', default=CONFIG['class_names_path'])
+    publish_parser.add_argument('--version')
+    publish_parser.add_argument('--no-activate', action='store_true', help='publish without making it current')
+
+    activate_parser = subparsers.add_parser('activate', help='make a published version current (or roll back)')
+    activate_parser.add_argument('version')
+
+    subparsers.add_parser('list', help='list published versions')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        publish(args.model, args.class_names, args.registry, args.version, activate=not args.no_activate)
+    elif args.command == 'activate':
+        activate_version(args.version, args.registry)
+        print(f"Current model version: {args.version}")
+    else:
+        current_file = Path(args.registry) / CURRENT_FILE
+        current = current_file.read_text().strip() if current_file.exists() else None
+        for version in list_versions(args.registry):
+            print(f"{'*' if version == current else ' '} {version}")
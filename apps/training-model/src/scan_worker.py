@@ -0,0 +1,386 @@
+import abc
+import argparse
+import asyncio
+import io
+import os
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+from predict import load_inference_model, load_class_names, build_class_lookup, decode_image, postprocess
+
+
+# Configuration
+CONFIG = {
+    'model_path': 'models/plant_disease_model.keras',
+    'class_names_path': 'models/class_names.json',
+    'mongo_uri': os.environ.get('MONGO_URI'),
+    # Uploads without a url are read from <S3_ENDPOINT>/<S3_BUCKET_NAME>/<s3Key>
+    's3_endpoint': os.environ.get('S3_ENDPOINT'),
+    's3_bucket': os.environ.get('S3_BUCKET_NAME'),
+    'batch_size': 32,  # Scans claimed and classified per forward pass
+    'fetch_concurrency': 16,  # Image downloads in flight
+    'fetch_timeout': 20,
+    'poll_interval': 2.0,  # Seconds to wait when there is nothing pending
+    'stale_after': 600,  # 'processing' scans older than this are claimed again (crashed worker)
+    'top_k': 3,
+    'affected_threshold': 0.5,  # Top-1 confidence needed to flag a diseased scan as affected
+    'severity_thresholds': (('high', 0.8), ('medium', 0.5), ('low', 0.0))
+}
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class ScanQueue(abc.ABC):
+    """
+    Where pending scans come from
+    claim(limit) atomically takes up to limit pending scans (marking them
+    'processing') and returns them as {'id', 'upload'} dicts
+    """
+
+    @abc.abstractmethod
+    async def claim(self, limit):
+        pass
+
+
+class ScanStore(abc.ABC):
+    """
+    Where classified scans go
+    complete(updates) writes {'id', 'results', 'affected'} entries in bulk,
+    fail(ids, reason) marks scans that could not be classified
+    """
+
+    @abc.abstractmethod
+    async def complete(self, updates):
+        pass
+
+    @abc.abstractmethod
+    async def fail(self, ids, reason):
+        pass
+
+
+class ImageFetcher(abc.ABC):
+    """
+    Image bytes for an upload document
+    """
+
+    @abc.abstractmethod
+    async def fetch(self, upload):
+        pass
+
+
+class InMemoryScans(ScanQueue, ScanStore, ImageFetcher):
+    """
+    Queue, store and image source over plain dicts, for tests and local runs
+    scans maps id -> scan document, images maps upload id -> image bytes
+    """
+
+    def __init__(self, scans=None, images=None):
+        self.scans = scans if scans is not None else {}
+        self.images = images if images is not None else {}
+        self.writes = 0
+
+    def add(self, scan_id, image_bytes):
+        self.images[scan_id] = image_bytes
+        self.scans[scan_id] = {'id': scan_id, 'upload': {'id': scan_id}, 'status': 'pending'}
+
+    async def claim(self, limit):
+        claimed = []
+        for scan in self.scans.values():
+            if len(claimed) == limit:
+                break
+            if scan['status'] == 'pending':
+                scan['status'] = 'processing'
+                claimed.append({'id': scan['id'], 'upload': scan['upload']})
+        return claimed
+
+    async def complete(self, updates):
+        self.writes += 1
+        for update in updates:
+            self.scans[update['id']].update(
+                status='completed', results=update['results'], affected=update['affected'], scannedAt=_now())
+
+    async def fail(self, ids, reason):
+        self.writes += 1
+        for scan_id in ids:
+            self.scans[scan_id].update(status='failed', error=reason)
+
+    async def fetch(self, upload):
+        return self.images[upload['id']]
+
+
+class MongoScans(ScanQueue, ScanStore):
+    """
+    The API's scans/uploads collections (pymongo, run off the event loop)
+    Claiming is one update_many from 'pending' to 'processing' stamped
+    with a random claimId, the worker then reads back only the scans
+    carrying its own claimId, so concurrent workers never share a scan
+    """
+
+    def __init__(self, mongo_uri, stale_after=600):
+        from pymongo import MongoClient
+
+        client = MongoClient(mongo_uri, tz_aware=True)
+        self.db = client.get_default_database()
+        self.stale_after = stale_after
+
+    def _claim(self, limit):
+        now = _now()
+        stale = datetime.fromtimestamp(now.timestamp() - self.stale_after, timezone.utc)
+        claimable = {'$or': [
+            {'status': 'pending'},
+            {'status': 'processing', 'updatedAt': {'$lt': stale}}
+        ]}
+
+        ids = [doc['_id'] for doc in self.db.scans.find(claimable, {'_id': 1}).sort('createdAt', 1).limit(limit)]
+        if not ids:
+            return []
+
+        # updatedAt is stored at millisecond precision, two claims can share it
+        claim_id = uuid.uuid4().hex
+        self.db.scans.update_many(
+            {'_id': {'$in': ids}, **claimable},
+            {'$set': {'status': 'processing', 'claimId': claim_id, 'updatedAt': now}}
+        )
+        scans = list(self.db.scans.find(
+            {'_id': {'$in': ids}, 'status': 'processing', 'claimId': claim_id},
+            {'upload': 1}
+        ))
+
+        uploads = {doc['_id']: doc for doc in self.db.uploads.find(
+            {'_id': {'$in': [scan['upload'] for scan in scans]}},
+            {'url': 1, 's3Key': 1, 'mimetype': 1}
+        )}
+        return [{'id': scan['_id'], 'upload': uploads.get(scan['upload'], {})} for scan in scans]
+
+    def _complete(self, updates):
+        from pymongo import UpdateOne
+
+        now = _now()
+        self.db.scans.bulk_write([
+            UpdateOne({'_id': update['id']}, {'$set': {
+                'status': 'completed',
+                'results': update['results'],
+                'affected': update['affected'],
+                'scannedAt': now,
+                'updatedAt': now
+            }})
+            for update in updates
+        ], ordered=False)
+
+    def _fail(self, ids, reason):
+        self.db.scans.update_many(
+            {'_id': {'$in': list(ids)}},
+            {'$set': {'status': 'failed', 'error': reason, 'updatedAt': _now()}}
+        )
+
+    async def claim(self, limit):
+        return await asyncio.to_thread(self._claim, limit)
+
+    async def complete(self, updates):
+        if updates:
+            await asyncio.to_thread(self._complete, updates)
+
+    async def fail(self, ids, reason):
+        if ids:
+            await asyncio.to_thread(self._fail, ids, reason)
+
+
+class HttpImageFetcher(ImageFetcher):
+    """
+    Download upload.url, or the S3 object for upload.s3Key, with bounded concurrency
+    """
+
+    def __init__(self, concurrency=16, timeout=20, s3_endpoint=None, s3_bucket=None):
+        self.timeout = timeout
+        self.s3_endpoint = s3_endpoint
+        self.s3_bucket = s3_bucket
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def _url(self, upload):
+        if upload.get('url'):
+            return upload['url']
+        if upload.get('s3Key') and self.s3_endpoint and self.s3_bucket:
+            return f"{self.s3_endpoint.rstrip('/')}/{self.s3_bucket}/{upload['s3Key']}"
+        raise ValueError('upload has no url or s3Key')
+
+    def _read(self, url):
+        if '://' not in url:
+            with open(url, 'rb') as f:
+                return f.read()
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return response.read()
+
+    async def fetch(self, upload):
+        url = self._url(upload)
+        async with self._semaphore:
+            return await asyncio.to_thread(self._read, url)
+
+
+def severity(confidence, thresholds=CONFIG['severity_thresholds']):
+    for label, minimum in thresholds:
+        if confidence >= minimum:
+            return label
+    return thresholds[-1][0]
+
+
+def is_healthy(class_name):
+    return 'healthy' in class_name.lower()
+
+
+class ScanWorker:
+    """
+    Drain pending scans: claim a batch, download its images concurrently,
+    decode into one preallocated batch buffer, run a single forward pass,
+    write every result back in one bulk update
+    While a batch is on the model (in a worker thread) the next one is
+    already being claimed and downloaded, so throughput grows with
+    batch_size instead of with the number of processes
+    """
+
+    def __init__(self, model, class_names, queue, store, fetcher, config=CONFIG):
+        self.model = model
+        self.class_lookup = build_class_lookup(class_names, model.output_shape[-1])
+        self.queue = queue
+        self.store = store
+        self.fetcher = fetcher
+        self.config = {**CONFIG, **config}
+        self.target_size = tuple(model.input_shape[1:3])
+
+        batch_size = self.config['batch_size']
+        # Two buffers: one being filled while the other is on the model
+        self._buffers = [np.empty((batch_size, *self.target_size, 3), dtype=np.float32) for _ in range(2)]
+        self._next_buffer = 0
+        self.stats = {'batches': 0, 'completed': 0, 'failed': 0}
+
+    async def _load(self, scan, out):
+        data = await self.fetcher.fetch(scan['upload'])
+        await asyncio.to_thread(decode_image, io.BytesIO(data), self.target_size, out)
+
+    async def prepare(self, scans):
+        """
+        Fetch and decode a claimed batch, returns (images, loaded scans, failed ids)
+        """
+        buffer = self._buffers[self._next_buffer]
+        self._next_buffer = 1 - self._next_buffer
+
+        outcomes = await asyncio.gather(
+            *(self._load(scan, buffer[i]) for i, scan in enumerate(scans)),
+            return_exceptions=True
+        )
+
+        ok = [i for i, outcome in enumerate(outcomes) if not isinstance(outcome, BaseException)]
+        failed = [scans[i]['id'] for i, outcome in enumerate(outcomes) if isinstance(outcome, BaseException)]
+
+        # Compact the successful rows to the front of the buffer
+        for position, i in enumerate(ok):
+            if position != i:
+                buffer[position] = buffer[i]
+
+        return buffer[:len(ok)], [scans[i] for i in ok], failed
+
+    def to_update(self, scan, prediction):
+        results = [
+            {'defectType': name, 'severity': severity(float(conf), self.config['severity_thresholds']),
+             'confidence': float(conf)}
+            for name, conf in zip(prediction.names, prediction.confidences)
+        ]
+        affected = not is_healthy(prediction.class_name) and prediction.confidence >= self.config['affected_threshold']
+        return {'id': scan['id'], 'results': results, 'affected': affected}
+
+    async def process(self, images, scans, failed):
+        """
+        One forward pass for the batch, then one bulk write for its results
+        """
+        if failed:
+            await self.store.fail(failed, 'could not fetch or decode image')
+            self.stats['failed'] += len(failed)
+
+        if not scans:
+            return
+
+        try:
+            probabilities = await asyncio.to_thread(self.model.predict_on_batch, images)
+        except Exception as e:
+            await self.store.fail([scan['id'] for scan in scans], f"inference failed: {e}")
+            self.stats['failed'] += len(scans)
+            return
+
+        predictions = postprocess(probabilities, self.class_lookup, self.config['top_k'])
+        await self.store.complete([self.to_update(scan, prediction) for scan, prediction in zip(scans, predictions)])
+
+        self.stats['batches'] += 1
+        self.stats['completed'] += len(scans)
+
+    async def run(self, stop_when_empty=False):
+        """
+        Process batches until stopped (or until nothing is pending)
+        """
+        in_flight = None
+
+        while True:
+            scans = await self.queue.claim(self.config['batch_size'])
+
+            if not scans:
+                if in_flight is not None:
+                    await in_flight
+                    in_flight = None
+                    continue
+                if stop_when_empty:
+                    return self.stats
+                await asyncio.sleep(self.config['poll_interval'])
+                continue
+
+            batch = await self.prepare(scans)
+
+            # At most one batch on the model while the next one downloads
+            if in_flight is not None:
+                await in_flight
+            in_flight = asyncio.create_task(self.process(*batch))
+
+
+async def main(config=CONFIG, once=False):
+    if not config['mongo_uri']:
+        raise SystemExit("Set MONGO_URI (or --mongo-uri)")
+
+    model = load_inference_model(config['model_path'])
+    class_names = load_class_names(config['class_names_path'])
+
+    scans = MongoScans(config['mongo_uri'], stale_after=config['stale_after'])
+    fetcher = HttpImageFetcher(
+        concurrency=config['fetch_concurrency'],
+        timeout=config['fetch_timeout'],
+        s3_endpoint=config['s3_endpoint'],
+        s3_bucket=config['s3_bucket']
+    )
+    worker = ScanWorker(model, class_names, scans, scans, fetcher, config)
+
+    print(f"Scan worker started (batch size {config['batch_size']})")
+    start = time.perf_counter()
+    stats = await worker.run(stop_when_empty=once)
+    print(f"Processed {stats['completed']} scan(s), {stats['failed']} failed, "
+          f"{stats['batches']} batch(es) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Classify pending scans in batches')
+    parser.add_argument('--mongo-uri', default=CONFIG['mongo_uri'])
+    parser.add_argument('--model', default=CONFIG['model_path'])
+    parser.add_argument('--class-names', default=CONFIG['class_names_path'])
+    parser.add_argument('--batch-size', type=int, default=CONFIG['batch_size'])
+    parser.add_argument('--fetch-concurrency', type=int, default=CONFIG['fetch_concurrency'])
+    parser.add_argument('--once', action='store_true', help='Exit once no scans are pending')
+    args = parser.parse_args()
+
+    asyncio.run(main({
+        **CONFIG,
+        'mongo_uri': args.mongo_uri,
+        'model_path': args.model,
+        'class_names_path': args.class_names,
+        'batch_size': args.batch_size,
+        'fetch_concurrency': args.fetch_concurrency
+    }, once=args.once))
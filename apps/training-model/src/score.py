@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import tensorflow as tf
+from data_loader import IMAGE_EXTENSIONS
+from predict import load_inference_model, load_class_names, build_class_lookup, postprocess, decode_image_tensor
+
+
+def list_images(source):
+    """
+    Collect image paths from a directory (single recursive walk)
+    or from a manifest file with one path per line
+    Order is stable: sorted for directories, as written for manifests
+    """
+    source = Path(source)
+
+    if source.is_dir():
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    if source.is_file():
+        with open(source, 'r') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    raise FileNotFoundError(f"Input not found: {source}")
+
+
+def create_scoring_dataset(paths, img_size=(224, 224), batch_size=32):
+    """
+    Decode and resize images in parallel, keeping input order
+    Unreadable files are dropped, their paths travel with each element
+    so the caller can tell which ones are missing
+    """
+    AUTOTUNE = tf.data.AUTOTUNE
+
+    def load(path):
+        return path, decode_image_tensor(tf.io.read_file(path), img_size)
+
+    ds = tf.data.Dataset.from_tensor_slices(paths)
+    ds = ds.map(load, num_parallel_calls=AUTOTUNE, deterministic=True)
+    ds = ds.ignore_errors()
+    ds = ds.batch(batch_size)
+    ds = ds.prefetch(AUTOTUNE)
+
+    return ds
+
+
+def save_visualization(image_path, results, output_dir):
+    """
+    Save a plot of the image with its top prediction
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    top = results[0]
+    plt.figure(figsize=(10, 6))
+    plt.imshow(tf.keras.utils.load_img(image_path))
+    plt.axis('off')
+    plt.title(f"Prediction: {top['defectType']}\nConfidence: {top['confidence']*100:.2f}%",
+              fontsize=14, fontweight='bold')
+    plt.savefig(Path(output_dir) / f"pred_{Path(image_path).stem}.png", bbox_inches='tight', dpi=150)
+    plt.close()
+
+
+def score(model, class_names, paths, out, batch_size=32, top_k=5, visualize_dir=None):
+    """
+    Score images and stream one JSON line per input path, in input order
+    Returns (scored, failed) counts
+    """
+    img_size = tuple(model.input_shape[1:3])
+    class_lookup = build_class_lookup(class_names, model.output_shape[-1])
+    ds = create_scoring_dataset(paths, img_size=img_size, batch_size=batch_size)
+
+    if visualize_dir:
+        Path(visualize_dir).mkdir(parents=True, exist_ok=True)
+
+    scored = 0
+    failed = 0
+    position = 0
+
+    def write(record):
+        out.write(json.dumps(record) + '\n')
+
+    for batch_paths, images in ds:
+        batch_results = postprocess(model.predict_on_batch(images), class_lookup, top_k).to_scan_results()
+
+        for path, results in zip(batch_paths.numpy(), batch_results):
+            path = path.decode('utf-8')
+
+            # Anything skipped between the last output and this one failed to decode
+            while paths[position] != path:
+                write({'path': paths[position], 'error': 'could not decode image'})
+                failed += 1
+                position += 1
+
+            write({'path': path, 'results': results})
+            scored += 1
+            position += 1
+
+            if visualize_dir:
+                save_visualization(path, results, visualize_dir)
+
+        out.flush()
+
+    for path in paths[position:]:
+        write({'path': path, 'error': 'could not decode image'})
+        failed += 1
+
+    return scored, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-score a directory or manifest of images')
+    parser.add_argument('source', help='Image directory or manifest file (one path per line)')
+    parser.add_argument('--model', default='models/plant_disease_model.keras')
+    parser.add_argument('--class-names', default='models/class_names.json')
+    parser.add_argument('--output', default='-', help='JSONL output path, - for stdout')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--visualize', metavar='DIR', help='Also save a prediction plot per image')
+    args = parser.parse_args()
+
+    paths = list_images(args.source)
+    print(f"Scoring {len(paths)} image(s) from {args.source}", file=sys.stderr)
+
+    model = load_inference_model(args.model)
+    class_names = load_class_names(args.class_names)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        scored, failed = score(
+            model,
+            class_names,
+            paths,
+            out,
+            batch_size=args.batch_size,
+            top_k=args.top_k,
+            visualize_dir=args.visualize
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Scored {scored} image(s), {failed} failed", file=sys.stderr)
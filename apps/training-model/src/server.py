@@ -0,0 +1,345 @@
+import argparse
+import io
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from predict import decode_image, postprocess
+from cache import PredictionCache
+from registry import ModelRegistry
+
+
+# Configuration
+CONFIG = {
+    'registry_dir': 'models/registry',  # Versioned models, hot-swapped when CURRENT changes
+    'model_path': 'models/plant_disease_model.keras',  # Served when nothing is published
+    'class_names_path': 'models/class_names.json',
+    'poll_seconds': 10,  # How often to look for a new model version
+    'latency_budget_ms': None,  # Serve the most accurate distilled tier within this p50 latency instead
+    'tiers_path': 'models/model_tiers.json',
+    'host': '0.0.0.0',
+    'port': 8501,
+    'max_batch_size': 32,  # 16-32 keeps a CPU forward pass efficient
+    'max_wait_ms': 10,  # How long the first request waits for company
+    'top_k': 3,
+    'decode_workers': 4,  # Threads decoding a batch's uploads, PIL releases the GIL
+    'cache_items': 10000,  # In-memory LRU of recent predictions, 0 keeps none in memory
+    'cache_dir': None,  # Optional on-disk tier shared across restarts, works with cache_items 0
+    'cache_ttl_hours': 24 * 7,
+    'cache_disk_mb': 512
+}
+
+_STOP = object()
+
+
+class ImageDecodeError(ValueError):
+    """
+    An uploaded image could not be decoded (answered with 400)
+    """
+
+
+class MicroBatcher:
+    """
+    Gather concurrent prediction requests into micro-batches
+    A batch is run when it reaches max_batch_size or when the oldest
+    request has waited max_wait_ms, whichever comes first
+    Each request is pinned to the model version it was decoded for, a
+    batch that straddles a hot swap is split so every image is predicted,
+    labelled and cached by that same version
+    Uploads are decoded by the batching thread, in parallel, straight into
+    the rows of a preallocated batch buffer
+    """
+
+    def __init__(self, registry, max_batch_size=32, max_wait_ms=10, top_k=3, decode_workers=4):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.top_k = top_k
+
+        self.stats = {'requests': 0, 'batches': 0}
+        self._buffer = None
+        self._decoder = ThreadPoolExecutor(max(1, decode_workers), thread_name_prefix='decode')
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, data, key=None, loaded=None):
+        """
+        Queue one encoded image (raw upload bytes), returns a Future with its
+        Scan.results, or an ImageDecodeError if the bytes are not an image
+        key is the image's cache key, its probabilities are cached once computed
+        loaded is the LoadedModel to predict with (default: current)
+        """
+        future = Future()
+        self._queue.put((data, future, key, loaded or self.registry.current))
+        return future
+
+    def predict(self, data, timeout=None, key=None, loaded=None):
+        """
+        Blocking helper around submit()
+        """
+        return self.submit(data, key, loaded).result(timeout)
+
+    def cached(self, key, loaded=None):
+        """
+        Scan.results for an already seen image, or None
+        """
+        loaded = loaded or self.registry.current
+        if loaded.cache is None:
+            return None
+        probabilities = loaded.cache.get(key)
+        if probabilities is None:
+            return None
+        return postprocess(probabilities[np.newaxis], loaded.class_lookup, self.top_k).to_scan_results()[0]
+
+    def close(self):
+        """
+        Stop the batching thread after the queued requests are served
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._decoder.shutdown()
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Serve what we have, stop on the next round
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _decode(self, group, target_size):
+        """
+        Decode the group's uploads into rows of the preallocated batch buffer,
+        reused by every batch (only the batching thread hands it out)
+        Uploads that fail to decode get an ImageDecodeError, the rest are
+        compacted to the front; returns (batch, decoded items)
+        """
+        height, width = target_size
+        if self._buffer is None or self._buffer.shape[1:3] != (height, width):
+            self._buffer = np.empty((self.max_batch_size, height, width, 3), dtype=np.float32)
+
+        def decode(i):
+            try:
+                decode_image(io.BytesIO(group[i][0]), target_size, out=self._buffer[i])
+            except Exception as e:
+                return e
+            return None
+
+        decoded = []
+        for i, error in enumerate(self._decoder.map(decode, range(len(group)))):
+            if error is not None:
+                group[i][1].set_exception(ImageDecodeError(f'could not decode image: {error}'))
+                continue
+            if len(decoded) != i:
+                self._buffer[len(decoded)] = self._buffer[i]
+            decoded.append(group[i])
+
+        return self._buffer[:len(decoded)], decoded
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Usually one group; two when a hot swap lands between requests
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[3]), []).append(item)
+
+            for group in groups.values():
+                self._predict_group(group, group[0][3])
+
+    def _predict_group(self, group, loaded):
+        images, group = self._decode(group, loaded.target_size)
+        if not group:
+            return
+
+        futures = [future for _, future, _, _ in group]
+        try:
+            predictions = np.asarray(loaded.model.predict_on_batch(images))
+            results = postprocess(predictions, loaded.class_lookup, self.top_k).to_scan_results()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        if loaded.cache is not None:
+            for (_, _, key, _), probabilities in zip(group, predictions):
+                if key is not None:
+                    loaded.cache.put(key, probabilities)
+
+        self.stats['requests'] += len(group)
+        self.stats['batches'] += 1
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+
+def make_handler(batcher):
+    """
+    Build the HTTP handler bound to a batcher
+    POST /predict takes raw image bytes, GET /health reports batching stats
+    and the model version being served
+    """
+
+    class PredictHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self._send_json(404, {'error': 'not found'})
+                return
+            loaded = batcher.registry.current
+            stats = {**batcher.stats, 'model_version': loaded.version, 'swaps': batcher.registry.swaps}
+            if loaded.cache is not None:
+                stats['cache'] = {**loaded.cache.stats, 'items': len(loaded.cache)}
+            self._send_json(200, {'status': 'ok', **stats})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'not found'})
+                return
+
+            length = int(self.headers.get('Content-Length', 0))
+            if length == 0:
+                self._send_json(400, {'error': 'empty body, expected image bytes'})
+                return
+
+            data = self.rfile.read(length)
+
+            # Retried and forwarded uploads skip decoding and the model
+            loaded = batcher.registry.current
+            key = loaded.cache.key(data) if loaded.cache is not None else None
+            results = batcher.cached(key, loaded) if key is not None else None
+            if results is not None:
+                self._send_json(200, {'results': results, 'cached': True})
+                return
+
+            try:
+                results = batcher.predict(data, key=key, loaded=loaded)
+            except ImageDecodeError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+
+            self._send_json(200, {'results': results})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictHandler
+
+
+def serve(config=CONFIG):
+    """
+    Load and warm the current model version, then serve batched predictions
+    over HTTP while the registry hot-swaps newer versions in the background
+    """
+    if config['latency_budget_ms']:
+        from distill import select_tier
+
+        tier = select_tier(config['latency_budget_ms'], config['tiers_path'])
+        print(f"Latency budget {config['latency_budget_ms']}ms: serving tier {tier['name']} "
+              f"(p50 {tier['p50_ms']:.1f}ms, accuracy {tier['accuracy']*100:.2f}%)")
+        # Tier artifacts are served as they are, not through the registry
+        config = {**config, 'model_path': tier['path'], 'registry_dir': None}
+
+    cache_factory = None
+    if config['cache_items'] > 0 or config['cache_dir']:
+        # One cache per model version, predictions never leak across versions
+        def cache_factory(version):
+            return PredictionCache(
+                version,
+                max_items=config['cache_items'],
+                disk_dir=config['cache_dir'],
+                ttl_seconds=config['cache_ttl_hours'] * 3600,
+                max_disk_mb=config['cache_disk_mb']
+            )
+        print(f"Prediction cache: {config['cache_items']} items in memory"
+              + (f", disk tier in {config['cache_dir']}" if config['cache_dir'] else ""))
+
+    registry = ModelRegistry(config, cache_factory=cache_factory).start()
+
+    batcher = MicroBatcher(
+        registry,
+        max_batch_size=config['max_batch_size'],
+        max_wait_ms=config['max_wait_ms'],
+        top_k=config['top_k'],
+        decode_workers=config['decode_workers']
+    )
+
+    server = ThreadingHTTPServer((config['host'], config['port']), make_handler(batcher))
+    print(f"Serving version {registry.current.version} on http://{config['host']}:{config['port']} "
+          f"(max batch {config['max_batch_size']}, max wait {config['max_wait_ms']}ms)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        registry.stop()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched plant disease inference server')
+    parser.add_argument('--registry', default=CONFIG['registry_dir'],
+                        help="versioned model directory, '' to always serve --model")
+    parser.add_argument('--model', default=CONFIG['model_path'])
+    parser.add_argument('--class-names', default=CONFIG['class_names_path'])
+    parser.add_argument('--latency-budget-ms', type=float, default=CONFIG['latency_budget_ms'],
+                        help=f"pick a model tier from {CONFIG['tiers_path']} (see distill.py)")
+    parser.add_argument('--host', default=CONFIG['host'])
+    parser.add_argument('--port', type=int, default=CONFIG['port'])
+    parser.add_argument('--max-batch-size', type=int, default=CONFIG['max_batch_size'])
+    parser.add_argument('--max-wait-ms', type=float, default=CONFIG['max_wait_ms'])
+    parser.add_argument('--top-k', type=int, default=CONFIG['top_k'])
+    parser.add_argument('--cache-items', type=int, default=CONFIG['cache_items'])
+    parser.add_argument('--cache-dir', default=CONFIG['cache_dir'])
+    args = parser.parse_args()
+
+    serve({
+        **CONFIG,
+        'registry_dir': args.registry,
+        'model_path': args.model,
+        'class_names_path': args.class_names,
+        'latency_budget_ms': args.latency_budget_ms,
+        'host': args.host,
+        'port': args.port,
+        'max_batch_size': args.max_batch_size,
+        'max_wait_ms': args.max_wait_ms,
+        'top_k': args.top_k,
+        'cache_items': args.cache_items,
+        'cache_dir': args.cache_dir
+    })
@@ -1,142 +1,42 @@
-import tensorflow as tf
 import numpy as np
-import json
 import os
+import sys
 from pathlib import Path
-import matplotlib.pyplot as plt
-from keras.applications.mobilenet_v2 import preprocess_input
 
-def load_model_with_lambda(model_path):
-    """
-    Load model with Lambda layer containing preprocess_input
-    """
-    custom_objects = {
-        'preprocess_input': preprocess_input,
-    }
-    
-    try:
-        model = tf.keras.models.load_model(model_path, custom_objects=custom_objects)
-        return model
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        print("\nTrying alternative loading method...")
-        
-        # Alternative: try loading without compiling
-        model = tf.keras.models.load_model(
-            model_path, 
-            custom_objects=custom_objects,
-            compile=False
-        )
-        
-        # Recompile the model
-        model.compile(
-            optimizer='adam',
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
-        
-        return model
-
-def load_class_names(path='models/class_names.json'):
-    """
-    Load class names from JSON file
-    Handles both list and dict formats
-    """
-    with open(path, 'r') as f:
-        data = json.load(f)
-    
-    # If it's a list, return as is
-    if isinstance(data, list):
-        return data
-    
-    # If it's a dict, convert to list (sorted by key)
-    if isinstance(data, dict):
-        # Try to convert keys to int and sort
-        try:
-            sorted_items = sorted([(int(k), v) for k, v in data.items()])
-            return [v for k, v in sorted_items]
-        except:
-            # If keys are not numbers, return values as list
-            return list(data.values())
-    
-    return data
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-def load_and_preprocess_image(image_path, target_size=(224, 224)):
-    """
-    Load and preprocess a single image for prediction
-    NOTE: Don't apply preprocessing here - model does it internally with Lambda layer
-    """
-    # Load image
-    img = tf.keras.utils.load_img(image_path, target_size=target_size)
-    
-    # Convert to array
-    img_array = tf.keras.utils.img_to_array(img)
-    
-    # Add batch dimension (no normalization - Lambda layer handles it)
-    img_array = np.expand_dims(img_array, axis=0)
-    
-    return img_array, img
+from predict import (
+    load_model_with_lambda,
+    load_class_names,
+    build_class_lookup,
+    predict_image
+)
+from score import list_images
+from registry import ModelRegistry, CONFIG as MODEL_CONFIG
 
-def predict_image(model, image_path, class_names, top_k=5):
-    """
-    Make prediction on a single image
-    """
-    print(f"\n{'='*60}")
-    print(f"Analyzing: {os.path.basename(image_path)}")
-    print('='*60)
-    
-    # Load image (preprocessing done by model's Lambda layer)
-    img_array, original_img = load_and_preprocess_image(image_path)
-    
-    # Make prediction
-    predictions = model.predict(img_array, verbose=0)
-    
-    # Get top K predictions (limit to actual number of classes)
-    num_classes = len(class_names)
-    top_k = min(top_k, num_classes)
-    top_indices = np.argsort(predictions[0])[::-1][:top_k]
-    
-    print(f"\nTop {top_k} Predictions:")
-    print("-" * 60)
-    
-    results = []
-    for i, idx in enumerate(top_indices, 1):
-        # Convert numpy int64 to Python int
-        idx = int(idx)
-        
-        # Check if index is valid
-        if idx < len(class_names):
-            class_name = class_names[idx]
-            confidence = float(predictions[0][idx]) * 100
-            print(f"{i}. {class_name:40s} {confidence:6.2f}%")
-            results.append((class_name, float(predictions[0][idx])))
-        else:
-            print(f"{i}. Class_{idx:02d} (Unknown)                    {float(predictions[0][idx])*100:6.2f}%")
-            results.append((f"Class_{idx:02d}", float(predictions[0][idx])))
-    
-    # Return top prediction
-    top_idx = int(top_indices[0])
-    top_class = class_names[top_idx] if top_idx < len(class_names) else f"Class_{top_idx:02d}"
-    
-    return {
-        'class': top_class,
-        'confidence': float(predictions[0][top_idx]),
-        'all_predictions': results,
-        'image': original_img
-    }
+# Loaded and warmed once, reused by every test_single_image call
+_registry = None
 
-def visualize_prediction(result, save_path=None):
+def visualize_prediction(result, image_path, save_path=None):
     """
     Visualize image with prediction
     """
+    # Only needed for plots, headless scoring never imports them
+    import matplotlib
+    if save_path:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from keras.utils import load_img
+    
     plt.figure(figsize=(10, 6))
     
     # Display image
-    plt.imshow(result['image'])
+    # Re-read the image, predictions don't keep it in memory
+    plt.imshow(load_img(image_path))
     plt.axis('off')
     
     # Add prediction text
-    title = f"Prediction: {result['class']}\nConfidence: {result['confidence']*100:.2f}%"
+    title = f"Prediction: {result.class_name}\nConfidence: {result.confidence*100:.2f}%"
     plt.title(title, fontsize=14, fontweight='bold')
     
     if save_path:
@@ -147,7 +47,7 @@ def visualize_prediction(result, save_path=None):
     
     plt.close()
 
-def test_model():
+def test_model(model_path=MODEL_CONFIG['model_path'], class_names_path=MODEL_CONFIG['class_names_path']):
     """
     Main function to test the model
     """
@@ -155,17 +55,13 @@ def test_model():
     print("TESTING PLANT DISEASE DETECTION MODEL")
     print("="*60)
     
-    # Paths
-    model_path = 'models/plant_disease_model.keras'
-    class_names_path = 'models/class_names.json'
-    
     # Check if model exists
     if not os.path.exists(model_path):
         print(f"\nError: Model not found at {model_path}")
-        print("Please train the model first: python training-model/src/app.py")
+        print("Please train the model first: python training-model/src/cli.py train")
         return
     
-    # Load model with custom objects for Lambda layer
+    # Load model (older Lambda-preprocess models load too)
     print(f"\nLoading model from: {model_path}")
     model = load_model_with_lambda(model_path)
     print("✓ Model loaded successfully")
@@ -198,8 +94,7 @@ def test_model():
     test_images = []
     for test_dir in test_dirs:
         if os.path.exists(test_dir):
-            for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-                test_images.extend(Path(test_dir).rglob(ext))
+            test_images.extend(Path(p) for p in list_images(test_dir))
             if test_images:
                 break
     
@@ -218,19 +113,20 @@ def test_model():
     print(f"✓ Found {len(test_images)} test image(s)")
     
     # Create output directory for visualizations
-    output_dir = Path('models/predictions')
+    output_dir = Path(model_path).parent / 'predictions'
     output_dir.mkdir(exist_ok=True)
     
     # Test on each image
+    class_lookup = build_class_lookup(class_names, model.output_shape[-1])
     results = []
     for img_path in test_images:
         try:
-            result = predict_image(model, str(img_path), class_names)
+            result = predict_image(model, str(img_path), class_lookup)
             results.append(result)
             
             # Save visualization
             output_path = output_dir / f"pred_{img_path.stem}.png"
-            visualize_prediction(result, save_path=output_path)
+            visualize_prediction(result, img_path, save_path=output_path)
         except Exception as e:
             print(f"\nError processing {img_path.name}: {e}")
             continue
@@ -244,7 +140,7 @@ def test_model():
     
     # Show confidence distribution
     if results:
-        confidences = [r['confidence'] for r in results]
+        confidences = [r.confidence for r in results]
         avg_confidence = np.mean(confidences) * 100
         print(f"\nAverage confidence: {avg_confidence:.2f}%")
         print(f"Min confidence:     {min(confidences)*100:.2f}%")
@@ -254,18 +150,20 @@ def test_single_image(image_path):
     """
     Test model on a single image
     """
-    model_path = 'models/plant_disease_model.keras'
-    class_names_path = 'models/class_names.json'
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    else:
+        _registry.check()
     
-    # Load model and class names
-    model = load_model_with_lambda(model_path)
-    class_names = load_class_names(class_names_path)
+    # Current model version and the class names published with it
+    loaded = _registry.current
     
     # Predict
-    result = predict_image(model, image_path, class_names)
+    result = predict_image(loaded.model, image_path, loaded.class_lookup)
     
     # Visualize
-    visualize_prediction(result)
+    visualize_prediction(result, image_path)
     
     return result
 
@@ -0,0 +1,102 @@
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scan_worker import InMemoryScans, ScanWorker
+
+CLASS_NAMES = ['Tomato___Early_blight', 'Tomato___healthy', 'Potato___Late_blight']
+COLORS = {'red': (255, 0, 0), 'green': (0, 255, 0), 'blue': (0, 0, 255)}
+
+
+class ColorModel:
+    """
+    Stand-in model: the dominant color channel of an image is its class,
+    so a result shows which buffer row it was computed from
+    """
+
+    input_shape = (None, 32, 32, 3)
+    output_shape = (None, len(CLASS_NAMES))
+
+    def predict_on_batch(self, images):
+        means = images.mean(axis=(1, 2))
+        return means / means.sum(axis=1, keepdims=True)
+
+
+def jpeg(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), COLORS[color]).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def make_worker(scans, batch_size=4):
+    return ScanWorker(ColorModel(), CLASS_NAMES, scans, scans, scans,
+                      {'batch_size': batch_size, 'poll_interval': 0})
+
+
+def test_claim_marks_processing_up_to_limit():
+    scans = InMemoryScans()
+    for i in range(5):
+        scans.add(f"scan{i}", jpeg('red'))
+
+    claimed = asyncio.run(scans.claim(3))
+
+    assert [scan['id'] for scan in claimed] == ['scan0', 'scan1', 'scan2']
+    assert [scans.scans[f"scan{i}"]['status'] for i in range(5)] == ['processing'] * 3 + ['pending'] * 2
+    assert len(asyncio.run(scans.claim(3))) == 2
+    assert asyncio.run(scans.claim(3)) == []
+
+
+def test_failed_fetches_are_compacted_out_of_the_batch():
+    scans = InMemoryScans()
+    scans.add('red', jpeg('red'))
+    scans.add('broken', b'not an image')
+    scans.add('green', jpeg('green'))
+    # Listed as pending but its image was never uploaded
+    scans.scans['missing'] = {'id': 'missing', 'upload': {'id': 'missing'}, 'status': 'pending'}
+    scans.add('blue', jpeg('blue'))
+
+    worker = make_worker(scans, batch_size=5)
+    images, loaded, failed = asyncio.run(worker.prepare(asyncio.run(scans.claim(5))))
+
+    assert failed == ['broken', 'missing']
+    assert [scan['id'] for scan in loaded] == ['red', 'green', 'blue']
+    assert images.shape == (3, 32, 32, 3)
+    assert list(np.argmax(images.mean(axis=(1, 2)), axis=1)) == [0, 1, 2]
+
+
+def test_run_completes_and_fails_scans():
+    scans = InMemoryScans()
+    for i, color in enumerate(['red', 'green', 'blue', 'red', 'green']):
+        scans.add(f"scan{i}", jpeg(color))
+    scans.add('broken', b'not an image')
+
+    stats = asyncio.run(make_worker(scans, batch_size=4).run(stop_when_empty=True))
+
+    assert stats == {'batches': 2, 'completed': 5, 'failed': 1}
+    assert scans.writes == 3
+
+    red = scans.scans['scan0']
+    assert red['status'] == 'completed'
+    assert red['results'][0]['defectType'] == 'Tomato___Early_blight'
+    assert red['affected'] is True
+    assert 'scannedAt' in red
+
+    healthy = scans.scans['scan1']
+    assert healthy['results'][0]['defectType'] == 'Tomato___healthy'
+    assert healthy['affected'] is False
+
+    assert scans.scans['broken']['status'] == 'failed'
+    assert scans.scans['broken']['error'] == 'could not fetch or decode image'
+
+
+if __name__ == '__main__':
+    test_claim_marks_processing_up_to_limit()
+    test_failed_fetches_are_compacted_out_of_the_batch()
+    test_run_completes_and_fails_scans()
+    print("All scan worker tests passed")
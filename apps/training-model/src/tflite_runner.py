@@ -0,0 +1,95 @@
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+
+def _quantize(values, details):
+    """
+    Convert float input to the tensor's dtype using its quantization params
+    """
+    dtype = details['dtype']
+    if np.issubdtype(dtype, np.floating):
+        return values.astype(dtype, copy=False)
+
+    scale, zero_point = details['quantization']
+    if scale:
+        values = np.round(values / scale + zero_point)
+
+    info = np.iinfo(dtype)
+    return np.clip(values, info.min, info.max).astype(dtype)
+
+
+def _dequantize(values, details):
+    """
+    Convert quantized output back to float32 probabilities
+    """
+    if np.issubdtype(values.dtype, np.floating):
+        return values.astype(np.float32, copy=False)
+
+    scale, zero_point = details['quantization']
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+class TFLiteModel:
+    """
+    Run a .tflite model through the same calls the Keras path uses:
+    predict(), predict_on_batch(), input_shape and output_shape
+    Takes raw 0-255 pixels like the Keras model, quantized IO is handled here
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = str(model_path)
+        self._interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._load_details()
+        self._lock = threading.Lock()
+
+    def _load_details(self):
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+
+    @property
+    def input_shape(self):
+        return (None, *(int(d) for d in self._input['shape'][1:]))
+
+    @property
+    def output_shape(self):
+        return (None, *(int(d) for d in self._output['shape'][1:]))
+
+    def _resize(self, batch_size):
+        if batch_size == self._batch_size:
+            return
+        self._interpreter.resize_tensor_input(
+            self._input['index'],
+            [batch_size, *self._input['shape'][1:]]
+        )
+        self._interpreter.allocate_tensors()
+        self._load_details()
+
+    def predict_on_batch(self, images):
+        """
+        Run one (N, H, W, 3) batch, returns (N, num_classes) float32
+        """
+        images = np.asarray(images, dtype=np.float32)
+
+        # The interpreter is not thread-safe, and resizing re-allocates tensors
+        with self._lock:
+            self._resize(len(images))
+            self._interpreter.set_tensor(self._input['index'], _quantize(images, self._input))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output['index'])
+
+        return _dequantize(output, self._output)
+
+    def predict(self, images, batch_size=32, verbose=0):
+        """
+        Keras-style predict over an array of images, in chunks of batch_size
+        """
+        images = np.asarray(images)
+        outputs = [
+            self.predict_on_batch(images[i:i + batch_size])
+            for i in range(0, len(images), batch_size)
+        ]
+        return np.concatenate(outputs, axis=0)